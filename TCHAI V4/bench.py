@@ -0,0 +1,261 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import contextlib
+import subprocess
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from chaine import (calculer_hash_transaction, calculer_hash_transaction_v5, message_virement, timestamp_en_us,
+                    TIMESTAMP_FORMAT_HASH)
+from gen_keys import generer_paire_cles
+from sign_tx import charger_cle_privee, signer_avec_cle, signer_transaction
+
+# Mesures de performance de Tchaî, résultats en JSON pour comparer deux commits.
+#
+#   python bench.py --sortie avant.json
+#   python bench.py --sortie apres.json
+#   python bench.py --comparer avant.json apres.json
+#
+# Deux familles de mesures :
+#  - micro : hachage d'une transaction (v4 JSON et v5 binaire), signature et
+#    vérification ECDSA ;
+#  - api : POST /api/transaction, liste, solde et intégrité via le client de
+#    test Flask, sur un registre pré-rempli à chaque taille de --tailles.
+#
+# Le serveur est chargé dans un dossier temporaire (clés et base jetables) :
+# la base instance/tchai4.db n'est jamais touchée.
+
+TAILLES_DEFAUT = "1000,10000,100000"
+
+
+def statistiques(durees, total_s=None):
+    """Résumé d'une série de durées (secondes) : moyenne et percentiles en millisecondes."""
+    triees = sorted(durees)
+
+    def percentile(p):
+        # Rang le plus proche, sans interpolation
+        return triees[min(len(triees) - 1, max(0, round(p / 100 * len(triees)) - 1))] * 1000
+
+    total_s = total_s if total_s is not None else sum(triees)
+    return {
+        "n": len(triees),
+        "moyenne_ms": round(sum(triees) / len(triees) * 1000, 4),
+        "p50_ms": round(percentile(50), 4), "p90_ms": round(percentile(90), 4),
+        "p99_ms": round(percentile(99), 4), "max_ms": round(triees[-1] * 1000, 4),
+        "ops_par_s": round(len(triees) / total_s, 1) if total_s else None,
+    }
+
+
+def chronometrer(fonction, repetitions):
+    durees = []
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        fonction()
+        durees.append(time.perf_counter() - debut)
+    return statistiques(durees)
+
+
+# --- Micro-benchmarks ---
+
+def mesurer_primitives(repetitions, dossier):
+    now = datetime.now(timezone.utc)
+    ts_str, ts_us = now.strftime(TIMESTAMP_FORMAT_HASH), timestamp_en_us(now)
+    prev = "ab" * 32
+
+    with contextlib.redirect_stdout(None):
+        generer_paire_cles(os.path.join(dossier, "Bench"))
+    fichier_cle = os.path.join(dossier, "Bench_private.pem")
+    with open(fichier_cle, "rb") as f:
+        cle_privee = serialization.load_pem_private_key(f.read(), password=None)
+    cle_publique = cle_privee.public_key()
+    message = message_virement("Yoyo", "Wiwi", 250, 1)
+    signature = cle_privee.sign(message, ec.ECDSA(hashes.SHA256()))
+
+    return {
+        "hash_v4_json": chronometrer(lambda: calculer_hash_transaction("Yoyo", "Wiwi", 2.5, ts_str, prev), repetitions * 10),
+        "hash_v5_binaire": chronometrer(lambda: calculer_hash_transaction_v5("Yoyo", "Wiwi", 250, ts_us, prev), repetitions * 10),
+        # sign_tx.signer_transaction : clé PEM lue au premier appel puis gardée en cache
+        "signer_transaction": chronometrer(lambda: signer_transaction(fichier_cle, "Yoyo", "Wiwi", 2.5, 1), repetitions),
+        "ecdsa_signer": chronometrer(lambda: cle_privee.sign(message, ec.ECDSA(hashes.SHA256())), repetitions),
+        "ecdsa_verifier": chronometrer(lambda: cle_publique.verify(signature, message, ec.ECDSA(hashes.SHA256())), repetitions),
+    }
+
+
+# --- Benchmarks de l'API ---
+
+def charger_serveur(dossier, nb_clients):
+    """Importe tchai4 dans `dossier` avec une base et des clés jetables."""
+    noms = [f"Bench{i}" for i in range(nb_clients)]
+    with contextlib.redirect_stdout(None):
+        for nom in noms:
+            generer_paire_cles(os.path.join(dossier, nom))
+    os.environ["FLASK_SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(dossier, "tchai4.db")
+    os.environ["FLASK_TCHAI_JOURNAL_DOSSIER"] = os.path.join(dossier, "journal")
+    # Pas de scellement périodique : il fausserait les mesures de latence
+    os.environ["FLASK_TCHAI_BLOC_DELAI"] = "0"
+    os.chdir(dossier)
+    import tchai4
+    with contextlib.redirect_stdout(None), tchai4.app.app_context():
+        tchai4.provisionner(dossier)
+    return tchai4, noms
+
+
+def remplir_registre(tchai4, noms, taille, taille_lot=50_000):
+    """
+    Ajoute des virements d'une unité jusqu'à `taille` transactions, chaînés comme
+    par le serveur mais sans passer par l'API (les soldes ne sont pas modifiés).
+    """
+    def ajouter_lot(nombre):
+        id_tete, hash_precedent = tchai4.tete_chaine.lire()
+        now = datetime.now(timezone.utc)
+        ts_us = timestamp_en_us(now)
+        lot = []
+        for i in range(id_tete, id_tete + nombre):
+            p1, p2 = noms[i % len(noms)], noms[(i + 1) % len(noms)]
+            hash_precedent = calculer_hash_transaction_v5(p1, p2, 1, ts_us, hash_precedent)
+            lot.append({"p1_nom": p1, "p2_nom": p2, "montant_unites": 1, "timestamp": now, "hash": hash_precedent})
+        ids = tchai4.depot.ajouter(lot)
+        tchai4.tete_chaine.avancer(ids[-1], hash_precedent)
+        tchai4.sceller_blocs()
+
+    while tchai4.tete_chaine.lire()[0] < taille:
+        tchai4.ecrivain.soumettre(ajouter_lot, min(taille_lot, taille - tchai4.tete_chaine.lire()[0]))
+    intervalle = tchai4.app.config['TCHAI_INSTANTANE_INTERVALLE']
+    if intervalle:
+        tchai4.ecrivain.soumettre(tchai4.prendre_instantane)
+
+
+def mesurer_api(tchai4, noms, repetitions, nb_threads):
+    client = tchai4.app.test_client()
+
+    # Signatures préparées à l'avance : seul le travail du serveur est mesuré
+    cles = {nom: charger_cle_privee(f"{nom}_private.pem") for nom in noms}
+
+    # Nonces croissants par émetteur, dans l'ordre d'envoi
+    nonces = {}
+
+    def corps(i):
+        p1, p2 = noms[i % len(noms)], noms[(i + 1) % len(noms)]
+        nonces[p1] = nonce = nonces.get(p1, 0) + 1
+        return {"P1": p1, "P2": p2, "a": 0.01, "nonce": nonce, "signature": signer_avec_cle(cles[p1], p1, p2, 0.01, nonce)}
+
+    def appeler(methode, url, **kwargs):
+        reponse = getattr(client, methode)(url, **kwargs)
+        if reponse.status_code >= 400:
+            raise RuntimeError(f"{methode.upper()} {url} : {reponse.status_code} {reponse.get_data(as_text=True)[:200]}")
+
+    corps_sequentiels = [corps(i) for i in range(repetitions)]
+    corps_paralleles = [corps(i) for i in range(repetitions)]
+    resultats = {}
+
+    iterateur = iter(corps_sequentiels)
+    resultats["post_transaction"] = chronometrer(lambda: appeler("post", "/api/transaction", json=next(iterateur)), repetitions)
+
+    # Débit avec plusieurs clients simultanés (regroupement des commits par l'écrivain)
+    def envoyer(data):
+        debut = time.perf_counter()
+        appeler("post", "/api/transaction", json=data)
+        return time.perf_counter() - debut
+    debut = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=nb_threads) as executeur:
+        durees = list(executeur.map(envoyer, corps_paralleles))
+    resultats[f"post_transaction_{nb_threads}_threads"] = statistiques(durees, time.perf_counter() - debut)
+
+    resultats["get_wallet"] = chronometrer(lambda: appeler("get", f"/api/clients/wallet/{noms[0]}"), repetitions)
+    if isinstance(tchai4.depot, tchai4.DepotSQLite):
+        resultats["get_transactions_page_100"] = chronometrer(
+            lambda: appeler("get", "/api/transactions?limit=100&order=desc"), repetitions)
+        resultats["get_transactions_client"] = chronometrer(
+            lambda: appeler("get", f"/api/transactions/{noms[0]}"), max(1, repetitions // 10))
+    if tchai4.tete_chaine.lire()[0] <= 100_000:
+        resultats["get_transactions_liste_complete"] = chronometrer(lambda: appeler("get", "/api/transactions"), 3)
+
+    resultats["integrite_complete"] = chronometrer(lambda: appeler("get", "/api/transactions/integrity?full=1&failures_only=1"), 3)
+    # Le parcours complet précédent a posé le point de contrôle : seules les nouvelles transactions sont re-hachées
+    resultats["integrite_incrementale"] = chronometrer(
+        lambda: appeler("get", "/api/transactions/integrity?failures_only=1"), repetitions)
+    return resultats
+
+
+# --- Comparaison ---
+
+def comparer(fichier_avant, fichier_apres):
+    """Affiche l'évolution du p50 de chaque mesure entre deux fichiers de résultats."""
+    with open(fichier_avant) as f:
+        avant = json.load(f)
+    with open(fichier_apres) as f:
+        apres = json.load(f)
+
+    def aplatir(resultat):
+        mesures = {f"micro/{nom}": s for nom, s in resultat.get("micro", {}).items()}
+        for taille, groupe in resultat.get("api", {}).items():
+            mesures.update({f"api/{taille}/{nom}": s for nom, s in groupe.items()})
+        return mesures
+
+    mesures_avant, mesures_apres = aplatir(avant), aplatir(apres)
+    print(f"{'mesure':<55} {'p50 avant':>12} {'p50 après':>12} {'écart':>8}")
+    for nom in sorted(mesures_avant.keys() & mesures_apres.keys()):
+        a, b = mesures_avant[nom]["p50_ms"], mesures_apres[nom]["p50_ms"]
+        ecart = f"{(b - a) / a * 100:+.1f}%" if a else "-"
+        print(f"{nom:<55} {a:>10.3f}ms {b:>10.3f}ms {ecart:>8}")
+
+
+def commit_courant():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks de Tchaî (résultats JSON avec percentiles).")
+    parser.add_argument("--tailles", default=TAILLES_DEFAUT,
+                        help=f"Tailles de registre pour les mesures de l'API (défaut : {TAILLES_DEFAUT}, jusqu'à 10000000)")
+    parser.add_argument("--repetitions", type=int, default=200, help="Nombre d'appels par mesure")
+    parser.add_argument("--clients", type=int, default=20, help="Nombre de clients générés")
+    parser.add_argument("--threads", type=int, default=8, help="Clients simultanés pour la mesure de débit")
+    parser.add_argument("--sans-api", action="store_true", help="Micro-benchmarks seulement")
+    parser.add_argument("--sortie", default=None, help="Fichier JSON de résultats (défaut : sortie standard)")
+    parser.add_argument("--comparer", nargs=2, metavar=("AVANT", "APRES"), help="Compare deux fichiers de résultats")
+    args = parser.parse_args()
+
+    if args.comparer:
+        comparer(*args.comparer)
+        sys.exit(0)
+
+    sortie = os.path.abspath(args.sortie) if args.sortie else None
+    tailles = sorted(int(float(t)) for t in args.tailles.split(",") if t.strip())
+    dossier = tempfile.mkdtemp(prefix="tchai-bench-")
+    resultat = {
+        "commit": commit_courant(), "date": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count(),
+        "repetitions": args.repetitions,
+    }
+    try:
+        resultat["micro"] = mesurer_primitives(args.repetitions, dossier)
+        if not args.sans_api:
+            tchai4, noms = charger_serveur(dossier, args.clients)
+            resultat["api"] = {}
+            for taille in tailles:
+                debut = time.perf_counter()
+                remplir_registre(tchai4, noms, taille)
+                print(f"Registre rempli jusqu'à {taille} transactions ({time.perf_counter() - debut:.1f} s)", file=sys.stderr)
+                resultat["api"][str(taille)] = mesurer_api(tchai4, noms, args.repetitions, args.threads)
+    finally:
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+        shutil.rmtree(dossier, ignore_errors=True)
+
+    texte = json.dumps(resultat, indent=2)
+    if sortie:
+        with open(sortie, "w") as f:
+            f.write(texte + "\n")
+    else:
+        print(texte)
@@ -0,0 +1,68 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+class CacheClesPubliques:
+    """
+    Cache LRU borné des clés publiques désérialisées.
+
+    La clé du cache est (nom du client, empreinte SHA-256 du PEM) : si la
+    `cle_publique` d'un client change en base, l'empreinte change aussi et
+    l'ancienne entrée est retirée au premier accès.
+    """
+
+    def __init__(self, taille_max=1024):
+        self.taille_max = taille_max
+        self.entrees = OrderedDict()
+        self.empreintes = {}  # nom -> empreinte actuellement en cache
+        self.verrou = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def obtenir(self, nom, pem):
+        empreinte = hashlib.sha256(pem.encode('utf-8')).hexdigest()
+        cle = (nom, empreinte)
+        with self.verrou:
+            cle_publique = self.entrees.get(cle)
+            if cle_publique is not None:
+                self.entrees.move_to_end(cle)
+                self.hits += 1
+                return cle_publique
+            self.misses += 1
+
+        from cryptography.hazmat.primitives import serialization  # chargé au premier défaut de cache
+        cle_publique = serialization.load_pem_public_key(pem.encode('utf-8'))
+
+        with self.verrou:
+            # Clé du client modifiée : on retire l'ancienne version
+            ancienne = self.empreintes.get(nom)
+            if ancienne is not None and ancienne != empreinte:
+                self.entrees.pop((nom, ancienne), None)
+            self.entrees[cle] = cle_publique
+            self.entrees.move_to_end(cle)
+            self.empreintes[nom] = empreinte
+            while len(self.entrees) > self.taille_max:
+                (nom_evince, empreinte_evincee), _ = self.entrees.popitem(last=False)
+                if self.empreintes.get(nom_evince) == empreinte_evincee:
+                    del self.empreintes[nom_evince]
+        return cle_publique
+
+    def invalider(self, nom=None):
+        """Oublie la clé d'un client, ou tout le cache si `nom` est None."""
+        with self.verrou:
+            if nom is None:
+                self.entrees.clear()
+                self.empreintes.clear()
+                return
+            empreinte = self.empreintes.pop(nom, None)
+            if empreinte is not None:
+                self.entrees.pop((nom, empreinte), None)
+
+    def stats(self):
+        with self.verrou:
+            total = self.hits + self.misses
+            return {
+                "taille": len(self.entrees), "taille_max": self.taille_max,
+                "hits": self.hits, "misses": self.misses,
+                "taux_hit": round(self.hits / total, 4) if total else 0.0,
+            }
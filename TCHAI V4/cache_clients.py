@@ -0,0 +1,110 @@
+import time
+import threading
+from collections import OrderedDict
+
+class CacheClients:
+    """
+    Cache en lecture des fiches clients {id, nom, solde_unites, dernier_nonce, cle_publique}.
+
+    Lecture : une fiche absente ou expirée (TTL) est rechargée en base via
+    `charger(noms)`, qui renvoie un dict nom -> fiche pour une liste de noms.
+    Écriture : le chemin d'ajout met à jour les soldes après chaque commit
+    (`mettre_a_jour_soldes`). Les modifications faites directement en base ne
+    sont vues qu'après expiration du TTL ou un appel à `invalider()`.
+    """
+
+    def __init__(self, charger, ttl=30.0, taille_max=10000):
+        self.charger = charger
+        self.ttl = ttl
+        self.taille_max = taille_max
+        self.entrees = OrderedDict()  # nom -> (expiration, fiche)
+        # Incrémentés à chaque écriture/invalidation : une fiche lue en base pendant
+        # une écriture concurrente n'est pas rangée (elle pourrait être périmée).
+        self.versions = {}
+        self.generation = 0
+        self.verrou = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def obtenir(self, nom):
+        """Fiche du client `nom` (copie), ou None s'il n'existe pas."""
+        return self.obtenir_plusieurs([nom]).get(nom)
+
+    def obtenir_plusieurs(self, noms):
+        """Fiches des clients existants parmi `noms`, avec une seule requête pour les absents."""
+        trouves, manquants, jeton = self._chercher(noms)
+        if manquants:
+            self._completer(trouves, self.charger(manquants), jeton)
+        return trouves
+
+    async def obtenir_plusieurs_async(self, noms, charger):
+        """Variante pour le serveur asynchrone : `charger(noms)` est une coroutine."""
+        trouves, manquants, jeton = self._chercher(noms)
+        if manquants:
+            self._completer(trouves, await charger(manquants), jeton)
+        return trouves
+
+    def _chercher(self, noms):
+        """Sépare les fiches en cache des noms à charger ; le jeton sert à ranger les fiches chargées."""
+        maintenant = time.monotonic()
+        trouves, manquants = {}, []
+        with self.verrou:
+            for nom in set(noms):
+                entree = self.entrees.get(nom)
+                if entree is not None and entree[0] > maintenant:
+                    self.entrees.move_to_end(nom)
+                    trouves[nom] = dict(entree[1])
+                    self.hits += 1
+                else:
+                    manquants.append(nom)
+                    self.misses += 1
+            versions = {nom: self.versions.get(nom, 0) for nom in manquants}
+            return trouves, manquants, (maintenant, self.generation, versions)
+
+    def _completer(self, trouves, charges, jeton):
+        maintenant, generation, versions = jeton
+        with self.verrou:
+            for nom, fiche in charges.items():
+                if generation == self.generation and versions[nom] == self.versions.get(nom, 0):
+                    self._ranger(nom, fiche, maintenant)
+                trouves[nom] = dict(fiche)
+
+    def mettre_a_jour_soldes(self, soldes, nonces=None):
+        """Écriture directe des soldes {nom: solde_unites} (et derniers nonces {nom: nonce}) après un commit réussi."""
+        maintenant = time.monotonic()
+        nonces = nonces or {}
+        with self.verrou:
+            for nom, solde in soldes.items():
+                self.versions[nom] = self.versions.get(nom, 0) + 1
+                entree = self.entrees.get(nom)
+                if entree is not None:
+                    fiche = dict(entree[1], solde_unites=solde)
+                    if nom in nonces:
+                        fiche['dernier_nonce'] = nonces[nom]
+                    self._ranger(nom, fiche, maintenant)
+
+    def invalider(self, nom=None):
+        """Oublie un client, ou tout le cache si `nom` est None (modification hors API de la base)."""
+        with self.verrou:
+            if nom is None:
+                self.entrees.clear()
+                self.versions.clear()
+                self.generation += 1
+            else:
+                self.entrees.pop(nom, None)
+                self.versions[nom] = self.versions.get(nom, 0) + 1
+
+    def stats(self):
+        with self.verrou:
+            total = self.hits + self.misses
+            return {
+                "taille": len(self.entrees), "taille_max": self.taille_max, "ttl": self.ttl,
+                "hits": self.hits, "misses": self.misses,
+                "taux_hit": round(self.hits / total, 4) if total else 0.0,
+            }
+
+    def _ranger(self, nom, fiche, maintenant):
+        self.entrees[nom] = (maintenant + self.ttl, fiche)
+        self.entrees.move_to_end(nom)
+        while len(self.entrees) > self.taille_max:
+            self.entrees.popitem(last=False)
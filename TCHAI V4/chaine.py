@@ -0,0 +1,127 @@
+import json
+import struct
+import hashlib
+from decimal import Decimal, InvalidOperation
+from datetime import datetime, timedelta
+
+# Fonctions de hachage de la chaîne, partagées entre le serveur et les outils
+# hors-ligne (aucune dépendance à Flask ni à la base).
+
+TIMESTAMP_FORMAT_HASH = "%Y-%m-%dT%H:%M:%S.%f"
+
+# Les montants sont stockés en entiers d'unités mineures (centimes) : 2.5 -> 250
+UNITES_PAR_TCHAI = 100
+
+# Format de hachage d'une transaction :
+#  - 4 : JSON trié de (P1, P2, t, a, prev_h), montant flottant (transactions historiques)
+#  - 5 : encodage binaire de taille fixe, montant entier en unités mineures
+FORMAT_JSON = 4
+FORMAT_BINAIRE = 5
+
+EPOCH = datetime(1970, 1, 1)
+
+def calculer_hash_transaction(p1, p2, montant, timestamp_str, hash_precedent):
+    data = {"P1": p1, "P2": p2, "t": timestamp_str, "a": montant, "prev_h": hash_precedent}
+    encoded = json.dumps(data, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+def calculer_hash_transaction_v5(p1, p2, montant_unites, timestamp_us, hash_precedent):
+    """
+    SHA-256 de l'encodage binaire canonique de (P1, P2, t, a, prev_h) :
+    version (1 octet) | len(P1) (2 octets) | P1 | len(P2) | P2 | t en µs (8 octets)
+    | a en unités mineures (8 octets) | prev_h (32 octets, zéros pour la genèse).
+    """
+    p1_b = p1.encode('utf-8')
+    p2_b = p2.encode('utf-8')
+    prev_b = bytes.fromhex(hash_precedent) if hash_precedent != "0" else bytes(32)
+    encoded = b''.join((
+        struct.pack('>BH', FORMAT_BINAIRE, len(p1_b)), p1_b,
+        struct.pack('>H', len(p2_b)), p2_b,
+        struct.pack('>qq', timestamp_us, montant_unites), prev_b,
+    ))
+    return hashlib.sha256(encoded).hexdigest()
+
+def timestamp_en_us(timestamp):
+    """Microsecondes depuis l'epoch d'une date UTC naïve (telle que relue depuis SQLite)."""
+    return (timestamp.replace(tzinfo=None) - EPOCH) // timedelta(microseconds=1)
+
+def montant_en_unites(valeur):
+    """
+    Convertit un montant saisi (2.5, "2.50", 3) en unités mineures ; ValueError
+    s'il est nul, négatif (P1 prendrait l'argent de P2) ou trop précis.
+    """
+    try:
+        unites = Decimal(str(valeur)) * UNITES_PAR_TCHAI
+    except InvalidOperation:
+        raise ValueError(f"Montant invalide : {valeur!r}")
+    if not unites.is_finite() or abs(unites) >= 2 ** 63:
+        raise ValueError(f"Montant invalide : {valeur!r}")
+    if unites != unites.to_integral_value():
+        raise ValueError(f"Montant trop précis : {valeur!r} (2 décimales au plus)")
+    if unites <= 0:
+        raise ValueError(f"Montant invalide : {valeur!r} (strictement positif)")
+    return int(unites)
+
+def hash_ligne(format_hash, p1, p2, montant, montant_unites, timestamp, hash_precedent):
+    """
+    Recalcule le hash d'une transaction stockée selon son format (compatibilité avec les lignes v4).
+
+    Le montant existe en double (flottant historique et entier) : une seule des deux
+    colonnes est hachée, l'autre doit concorder, sinon la ligne a été altérée et
+    on renvoie None.
+    """
+    if montant_unites is None or round(montant * UNITES_PAR_TCHAI) != montant_unites:
+        return None
+    if format_hash == FORMAT_BINAIRE:
+        return calculer_hash_transaction_v5(p1, p2, montant_unites, timestamp_en_us(timestamp), hash_precedent)
+    return calculer_hash_transaction(p1, p2, montant, timestamp.strftime(TIMESTAMP_FORMAT_HASH), hash_precedent)
+
+# Message signé par l'émetteur d'un virement (version 2, avec nonce anti-rejeu)
+PREFIXE_MESSAGE = b"tchai-virement"
+VERSION_MESSAGE = 2
+NONCE_MAX = 2 ** 63 - 1
+
+def message_virement(p1, p2, montant_unites, nonce):
+    """
+    Encodage canonique du virement à signer :
+    préfixe | version (1 octet) | len(P1) (2 octets) | P1 | len(P2) | P2
+    | a en unités mineures (8 octets) | nonce (8 octets).
+    Les longueurs rendent l'encodage sans ambiguïté ("Yo" + "yoWiwi" != "Yoyo" + "Wiwi").
+    """
+    p1_b = p1.encode('utf-8')
+    p2_b = p2.encode('utf-8')
+    return b''.join((
+        PREFIXE_MESSAGE, struct.pack('>BH', VERSION_MESSAGE, len(p1_b)), p1_b,
+        struct.pack('>H', len(p2_b)), p2_b,
+        struct.pack('>qq', montant_unites, nonce),
+    ))
+
+def lire_nonce(valeur):
+    """Nonce d'un virement : entier de 1 à NONCE_MAX, strictement croissant par émetteur ; ValueError sinon."""
+    if isinstance(valeur, bool) or not isinstance(valeur, int) or not 0 < valeur <= NONCE_MAX:
+        raise ValueError(f"Nonce invalide : {valeur!r} (entier de 1 à {NONCE_MAX})")
+    return valeur
+
+def lire_virement(donnees):
+    """
+    (P1, P2, a en unités mineures, nonce, signature) d'un virement signé reçu en
+    JSON. Lève KeyError si un champ manque et ValueError si un champ est du
+    mauvais type : les noms et la signature doivent être des chaînes, la
+    signature en hexadécimal.
+    """
+    if not isinstance(donnees, dict):
+        raise ValueError("Virement invalide : objet JSON {P1, P2, a, nonce, signature} attendu.")
+    p1, p2, signature = donnees['P1'], donnees['P2'], donnees['signature']
+    if not isinstance(p1, str) or not isinstance(p2, str):
+        raise ValueError("P1 et P2 doivent être des noms de clients (chaînes).")
+    try:
+        bytes.fromhex(signature)
+    except (TypeError, ValueError):
+        raise ValueError("Signature illisible : chaîne hexadécimale attendue.") from None
+    return p1, p2, montant_en_unites(donnees['a']), lire_nonce(donnees['nonce']), signature
+
+def calculer_hash_bloc(hauteur, premier_id, dernier_id, racine_merkle, timestamp_str, hash_precedent):
+    data = {"n": hauteur, "de": premier_id, "a": dernier_id, "merkle": racine_merkle,
+            "t": timestamp_str, "prev_h": hash_precedent}
+    encoded = json.dumps(data, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
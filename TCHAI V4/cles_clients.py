@@ -0,0 +1,83 @@
+import os
+import threading
+
+# Lecture des clés publiques des clients (fichiers <nom>_public.pem) pour
+# l'import en masse et le rechargement à chaud (voir tchai4.importer_cles).
+
+SUFFIXE_CLE_PUBLIQUE = "_public.pem"
+TAILLE_NOM_MAX = 80  # longueur de la colonne client.nom
+
+
+def lire_cles_dossier(dossier, fichiers=None):
+    """Renvoie {nom: PEM} pour les fichiers *_public.pem de `dossier` (ou seulement `fichiers`)."""
+    if fichiers is None:
+        fichiers = [f for f in os.listdir(dossier) if f.endswith(SUFFIXE_CLE_PUBLIQUE)]
+    cles = {}
+    for fichier in fichiers:
+        with open(os.path.join(dossier, fichier), 'r') as f:
+            cles[fichier[:-len(SUFFIXE_CLE_PUBLIQUE)]] = f.read()
+    return cles
+
+
+def valider_cle(nom, pem):
+    """Lève ValueError si le nom ou la clé publique (PEM, courbe SECP256K1) n'est pas utilisable."""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+
+    if not isinstance(nom, str) or not nom or len(nom) > TAILLE_NOM_MAX:
+        raise ValueError(f"Nom de client invalide (1 à {TAILLE_NOM_MAX} caractères).")
+    try:
+        cle = serialization.load_pem_public_key(pem.encode('utf-8'))
+    except (ValueError, TypeError, AttributeError):
+        raise ValueError("Clé publique PEM illisible.") from None
+    if not isinstance(cle, ec.EllipticCurvePublicKey) or not isinstance(cle.curve, ec.SECP256K1):
+        raise ValueError("La clé publique doit être une clé ECDSA SECP256K1.")
+
+
+class SurveillantCles:
+    """
+    Surveille un dossier de clés publiques et appelle `rappel({nom: PEM})` pour
+    les fichiers nouveaux ou modifiés (rotation de clé). Le dossier est relu
+    toutes les `periode` secondes ; seules les dates et tailles sont comparées.
+
+    Le premier passage, au démarrage, transmet tous les fichiers : le rappel
+    les compare à la base (tchai4.importer_cles n'écrit que les clés absentes
+    ou différentes), ce qui rattrape les clés déposées pendant un arrêt du
+    serveur.
+    """
+
+    def __init__(self, dossier, rappel, periode=5.0):
+        self.dossier = dossier
+        self.rappel = rappel
+        self.periode = periode
+        self.vus = {}  # fichier -> (mtime_ns, taille) déjà transmis au rappel
+        self.arret = threading.Event()
+        self.thread = threading.Thread(target=self._boucle, name="surveillant-cles", daemon=True)
+
+    def demarrer(self):
+        self.thread.start()
+
+    def arreter(self):
+        self.arret.set()
+
+    def _etat(self):
+        etat = {}
+        for entree in os.scandir(self.dossier):
+            if entree.name.endswith(SUFFIXE_CLE_PUBLIQUE) and entree.is_file():
+                infos = entree.stat()
+                etat[entree.name] = (infos.st_mtime_ns, infos.st_size)
+        return etat
+
+    def _boucle(self):
+        while True:
+            try:
+                etat = self._etat()
+                modifies = [f for f, signature in etat.items() if self.vus.get(f) != signature]
+                if modifies:
+                    self.rappel(lire_cles_dossier(self.dossier, modifies))
+                self.vus = etat
+            except Exception as e:
+                # Un fichier en cours d'écriture sera relu au tour suivant
+                print(f"Surveillance des clés : {e}")
+            if self.arret.wait(self.periode):
+                return
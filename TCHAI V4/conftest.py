@@ -0,0 +1,56 @@
+import os
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+import tchai4
+from chaine import TIMESTAMP_FORMAT_HASH, calculer_hash_transaction
+
+# Fixtures communes des tests (python -m pytest, depuis TCHAI V4)
+
+DOSSIER = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def nouvelle_app(tmp_path, monkeypatch):
+    """Fabrique d'applications tchai4 sur une base (et un journal) du dossier temporaire du test."""
+    # Les services sont des globales du module : chaque application de test refait la préparation de la base
+    monkeypatch.setattr(tchai4, "base_prete", False)
+
+    def creer(**config):
+        return tchai4.creer_app({
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'tchai4.db'}",
+            "TCHAI_JOURNAL_DOSSIER": str(tmp_path / "journal"), "TCHAI_JOURNAL_FSYNC": False,
+            "TCHAI_BLOC_DELAI": 0, "TCHAI_CLES_DOSSIER": DOSSIER, **config,
+        })
+    return creer
+
+
+@pytest.fixture
+def client(nouvelle_app):
+    """Client de test d'une application dont les clients Yoyo, Wiwi et Elsa sont importés."""
+    app = nouvelle_app()
+    with app.app_context():
+        tchai4.provisionner(DOSSIER)
+    return app.test_client()
+
+
+def creer_base_v4(chemin):
+    """Base au schéma d'origine : client(id, nom, solde, cle_publique) et une transaction hachée en v4."""
+    con = sqlite3.connect(chemin)
+    con.executescript('''
+        CREATE TABLE client (id INTEGER PRIMARY KEY, nom VARCHAR(80) NOT NULL UNIQUE, solde FLOAT,
+                             cle_publique TEXT NOT NULL);
+        CREATE TABLE "transaction" (id INTEGER PRIMARY KEY, p1_nom VARCHAR(80) NOT NULL, p2_nom VARCHAR(80) NOT NULL,
+                                    montant FLOAT NOT NULL, timestamp DATETIME, hash VARCHAR(64) NOT NULL UNIQUE);
+    ''')
+    for nom, solde in (("Yoyo", 95.0), ("Wiwi", 105.0), ("Elsa", 100.0)):
+        with open(os.path.join(DOSSIER, f"{nom}_public.pem")) as f:
+            con.execute("INSERT INTO client (nom, solde, cle_publique) VALUES (?, ?, ?)", (nom, solde, f.read()))
+    t = datetime(2025, 3, 1, 10, 30, 0, 123456)
+    h = calculer_hash_transaction("Yoyo", "Wiwi", 5.0, t.strftime(TIMESTAMP_FORMAT_HASH), "0")
+    con.execute('INSERT INTO "transaction" (p1_nom, p2_nom, montant, timestamp, hash) VALUES (?, ?, ?, ?, ?)',
+                ("Yoyo", "Wiwi", 5.0, t.isoformat(sep=" "), h))
+    con.commit()
+    con.close()
@@ -0,0 +1,174 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from sqlalchemy.orm import Session
+from metriques import INERTE
+
+class EcrivainChaine:
+    """
+    File d'ajout à écrivain unique.
+
+    Toutes les écritures dans la chaîne sont exécutées par un seul thread, dans
+    une transaction SQLite ouverte avec BEGIN IMMEDIATE (ce qui sérialise aussi
+    les écrivains de processus différents). Les requêtes en attente sont
+    regroupées : chaque tâche s'exécute dans son propre SAVEPOINT et le groupe
+    est validé en un seul commit. La lecture et la vérification des signatures
+    restent parallèles dans les threads des requêtes.
+
+    Le dépôt du registre (`depot`, table SQLite ou journal) suit la même
+    transaction : ses ajouts sont annulés avec le SAVEPOINT d'une tâche en échec
+    ou avec le groupe, écrits sur disque juste avant le commit SQLite
+    (preparer) et rendus visibles juste après (valider).
+
+    `etapes` (histogramme de metriques.py, étiquette `etape`) reçoit l'attente
+    de chaque tâche dans la file et la durée des commits.
+
+    L'écrivain garde sa propre connexion SQLite : `db.session` y est lié
+    pendant l'exécution d'un groupe. La tête de la chaîne n'est relue que si
+    une autre connexion a écrit dans la base (voir _verifier_tete).
+    """
+
+    def __init__(self, app, db, tete_chaine, depot, taille_groupe_max=256, etapes=INERTE):
+        self.app = app
+        self.db = db
+        self.tete_chaine = tete_chaine
+        self.depot = depot
+        self.taille_groupe_max = taille_groupe_max
+        self.etapes = etapes
+        self.file = queue.Queue()
+        # Tâche exécutée périodiquement par l'écrivain quand la file est calme
+        self.tache_periodique = None
+        self.periode = None
+        # Actions à exécuter une fois le groupe validé (mise à jour des caches, ...)
+        self.rappels = []
+        self.connexion = None
+        self.data_version = None
+        self.thread = None
+        self.verrou = threading.Lock()
+
+    def demarrer(self):
+        with self.verrou:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._boucle, name="ecrivain-chaine", daemon=True)
+                self.thread.start()
+
+    def soumettre(self, tache, *args):
+        """Exécute `tache(*args)` sur le thread écrivain et renvoie son résultat (ou relève son exception)."""
+        return self.deposer(tache, *args).result()
+
+    def deposer(self, tache, *args):
+        """Comme soumettre(), sans attendre : `tache(*args)` est validée avec un prochain groupe. Renvoie le Future."""
+        self.demarrer()
+        futur = Future()
+        self.file.put((tache, args, futur, time.perf_counter()))
+        return futur
+
+    def apres_commit(self, rappel):
+        """
+        Depuis une tâche : programme `rappel()` pour après le commit du groupe
+        (ignoré si la tâche échoue). Une exception du rappel est journalisée :
+        elle n'empêche ni les autres rappels ni les réponses aux tâches.
+        """
+        self.rappels.append(rappel)
+
+    def programmer(self, tache, periode):
+        """Exécute `tache()` sur le thread écrivain toutes les `periode` secondes, même sous charge."""
+        self.tache_periodique = tache
+        self.periode = periode
+        self.demarrer()
+
+    def _boucle(self):
+        prochaine_execution = time.monotonic()
+        while True:
+            attente = None
+            if self.tache_periodique is not None:
+                attente = prochaine_execution - time.monotonic()
+                if attente <= 0:
+                    prochaine_execution = time.monotonic() + self.periode
+                    with self.app.app_context():
+                        self._executer_groupe([(self.tache_periodique, (), Future(), time.perf_counter())])
+                    continue
+            try:
+                premier = self.file.get(timeout=attente)
+            except queue.Empty:
+                continue
+            groupe = [premier]
+            while len(groupe) < self.taille_groupe_max:
+                try:
+                    groupe.append(self.file.get_nowait())
+                except queue.Empty:
+                    break
+            with self.app.app_context():
+                self._executer_groupe(groupe)
+
+    def _ouvrir_session(self):
+        """Session du groupe, liée à la connexion de l'écrivain (rouverte si elle a été invalidée)."""
+        if self.connexion is None or self.connexion.invalidated:
+            self.connexion = self.db.engine.connect()
+            self.data_version = None
+        # Les tâches utilisent db.session : dans ce contexte d'application, c'est cette session
+        self.db.session.registry.set(Session(bind=self.connexion))
+        return self.db.session
+
+    def _verifier_tete(self):
+        """
+        Relit la tête de la chaîne si une autre connexion (autre processus,
+        modification à la main) a validé quelque chose depuis le groupe
+        précédent. PRAGMA data_version ne change pas pour les commits de la
+        connexion elle-même : sans écrivain extérieur, la tête gardée en
+        mémoire reste valable et n'est pas relue. Appelé sous le verrou
+        d'écriture SQLite (BEGIN IMMEDIATE).
+        """
+        version = self.connexion.exec_driver_sql("PRAGMA data_version").scalar()
+        if version != self.data_version:
+            self.data_version = version
+            self.tete_chaine.recharger()
+
+    def _executer_groupe(self, groupe):
+        session = self._ouvrir_session()
+        resultats = []
+        self.rappels = []
+        marque_groupe = self.depot.marque()
+        try:
+            session.execute(self.db.text("BEGIN IMMEDIATE"))
+            self._verifier_tete()
+            for tache, args, futur, soumise in groupe:
+                self.etapes.observer(time.perf_counter() - soumise, "attente_ecrivain")
+                nb_rappels = len(self.rappels)
+                marque = self.depot.marque()
+                tete = self.tete_chaine.lire()
+                point = session.begin_nested()
+                try:
+                    resultats.append((futur, tache(*args), None))
+                    point.commit()
+                except Exception as e:
+                    point.rollback()
+                    self.depot.annuler(marque)
+                    # La tâche a pu avancer la tête avant d'échouer : on remet celle d'avant la tâche
+                    self.tete_chaine.avancer(*tete)
+                    del self.rappels[nb_rappels:]
+                    resultats.append((futur, None, e))
+            with self.etapes.mesurer("commit"):
+                # Le journal est écrit et synchronisé avant le commit, qui enregistre sa nouvelle tête
+                self.depot.preparer()
+                session.commit()
+                self.depot.valider()
+        except Exception as e:
+            session.rollback()
+            self.depot.annuler(marque_groupe)
+            self.tete_chaine.invalider()
+            for _, _, futur, _ in groupe:
+                futur.set_exception(e)
+            return
+
+        for rappel in self.rappels:
+            try:
+                rappel()
+            except Exception:
+                self.app.logger.exception("Rappel d'après commit en échec : %r", rappel)
+        for futur, resultat, erreur in resultats:
+            if erreur is not None:
+                futur.set_exception(erreur)
+            else:
+                futur.set_result(resultat)
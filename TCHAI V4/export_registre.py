@@ -0,0 +1,137 @@
+import io
+import csv
+import gzip
+import json
+import zlib
+from datetime import datetime
+from chaine import hash_ligne
+
+# Export et import du registre complet, en flux (sauvegarde, changement d'environnement).
+#
+# Une transaction exportée porte tout ce qu'il faut pour recalculer son hash :
+#   id, P1, P2, a (montant flottant stocké), a_unites, t (ISO 8601), hash, format (4 ou 5)
+# et le nonce du virement signé par P1 (vide pour les transactions historiques),
+# pour que le registre importé refuse toujours les rejeux.
+# Formats : JSONL (un objet par ligne) ou CSV avec en-tête, éventuellement
+# compressés en gzip. Les deux sens travaillent par morceaux : la mémoire ne
+# dépend pas de la taille du registre. Aucune dépendance à Flask ni à la base.
+
+FORMATS = ("jsonl", "csv")
+CHAMPS = ["id", "P1", "P2", "a", "a_unites", "t", "hash", "format", "nonce"]
+LIGNES_PAR_MORCEAU = 1000
+
+
+class ErreurImport(ValueError):
+    """Ligne illisible ou chaîne cassée dans un fichier importé (numéro de ligne de données)."""
+
+    def __init__(self, numero, message):
+        super().__init__(f"Ligne {numero} : {message}")
+        self.numero = numero
+
+
+def format_fichier(nom, format_demande=None):
+    """(format, compressé) d'après l'extension du fichier (.jsonl, .csv, suivies ou non de .gz)."""
+    nom = nom.lower()
+    compresse = nom.endswith(".gz")
+    if compresse:
+        nom = nom[:-3]
+    return format_demande or ("csv" if nom.endswith(".csv") else "jsonl"), compresse
+
+
+# --- Export ---
+
+def en_ligne(t, nonce):
+    """Transaction du dépôt (table ou journal) et son nonce -> valeurs exportées, dans l'ordre de CHAMPS."""
+    return [t.id, t.p1_nom, t.p2_nom, t.montant, t.montant_unites, t.timestamp.isoformat(), t.hash, t.format_hash, nonce]
+
+
+def encoder(transactions, format_export):
+    """
+    Texte exporté à partir de (transaction, nonce ou None), par morceaux de
+    LIGNES_PAR_MORCEAU transactions (l'en-tête d'abord en CSV).
+    """
+    tampon = io.StringIO()
+    ecrivain = csv.writer(tampon, lineterminator="\n")
+    if format_export == "csv":
+        ecrivain.writerow(CHAMPS)
+    n = 0
+    for t, nonce in transactions:
+        if format_export == "csv":
+            ecrivain.writerow(en_ligne(t, nonce))
+        else:
+            tampon.write(json.dumps(dict(zip(CHAMPS, en_ligne(t, nonce))), ensure_ascii=False) + "\n")
+        n += 1
+        if n % LIGNES_PAR_MORCEAU == 0:
+            yield tampon.getvalue()
+            tampon.seek(0)
+            tampon.truncate()
+    if tampon.tell():
+        yield tampon.getvalue()
+
+
+def compresser(morceaux):
+    """Compresse en gzip, au fil de l'eau, des morceaux de texte."""
+    compresseur = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for morceau in morceaux:
+        donnees = compresseur.compress(morceau.encode("utf-8"))
+        if donnees:
+            yield donnees
+    yield compresseur.flush()
+
+
+# --- Import ---
+
+def ouvrir_texte(flux_binaire, compresse):
+    """Flux texte UTF-8 lisible ligne à ligne, décompressé au fil de la lecture si besoin."""
+    if compresse:
+        flux_binaire = gzip.GzipFile(fileobj=flux_binaire, mode="rb")
+    return io.TextIOWrapper(flux_binaire, encoding="utf-8", newline="")
+
+
+def lire(flux_texte, format_import):
+    """
+    Produit les transactions {id, p1_nom, p2_nom, montant, montant_unites,
+    timestamp, hash, format_hash, nonce} (nonce None si absent : transaction
+    historique, ou export d'avant les nonces).
+    """
+    if format_import == "csv":
+        enregistrements = csv.DictReader(flux_texte)
+    else:
+        enregistrements = (ligne for ligne in flux_texte if ligne.strip())
+    numero = 0
+    try:
+        for e in enregistrements:
+            numero += 1
+            if format_import != "csv":
+                e = json.loads(e)
+            yield {
+                "id": int(e["id"]), "p1_nom": e["P1"], "p2_nom": e["P2"], "montant": float(e["a"]),
+                "montant_unites": int(e["a_unites"]), "timestamp": datetime.fromisoformat(e["t"]),
+                "hash": e["hash"], "format_hash": int(e["format"]),
+                "nonce": int(e["nonce"]) if e.get("nonce") not in (None, "") else None,
+            }
+    except (KeyError, TypeError, ValueError) as e:
+        raise ErreurImport(numero, f"enregistrement illisible ({type(e).__name__}: {e})") from None
+
+
+def verifier_suite(transactions, id_tete, hash_tete, bilan):
+    """
+    Re-vérifie le chaînage des transactions lues et ne produit que celles qui
+    suivent la tête (id_tete, hash_tete) du registre. Les transactions déjà
+    présentes (id <= id_tete) sont comptées dans bilan["deja_presentes"] : un
+    import interrompu peut être relancé avec le même fichier. Lève ErreurImport
+    au premier trou dans les ids ou au premier hash qui ne se recalcule pas.
+    """
+    id_precedent, hash_precedent = id_tete, hash_tete
+    for numero, t in enumerate(transactions, start=1):
+        if t["id"] <= id_tete and id_precedent == id_tete:
+            bilan["deja_presentes"] += 1
+            continue
+        if t["id"] != id_precedent + 1:
+            raise ErreurImport(numero, f"id {t['id']} inattendu (attendu : {id_precedent + 1}).")
+        recalcule = hash_ligne(t["format_hash"], t["p1_nom"], t["p2_nom"], t["montant"], t["montant_unites"],
+                               t["timestamp"], hash_precedent)
+        if recalcule != t["hash"]:
+            raise ErreurImport(numero, f"chaîne cassée ou données altérées (id {t['id']}).")
+        id_precedent, hash_precedent = t["id"], t["hash"]
+        yield t
@@ -0,0 +1,129 @@
+import time
+import threading
+from collections import OrderedDict
+
+# États renvoyés par CacheIdempotence.commencer()
+NOUVELLE = "nouvelle"  # première requête avec cette clé : à traiter puis terminer()/abandonner()
+REJOUEE = "rejouee"  # réponse déjà envoyée pour cette clé et ce corps : à renvoyer telle quelle
+EN_COURS = "en_cours"  # la même clé est en cours de traitement (nouvel essai trop rapide)
+CONFLIT = "conflit"  # clé déjà utilisée avec un autre corps de requête
+
+TAILLE_CLE_MAX = 255
+
+def lire_cle(valeur):
+    """Valide l'en-tête Idempotency-Key (None si absent) ; lève ValueError si elle est invalide."""
+    if valeur is None:
+        return None
+    if not 0 < len(valeur) <= TAILLE_CLE_MAX or not valeur.isprintable():
+        raise ValueError(f"Idempotency-Key invalide (1 à {TAILLE_CLE_MAX} caractères imprimables).")
+    return valeur
+
+class CacheIdempotence:
+    """
+    Réponses déjà envoyées, par Idempotency-Key, pour renvoyer la même réponse
+    aux nouveaux essais d'un client sans revérifier la signature ni toucher au
+    registre.
+
+    Cache LRU borné en mémoire devant une table persistante : une clé absente
+    de la mémoire est cherchée via `charger(cle)`, qui renvoie
+    (expiration, empreinte, statut, corps) ou None. Les réponses expirent après
+    `ttl` secondes (heure murale : l'expiration est aussi écrite en base).
+
+    Une réponse est liée à l'empreinte du corps de la requête : la même clé avec
+    un autre corps est un conflit, jamais la réponse d'un autre virement. Les
+    clés en cours de traitement sont suivies dans ce processus seulement ; entre
+    processus, le nonce du virement empêche toujours un double débit.
+    """
+
+    def __init__(self, charger, ttl=86400.0, taille_max=10000):
+        self.charger = charger
+        self.ttl = ttl
+        self.taille_max = taille_max
+        self.entrees = OrderedDict()  # cle -> (expiration, empreinte, statut, corps)
+        self.en_cours = {}  # cle -> empreinte
+        self.verrou = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def commencer(self, cle, empreinte):
+        """(état, (statut, corps) ou None) ; NOUVELLE réserve la clé pour ce processus."""
+        etat = self._chercher(cle, empreinte)
+        if etat is not None:
+            return etat
+        return self._reserver(cle, empreinte, self.charger(cle))
+
+    async def commencer_async(self, cle, empreinte, charger):
+        """Variante pour le serveur asynchrone : `charger(cle)` est une coroutine."""
+        etat = self._chercher(cle, empreinte)
+        if etat is not None:
+            return etat
+        return self._reserver(cle, empreinte, await charger(cle))
+
+    def terminer(self, cle, empreinte, statut, corps):
+        """Garde la réponse envoyée pour `cle` ; renvoie son expiration (à écrire en base)."""
+        expiration = time.time() + self.ttl
+        with self.verrou:
+            self.en_cours.pop(cle, None)
+            self._ranger(cle, (expiration, empreinte, statut, corps))
+        return expiration
+
+    def abandonner(self, cle):
+        """Libère une clé sans garder de réponse (erreur serveur : un nouvel essai sera traité)."""
+        with self.verrou:
+            self.en_cours.pop(cle, None)
+
+    def stats(self):
+        with self.verrou:
+            total = self.hits + self.misses
+            return {
+                "taille": len(self.entrees), "taille_max": self.taille_max, "ttl": self.ttl,
+                "en_cours": len(self.en_cours), "hits": self.hits, "misses": self.misses,
+                "taux_hit": round(self.hits / total, 4) if total else 0.0,
+            }
+
+    def _chercher(self, cle, empreinte):
+        """État si la clé est connue en mémoire, None s'il faut consulter la base."""
+        with self.verrou:
+            entree = self._lire(cle)
+            if entree is not None:
+                return self._rejouer(cle, entree, empreinte)
+            if cle in self.en_cours:
+                return EN_COURS, None
+        return None
+
+    def _reserver(self, cle, empreinte, entree):
+        with self.verrou:
+            if entree is not None and entree[0] <= time.time():
+                entree = None
+            # Terminée ou réservée par un autre thread pendant la lecture en base
+            entree = self._lire(cle) or entree
+            if entree is not None:
+                self._ranger(cle, entree)
+                return self._rejouer(cle, entree, empreinte)
+            if cle in self.en_cours:
+                return EN_COURS, None
+            self.en_cours[cle] = empreinte
+            self.misses += 1
+            return NOUVELLE, None
+
+    def _rejouer(self, cle, entree, empreinte):
+        if entree[1] != empreinte:
+            return CONFLIT, None
+        self.hits += 1
+        return REJOUEE, (entree[2], entree[3])
+
+    def _lire(self, cle):
+        entree = self.entrees.get(cle)
+        if entree is None:
+            return None
+        if entree[0] <= time.time():
+            del self.entrees[cle]
+            return None
+        self.entrees.move_to_end(cle)
+        return entree
+
+    def _ranger(self, cle, entree):
+        self.entrees[cle] = entree
+        self.entrees.move_to_end(cle)
+        while len(self.entrees) > self.taille_max:
+            self.entrees.popitem(last=False)
@@ -0,0 +1,343 @@
+import os
+import mmap
+import struct
+import threading
+from datetime import timedelta
+from collections import namedtuple
+from chaine import EPOCH, FORMAT_BINAIRE, UNITES_PAR_TCHAI
+
+# Stockage du registre dans un journal en ajout seul, alternative à la table SQLite.
+#
+# Les transactions sont écrites à la suite dans des segments de taille fixe
+# (segment-000000.journal, ...). Chaque enregistrement fait TAILLE_ENREGISTREMENT
+# octets. Un index annexe (index.idx) donne pour chaque id la position de son
+# enregistrement. Les lectures et les parcours d'intégrité passent par mmap :
+# les champs sont décodés directement dans la projection du fichier.
+#
+# Le journal suit la transaction SQLite de l'écrivain : ajouter() garde les
+# enregistrements en mémoire (visibles du seul thread écrivain), preparer() les
+# écrit et les synchronise sur disque juste avant le commit SQLite, qui enregistre
+# aussi la nouvelle tête du journal (enregistrer_tete). valider() les rend
+# visibles aux lecteurs après le commit ; annuler() les oublie (et les retire des
+# fichiers) après un rollback. Après un arrêt entre preparer() et le commit,
+# ouvrir() tronque le journal à la tête enregistrée dans SQLite (charger_tete) :
+# un virement validé en base est toujours dans le journal, et inversement.
+#
+# Le journal ne conserve que des transactions au format binaire v5. Il n'est
+# pas partagé entre processus : un seul serveur doit écrire dans un dossier donné.
+
+# id | t (µs) | a (unités) | format | len(P1) | P1 | len(P2) | P2 | hash | remplissage
+FORMAT_ENREGISTREMENT = '>qqqBB128sB128s32s3x'
+TAILLE_ENREGISTREMENT = struct.calcsize(FORMAT_ENREGISTREMENT)  # 318 octets
+TAILLE_NOM_MAX = 128
+FORMAT_INDEX = '>q'
+TAILLE_INDEX = struct.calcsize(FORMAT_INDEX)
+
+# Mêmes noms de champs que les lignes lues dans la table transaction (voir hash_ligne)
+LigneJournal = namedtuple('LigneJournal', 'id p1_nom p2_nom montant montant_unites timestamp hash format_hash')
+
+
+class JournalTransactions:
+    """
+    Registre en ajout seul, mêmes opérations que tchai4.DepotSQLite :
+    ouvrir, tete, ajouter, importer, marque, annuler, valider, lire, parcourir,
+    hash_avant, mouvements.
+
+    Créer l'objet ne touche pas au disque : les fichiers sont récupérés et
+    ouverts par ouvrir(), au démarrage du serveur. `charger_tete()` renvoie le
+    nombre d'enregistrements validés avec la base (None s'il n'a jamais été
+    enregistré) et `enregistrer_tete(nb)` l'écrit dans la transaction en cours.
+    """
+
+    def __init__(self, dossier, enregistrements_par_segment=1_000_000, fsync=True, charger_tete=None,
+                 enregistrer_tete=None):
+        self.dossier = dossier
+        self.par_segment = enregistrements_par_segment
+        self.fsync = fsync
+        self.charger_tete = charger_tete
+        self.enregistrer_tete = enregistrer_tete
+        self.verrou = threading.RLock()
+        self.projections = {}  # numéro de segment -> (mmap, taille projetée)
+        self.nb = 0  # enregistrements écrits dans les fichiers
+        self.dernier_hash = None
+        self.fd_index = None
+        self.fd_segment = None
+        self.segment_ouvert = None
+        # Enregistrements ajoutés par la transaction SQLite en cours : [(enregistrement, hash)]
+        self.en_attente = []
+        self.thread_attente = None
+        self.ecrits = 0  # enregistrements en attente déjà écrits dans les fichiers par preparer()
+
+    def ouvrir(self):
+        """
+        Remet le journal en état (voir _recuperer), le ramène à la tête validée
+        avec la base et ouvre l'index ; sans effet s'il est déjà ouvert. Lève
+        ValueError s'il manque au journal des enregistrements validés.
+        """
+        with self.verrou:
+            if self.fd_index is not None:
+                return
+            os.makedirs(self.dossier, exist_ok=True)
+            self.nb = self._recuperer()
+            valides = self.charger_tete() if self.charger_tete is not None else None
+            if valides is not None and self.nb < valides:
+                raise ValueError(f"Journal incomplet : {self.nb} enregistrements, {valides} validés en base.")
+            self.fd_index = os.open(self._chemin_index(), os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+            if valides is not None and self.nb > valides:
+                # Écrits par preparer() pour une transaction SQLite jamais validée (arrêt avant le commit)
+                self._tronquer(valides)
+                self.nb = valides
+            self.dernier_hash = self.lire(self.nb).hash if self.nb else None
+
+    # --- Fichiers ---
+
+    def _chemin_segment(self, numero):
+        return os.path.join(self.dossier, f"segment-{numero:06d}.journal")
+
+    def _chemin_index(self):
+        return os.path.join(self.dossier, "index.idx")
+
+    def _recuperer(self):
+        """
+        Remet le journal dans un état cohérent après un arrêt brutal : un
+        enregistrement écrit à moitié est tronqué et l'index est complété ou
+        raccourci pour correspondre aux segments.
+        """
+        nb = 0
+        numero = 0
+        while os.path.exists(self._chemin_segment(numero)):
+            chemin = self._chemin_segment(numero)
+            taille = os.path.getsize(chemin)
+            complets = min(taille // TAILLE_ENREGISTREMENT, self.par_segment)
+            if taille != complets * TAILLE_ENREGISTREMENT:
+                os.truncate(chemin, complets * TAILLE_ENREGISTREMENT)
+            nb += complets
+            if complets < self.par_segment:
+                break
+            numero += 1
+
+        chemin_index = self._chemin_index()
+        nb_indexes = os.path.getsize(chemin_index) // TAILLE_INDEX if os.path.exists(chemin_index) else 0
+        if nb_indexes > nb:
+            os.truncate(chemin_index, nb * TAILLE_INDEX)
+        elif nb_indexes < nb:
+            with open(chemin_index, 'ab') as f:
+                f.truncate(nb_indexes * TAILLE_INDEX)
+                f.write(b''.join(struct.pack(FORMAT_INDEX, position) for position in range(nb_indexes, nb)))
+        return nb
+
+    def _projection(self, numero, fin):
+        """
+        mmap du segment `numero` couvrant au moins `fin` octets (re-projeté si le
+        fichier a grossi). L'ancienne projection n'est pas fermée : un parcours
+        en cours la garde et elle est libérée avec sa dernière référence.
+        """
+        with self.verrou:
+            projection = self.projections.get(numero)
+            if projection is None or projection[1] < fin:
+                with open(self._chemin_segment(numero), 'rb') as f:
+                    taille = os.fstat(f.fileno()).st_size
+                    projection = (mmap.mmap(f.fileno(), taille, access=mmap.ACCESS_READ), taille)
+                self.projections[numero] = projection
+            return projection[0]
+
+    # --- Écriture ---
+
+    def ajouter(self, transactions):
+        """
+        Ajoute des transactions {p1_nom, p2_nom, montant_unites, timestamp, hash}
+        à la suite du journal, en attente jusqu'à valider() ou annuler().
+        Renvoie la liste des ids attribués.
+        """
+        with self.verrou:
+            debut = self.nb + len(self.en_attente)
+            enregistrements = []
+            for id_t, t in enumerate(transactions, start=debut + 1):
+                p1_b, p2_b = t['p1_nom'].encode('utf-8'), t['p2_nom'].encode('utf-8')
+                if len(p1_b) > TAILLE_NOM_MAX or len(p2_b) > TAILLE_NOM_MAX:
+                    raise ValueError("Nom de client trop long pour le journal.")
+                ts_us = (t['timestamp'].replace(tzinfo=None) - EPOCH) // timedelta(microseconds=1)
+                enregistrement = struct.pack(
+                    FORMAT_ENREGISTREMENT, id_t, ts_us, t['montant_unites'], FORMAT_BINAIRE,
+                    len(p1_b), p1_b, len(p2_b), p2_b, bytes.fromhex(t['hash']))
+                enregistrements.append((enregistrement, t['hash']))
+            self.en_attente.extend(enregistrements)
+            self.thread_attente = threading.get_ident()
+            return list(range(debut + 1, debut + 1 + len(enregistrements)))
+
+    def importer(self, transactions):
+        """
+        Ajoute des transactions importées, qui portent déjà leur id et leur
+        format : les ids doivent suivre la fin du journal et le format être v5.
+        """
+        if any(t['format_hash'] != FORMAT_BINAIRE for t in transactions):
+            raise ValueError("Le journal ne stocke que des transactions au format v5.")
+        with self.verrou:
+            nb = self.nb + len(self.en_attente)
+            if transactions and transactions[0]['id'] != nb + 1:
+                raise ValueError(f"Import à partir de l'id {transactions[0]['id']} : le journal s'arrête à {nb}.")
+            return self.ajouter(transactions)
+
+    def marque(self):
+        """Point de retour pour annuler() : le nombre d'enregistrements en attente."""
+        return len(self.en_attente)
+
+    def annuler(self, marque):
+        """
+        Oublie les enregistrements ajoutés depuis `marque` (rollback du SAVEPOINT
+        ou de la transaction SQLite), et les retire des fichiers si preparer()
+        les y avait déjà écrits.
+        """
+        with self.verrou:
+            del self.en_attente[marque:]
+            if self.ecrits > marque:
+                self._tronquer(self.nb + marque)
+                self.ecrits = marque
+
+    def preparer(self):
+        """
+        Écrit les enregistrements en attente avant le commit SQLite : un seul
+        write (et un seul fsync) par segment, puis l'index, puis la nouvelle
+        tête dans la transaction SQLite (enregistrer_tete). Les lecteurs ne les
+        voient qu'après valider(). Si l'écriture échoue, les fichiers sont
+        ramenés aux enregistrements validés et l'erreur est relevée : le
+        groupe est alors annulé.
+        """
+        with self.verrou:
+            if self.ecrits == len(self.en_attente):
+                return
+            debut = self.nb + self.ecrits
+            morceaux = {}  # numéro de segment -> enregistrements
+            for position, (enregistrement, _) in enumerate(self.en_attente[self.ecrits:], start=debut):
+                morceaux.setdefault(position // self.par_segment, []).append(enregistrement)
+            try:
+                for numero, enregistrements in sorted(morceaux.items()):
+                    fd = self._fd_segment(numero)
+                    os.write(fd, b''.join(enregistrements))
+                    if self.fsync:
+                        os.fsync(fd)
+                os.write(self.fd_index, b''.join(struct.pack(FORMAT_INDEX, p)
+                                                 for p in range(debut, self.nb + len(self.en_attente))))
+                if self.fsync:
+                    os.fsync(self.fd_index)
+            except OSError:
+                self._tronquer(self.nb)
+                self.ecrits = 0
+                raise
+            self.ecrits = len(self.en_attente)
+            if self.enregistrer_tete is not None:
+                self.enregistrer_tete(self.nb + self.ecrits)
+
+    def valider(self):
+        """Rend visibles aux lecteurs les enregistrements écrits par preparer(), une fois le commit SQLite fait."""
+        with self.verrou:
+            if not self.ecrits:
+                return
+            self.nb += self.ecrits
+            self.dernier_hash = self.en_attente[self.ecrits - 1][1]
+            del self.en_attente[:self.ecrits]
+            self.ecrits = 0
+
+    def _tronquer(self, nb):
+        """Ramène segments et index à `nb` enregistrements (les lecteurs ne lisent jamais au-delà de self.nb)."""
+        numero, rang = divmod(nb, self.par_segment)
+        if os.path.exists(self._chemin_segment(numero)):
+            os.truncate(self._chemin_segment(numero), rang * TAILLE_ENREGISTREMENT)
+            # La projection actuelle couvre la partie retirée : la prochaine lecture re-projette le fichier
+            self.projections.pop(numero, None)
+        suivant = numero + 1
+        while os.path.exists(self._chemin_segment(suivant)):
+            os.remove(self._chemin_segment(suivant))
+            self.projections.pop(suivant, None)
+            suivant += 1
+        if self.segment_ouvert is not None and self.segment_ouvert > numero:
+            os.close(self.fd_segment)
+            self.fd_segment = self.segment_ouvert = None
+        os.truncate(self._chemin_index(), nb * TAILLE_INDEX)
+
+    def _fd_segment(self, numero):
+        if self.segment_ouvert != numero:
+            if self.fd_segment is not None:
+                os.close(self.fd_segment)
+            self.fd_segment = os.open(self._chemin_segment(numero), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            self.segment_ouvert = numero
+        return self.fd_segment
+
+    # --- Lecture ---
+
+    def position(self, id_transaction):
+        """Position de l'enregistrement d'un id, lue dans l'index annexe."""
+        return struct.unpack(FORMAT_INDEX, os.pread(self.fd_index, TAILLE_INDEX, (id_transaction - 1) * TAILLE_INDEX))[0]
+
+    def _decoder(self, projection, decalage):
+        (id_t, ts_us, montant_unites, format_hash, l1, p1, l2, p2, h) = struct.unpack_from(
+            FORMAT_ENREGISTREMENT, projection, decalage)
+        return LigneJournal(
+            id_t, p1[:l1].decode('utf-8'), p2[:l2].decode('utf-8'), montant_unites / UNITES_PAR_TCHAI,
+            montant_unites, EPOCH + timedelta(microseconds=ts_us), h.hex(), format_hash)
+
+    def _attente_visible(self):
+        """
+        Enregistrements en attente visibles du thread appelant : comme dans une
+        transaction SQLite, seul l'écrivain voit ses ajouts pas encore validés.
+        """
+        return self.en_attente if self.thread_attente == threading.get_ident() else []
+
+    def lire(self, id_transaction):
+        nb = self.nb
+        if id_transaction > nb:
+            attente = self._attente_visible()
+            if id_transaction > nb + len(attente):
+                return None
+            return self._decoder(attente[id_transaction - nb - 1][0], 0)
+        if id_transaction < 1:
+            return None
+        numero, rang = divmod(self.position(id_transaction), self.par_segment)
+        decalage = rang * TAILLE_ENREGISTREMENT
+        return self._decoder(self._projection(numero, decalage + TAILLE_ENREGISTREMENT), decalage)
+
+    def parcourir(self, depuis_id=0, jusqu_id=None):
+        """Transactions d'id > depuis_id et <= jusqu_id, dans l'ordre, lues dans les projections mmap."""
+        nb, attente = self.nb, self._attente_visible()
+        fin = nb + len(attente) if jusqu_id is None else min(jusqu_id, nb + len(attente))
+        position = max(depuis_id, 0)
+        while position < min(fin, nb):
+            numero, rang = divmod(position, self.par_segment)
+            dernier_rang = min(self.par_segment, rang + min(fin, nb) - position)
+            projection = self._projection(numero, dernier_rang * TAILLE_ENREGISTREMENT)
+            for r in range(rang, dernier_rang):
+                yield self._decoder(projection, r * TAILLE_ENREGISTREMENT)
+            position += dernier_rang - rang
+        for enregistrement, _ in attente[max(position - nb, 0):max(fin - nb, 0)]:
+            yield self._decoder(enregistrement, 0)
+
+    def hash_avant(self, id_transaction):
+        """Hash stocké de la transaction qui précède `id_transaction` ("0" pour la genèse)."""
+        precedente = self.lire(min(id_transaction, self.nb + len(self._attente_visible()) + 1) - 1)
+        return precedente.hash if precedente is not None else "0"
+
+    def mouvements(self, depuis_id, jusqu_id):
+        """Crédits et débits {nom: unités} des transactions de la plage (un parcours séquentiel)."""
+        credits, debits = {}, {}
+        for t in self.parcourir(depuis_id, jusqu_id):
+            credits[t.p2_nom] = credits.get(t.p2_nom, 0) + t.montant_unites
+            debits[t.p1_nom] = debits.get(t.p1_nom, 0) + t.montant_unites
+        return credits, debits
+
+    def tete(self):
+        attente = self._attente_visible()
+        if attente:
+            return self.nb + len(attente), attente[-1][1]
+        return (self.nb, self.dernier_hash) if self.nb else None
+
+    def fermer(self):
+        with self.verrou:
+            for projection, _ in self.projections.values():
+                projection.close()
+            self.projections.clear()
+            if self.fd_segment is not None:
+                os.close(self.fd_segment)
+                self.fd_segment = self.segment_ouvert = None
+            if self.fd_index is not None:
+                os.close(self.fd_index)
+                self.fd_index = None
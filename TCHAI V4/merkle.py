@@ -0,0 +1,52 @@
+import hashlib
+
+# Arbre de Merkle des transactions d'un bloc.
+#
+# Les feuilles sont les hashs des transactions. Pour éviter qu'un nœud interne
+# puisse être présenté comme une feuille, on préfixe les feuilles par 0x00 et
+# les nœuds par 0x01 (comme la RFC 6962). Un nœud sans frère est remonté tel
+# quel au niveau supérieur (pas de duplication du dernier élément).
+
+def hacher_feuille(hash_transaction):
+    return hashlib.sha256(b'\x00' + bytes.fromhex(hash_transaction)).digest()
+
+def hacher_noeud(gauche, droite):
+    return hashlib.sha256(b'\x01' + gauche + droite).digest()
+
+def niveau_superieur(niveau):
+    suivant = [hacher_noeud(niveau[i], niveau[i + 1]) for i in range(0, len(niveau) - 1, 2)]
+    if len(niveau) % 2:
+        suivant.append(niveau[-1])
+    return suivant
+
+def racine_merkle(hashs_transactions):
+    """Racine (hexadécimale) de l'arbre construit sur la liste ordonnée des hashs."""
+    niveau = [hacher_feuille(h) for h in hashs_transactions]
+    if not niveau:
+        return hashlib.sha256(b'').hexdigest()
+    while len(niveau) > 1:
+        niveau = niveau_superieur(niveau)
+    return niveau[0].hex()
+
+def preuve_merkle(hashs_transactions, index):
+    """
+    Preuve d'inclusion de la transaction d'indice `index` : la liste des hashs
+    frères (de la feuille vers la racine) avec leur position, soit O(log n) éléments.
+    """
+    niveau = [hacher_feuille(h) for h in hashs_transactions]
+    preuve = []
+    while len(niveau) > 1:
+        frere = index ^ 1
+        if frere < len(niveau):
+            preuve.append({"hash": niveau[frere].hex(), "position": "gauche" if frere < index else "droite"})
+        niveau = niveau_superieur(niveau)
+        index //= 2
+    return preuve
+
+def verifier_preuve(hash_transaction, preuve, racine):
+    """Recalcule la racine à partir d'une transaction et de sa preuve (utilisable par un auditeur)."""
+    courant = hacher_feuille(hash_transaction)
+    for etape in preuve:
+        frere = bytes.fromhex(etape["hash"])
+        courant = hacher_noeud(frere, courant) if etape["position"] == "gauche" else hacher_noeud(courant, frere)
+    return courant.hex() == racine
@@ -0,0 +1,134 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager, nullcontext
+
+# Métriques au format texte de Prometheus (exposées par GET /metrics).
+#
+# Quand elles sont désactivées, Metriques renvoie des instruments inertes :
+# `mesurer()` rend un nullcontext partagé et `observer()` / `incrementer()` ne
+# font rien, le coût dans le chemin d'écriture se limite à un appel de méthode.
+
+# Secondes, de 10 µs à 10 s
+SEUILS_DEFAUT = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _echapper(valeur):
+    return str(valeur).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _etiquettes(noms, valeurs, supplement=""):
+    paires = [f'{n}="{_echapper(v)}"' for n, v in zip(noms, valeurs)]
+    if supplement:
+        paires.append(supplement)
+    return "{" + ",".join(paires) + "}" if paires else ""
+
+
+def _nombre(valeur):
+    return repr(float(valeur)) if isinstance(valeur, float) else str(valeur)
+
+
+class Compteur:
+
+    def __init__(self, nom, aide, etiquettes=()):
+        self.nom = nom
+        self.aide = aide
+        self.etiquettes = tuple(etiquettes)
+        self.valeurs = {}
+        self.verrou = threading.Lock()
+
+    def incrementer(self, *valeurs_etiquettes, n=1):
+        with self.verrou:
+            self.valeurs[valeurs_etiquettes] = self.valeurs.get(valeurs_etiquettes, 0) + n
+
+    def exposer(self):
+        lignes = [f"# HELP {self.nom} {self.aide}", f"# TYPE {self.nom} counter"]
+        with self.verrou:
+            for valeurs, total in sorted(self.valeurs.items()):
+                lignes.append(f"{self.nom}{_etiquettes(self.etiquettes, valeurs)} {_nombre(total)}")
+        return lignes
+
+
+class Histogramme:
+
+    def __init__(self, nom, aide, etiquettes=(), seuils=SEUILS_DEFAUT):
+        self.nom = nom
+        self.aide = aide
+        self.etiquettes = tuple(etiquettes)
+        self.seuils = tuple(seuils)
+        self.series = {}  # valeurs des étiquettes -> [compte par seuil (+Inf en dernier), somme, nombre]
+        self.verrou = threading.Lock()
+
+    def observer(self, valeur, *valeurs_etiquettes):
+        indice = bisect.bisect_left(self.seuils, valeur)
+        with self.verrou:
+            serie = self.series.get(valeurs_etiquettes)
+            if serie is None:
+                serie = self.series[valeurs_etiquettes] = [[0] * (len(self.seuils) + 1), 0.0, 0]
+            serie[0][indice] += 1
+            serie[1] += valeur
+            serie[2] += 1
+
+    @contextmanager
+    def mesurer(self, *valeurs_etiquettes):
+        """Observe la durée du bloc `with` (en secondes)."""
+        debut = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observer(time.perf_counter() - debut, *valeurs_etiquettes)
+
+    def exposer(self):
+        lignes = [f"# HELP {self.nom} {self.aide}", f"# TYPE {self.nom} histogram"]
+        with self.verrou:
+            for valeurs, (comptes, somme, nombre) in sorted(self.series.items()):
+                cumul = 0
+                for seuil, compte in zip(self.seuils + ("+Inf",), comptes):
+                    cumul += compte
+                    le = 'le="' + (seuil if seuil == "+Inf" else _nombre(float(seuil))) + '"'
+                    lignes.append(f"{self.nom}_bucket{_etiquettes(self.etiquettes, valeurs, le)} {cumul}")
+                lignes.append(f"{self.nom}_sum{_etiquettes(self.etiquettes, valeurs)} {_nombre(somme)}")
+                lignes.append(f"{self.nom}_count{_etiquettes(self.etiquettes, valeurs)} {nombre}")
+        return lignes
+
+
+class _Inerte:
+    """Instrument des métriques désactivées."""
+    _contexte = nullcontext()
+
+    def observer(self, valeur, *valeurs_etiquettes):
+        pass
+
+    def incrementer(self, *valeurs_etiquettes, n=1):
+        pass
+
+    def mesurer(self, *valeurs_etiquettes):
+        return self._contexte
+
+
+INERTE = _Inerte()
+
+
+class Metriques:
+    """Registre des compteurs et histogrammes d'un serveur."""
+
+    def __init__(self, actif=True):
+        self.actif = actif
+        self.instruments = []
+
+    def compteur(self, nom, aide, etiquettes=()):
+        return self._enregistrer(Compteur(nom, aide, etiquettes)) if self.actif else INERTE
+
+    def histogramme(self, nom, aide, etiquettes=(), seuils=SEUILS_DEFAUT):
+        return self._enregistrer(Histogramme(nom, aide, etiquettes, seuils)) if self.actif else INERTE
+
+    def _enregistrer(self, instrument):
+        self.instruments.append(instrument)
+        return instrument
+
+    def exposer(self):
+        """Texte de toutes les métriques au format d'exposition de Prometheus."""
+        return "\n".join(ligne for instrument in self.instruments for ligne in instrument.exposer()) + "\n"
@@ -0,0 +1,131 @@
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+from itertools import islice
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from sign_tx import charger_cle_privee, nonce_horloge, signer_avec_cle
+
+# Signature en masse de virements (jeux de charge, rejeu).
+#
+# Lit un fichier CSV (en-tête P1,P2,a[,nonce]) ou JSONL ({"P1", "P2", "a", ...}) et
+# écrit un JSONL de virements signés, postables tels quels sur /api/transaction
+# (ou regroupés en liste pour /api/transactions/batch). Les lignes sont signées
+# par lots dans plusieurs processus ; chaque processus garde en cache les clés
+# privées déjà chargées (sign_tx.charger_cle_privee). L'ordre d'entrée est conservé.
+#
+# Un virement sans nonce en reçoit un : par émetteur, l'heure de lancement en
+# microsecondes puis +1 à chaque ligne. Les virements d'un même émetteur doivent
+# être postés dans l'ordre du fichier (le serveur refuse un nonce qui recule).
+
+TAILLE_LOT_DEFAUT = 2000
+
+
+def lire_virements(flux, format_entree):
+    """Produit les virements (dict) du flux, au format 'csv' ou 'jsonl'."""
+    if format_entree == "csv":
+        yield from csv.DictReader(flux)
+    else:
+        for ligne in flux:
+            if ligne.strip():
+                yield json.loads(ligne)
+
+
+def numeroter(virements, nonce_depart):
+    """Ajoute le numéro de ligne ("_n") et, s'il manque, le nonce de chaque virement."""
+    derniers = {}
+    for n, v in enumerate(virements, start=1):
+        if v.get("nonce") in (None, ""):
+            derniers[v.get("P1")] = nonce = derniers.get(v.get("P1"), nonce_depart) + 1
+            v["nonce"] = nonce
+        yield {**v, "_n": n}
+
+
+def signer_lot(dossier_cles, lot):
+    """
+    Signe un lot de virements avec les clés <P1>_private.pem de `dossier_cles`.
+    Renvoie (lignes JSONL signées, erreurs [(numéro, message)]) ; chaque virement
+    porte son numéro de ligne d'entrée sous "_n".
+    """
+    lignes, erreurs = [], []
+    for v in lot:
+        numero = v.pop("_n")
+        try:
+            p1, p2, montant, nonce = v["P1"], v["P2"], float(v["a"]), int(v["nonce"])
+            cle = charger_cle_privee(os.path.join(dossier_cles, f"{p1}_private.pem"))
+            v["a"], v["nonce"] = montant, nonce
+            v["signature"] = signer_avec_cle(cle, p1, p2, montant, nonce)
+            lignes.append(json.dumps(v, ensure_ascii=False))
+        except (KeyError, ValueError, TypeError, OSError) as e:
+            erreurs.append((numero, f"{type(e).__name__}: {e}"))
+    return lignes, erreurs
+
+
+def signer_flux(entree, sortie, format_entree, dossier_cles=".", nb_processus=None, taille_lot=TAILLE_LOT_DEFAUT):
+    """
+    Signe tous les virements de `entree` et les écrit dans `sortie`, dans l'ordre.
+    Au plus deux lots par processus sont en vol : la mémoire reste bornée quelle
+    que soit la taille du fichier. Renvoie {"signees", "erreurs"}.
+    """
+    numerotes = numeroter(lire_virements(entree, format_entree), nonce_horloge())
+    lots = iter(lambda: list(islice(numerotes, taille_lot)), [])
+    nb_processus = nb_processus or os.cpu_count() or 1
+    signees, nb_erreurs = 0, 0
+
+    def ecrire(resultat):
+        nonlocal signees, nb_erreurs
+        lignes, erreurs = resultat
+        if lignes:
+            sortie.write("\n".join(lignes) + "\n")
+        for numero, message in erreurs:
+            print(f"Ligne {numero} ignorée : {message}", file=sys.stderr)
+        signees += len(lignes)
+        nb_erreurs += len(erreurs)
+
+    if nb_processus == 1:
+        for lot in lots:
+            ecrire(signer_lot(dossier_cles, lot))
+    else:
+        with ProcessPoolExecutor(max_workers=nb_processus) as executeur:
+            en_vol = deque()
+            for lot in lots:
+                en_vol.append(executeur.submit(signer_lot, dossier_cles, lot))
+                if len(en_vol) >= 2 * nb_processus:
+                    ecrire(en_vol.popleft().result())
+            while en_vol:
+                ecrire(en_vol.popleft().result())
+
+    return {"signees": signees, "erreurs": nb_erreurs}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Signature en masse de virements Tchaî (CSV ou JSONL -> JSONL signé).")
+    parser.add_argument("entree", help="Fichier CSV (en-tête P1,P2,a[,nonce]) ou JSONL ; '-' pour l'entrée standard")
+    parser.add_argument("-o", "--sortie", default="-", help="Fichier JSONL produit (défaut : sortie standard)")
+    parser.add_argument("--format", choices=("csv", "jsonl"), default=None,
+                        help="Format d'entrée (défaut : d'après l'extension, jsonl sinon)")
+    parser.add_argument("--cles", default=".", help="Dossier des fichiers <P1>_private.pem (défaut : dossier courant)")
+    parser.add_argument("-j", "--processus", type=int, default=None, help="Nombre de processus (défaut : nombre de cœurs)")
+    parser.add_argument("--taille-lot", type=int, default=TAILLE_LOT_DEFAUT, help="Virements signés par tâche")
+    args = parser.parse_args()
+
+    format_entree = args.format or ("csv" if args.entree.lower().endswith(".csv") else "jsonl")
+    entree = sys.stdin if args.entree == "-" else open(args.entree, "r", newline="", encoding="utf-8")
+    sortie = sys.stdout if args.sortie == "-" else open(args.sortie, "w", encoding="utf-8")
+
+    debut = time.perf_counter()
+    try:
+        resultat = signer_flux(entree, sortie, format_entree, args.cles, args.processus, args.taille_lot)
+    finally:
+        if entree is not sys.stdin:
+            entree.close()
+        if sortie is not sys.stdout:
+            sortie.close()
+    duree = time.perf_counter() - debut
+    resultat["duree_s"] = round(duree, 3)
+    resultat["par_seconde"] = round(resultat["signees"] / duree) if duree else None
+    print(json.dumps(resultat), file=sys.stderr)
+    sys.exit(0 if not resultat["erreurs"] else 1)
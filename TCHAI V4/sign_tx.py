@@ -1,39 +1,59 @@
 import json
+import time
+from functools import lru_cache
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric import ec
+from chaine import message_virement, montant_en_unites
 
-def signer_transaction(fichier_cle_privee, p1, p2, montant):
-    # 1. Charger la clé privée depuis le fichier PEM
+@lru_cache(maxsize=4096)
+def charger_cle_privee(fichier_cle_privee):
+    """Clé privée désérialisée depuis un fichier PEM (gardée en cache : le PEM n'est lu qu'une fois)."""
     with open(fichier_cle_privee, "rb") as key_file:
-        private_key = serialization.load_pem_private_key(
+        return serialization.load_pem_private_key(
             key_file.read(),
             password=None
         )
 
-    # 2. Préparer les données à signer 
-    # On crée une chaîne de caractères unique représentant la transaction
-    message = f"{p1}{p2}{montant}".encode('utf-8')
+def nonce_horloge():
+    """Nonce par défaut : l'heure en microsecondes, croissante d'une signature à la suivante."""
+    return time.time_ns() // 1000
 
-    # 3. Signer le message avec ECDSA
+def signer_avec_cle(private_key, p1, p2, montant, nonce):
+    """Signe un virement avec une clé privée déjà chargée ; renvoie la signature en hexadécimal."""
+    # Le message est l'encodage canonique de (P1, P2, montant en unités, nonce), voir chaine.py.
+    # Le serveur refuse un nonce déjà utilisé ou plus petit que le dernier accepté (rejeu).
     # La bibliothèque gère le hashage interne avec SHA256 avant la signature
     signature = private_key.sign(
-        message,
+        message_virement(p1, p2, montant_en_unites(montant), nonce),
         ec.ECDSA(hashes.SHA256())
     )
 
-    # 4. Retourner la signature en format Hexadécimal (plus facile à copier-coller dans curl)
+    # Retourner la signature en format Hexadécimal (plus facile à copier-coller dans curl)
     return signature.hex()
 
+def signer_transaction(fichier_cle_privee, p1, p2, montant, nonce):
+    # 1. Charger la clé privée depuis le fichier PEM (une seule fois par fichier)
+    # 2. Préparer les données à signer et les signer
+    return signer_avec_cle(charger_cle_privee(fichier_cle_privee), p1, p2, montant, nonce)
+
+def virement_signe(fichier_cle_privee, p1, p2, montant, nonce=None):
+    """Corps JSON prêt à poster sur /api/transaction."""
+    nonce = nonce if nonce is not None else nonce_horloge()
+    return {"P1": p1, "P2": p2, "a": float(montant), "nonce": nonce,
+            "signature": signer_transaction(fichier_cle_privee, p1, p2, montant, nonce)}
+
 if __name__ == "__main__":
     print("--- Signature d'une transaction ---")
     p1 = input("Nom de l'émetteur (P1) : ")
     p2 = input("Nom du destinataire (P2) : ")
     montant = input("Montant (a) (format : 123.45) : ")
     fichier = input(f"Fichier de clé privée de {p1} (ex: {p1}_private.pem) : ")
+    nonce = input("Nonce (entrée : heure en microsecondes) : ").strip()
 
     try:
-        sig_hex = signer_transaction(fichier, p1, p2, montant)
+        corps = virement_signe(fichier, p1, p2, montant, int(nonce) if nonce else None)
         print("\nSignature générée (à inclure dans votre requête POST) :")
-        print(sig_hex)
+        print(corps["signature"])
+        print(json.dumps(corps))
     except Exception as e:
-        print(f"Erreur : {e}")
\ No newline at end of file
+        print(f"Erreur : {e}")
@@ -1,193 +1,1650 @@
 import os
+import io
 import json
+import time
 import hashlib
-from flask import Flask, jsonify, request
+import functools
+import hmac
+import base64
+import sqlite3
+import threading
+import click
+from itertools import islice
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from flask import Blueprint, Flask, Response, current_app, g, jsonify, request, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert as insert_sqlite
+from sqlalchemy.engine import Engine
 from datetime import datetime, timezone
-from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.asymmetric import ec
-from cryptography.exceptions import InvalidSignature
+from chaine import (TIMESTAMP_FORMAT_HASH, UNITES_PAR_TCHAI, FORMAT_JSON, FORMAT_BINAIRE, calculer_hash_bloc,
+                    calculer_hash_transaction_v5, hash_ligne, lire_virement, message_virement, timestamp_en_us)
+from merkle import racine_merkle, preuve_merkle
+from verif_parallele import creer_pool, verifier_chaine_parallele
+from verif_signatures import SignatureInvalide, VerificateurSignatures
+from cache_cles import CacheClesPubliques
+from cache_clients import CacheClients
+from tete_chaine import TeteChaine
+from ecrivain import EcrivainChaine
+from journal import JournalTransactions
+from metriques import CONTENT_TYPE, INERTE, Metriques
+from cles_clients import SurveillantCles, lire_cles_dossier, valider_cle
+from verrous_comptes import VerrousComptes
+from export_registre import FORMATS, ErreurImport, compresser, encoder, format_fichier, lire, ouvrir_texte, verifier_suite
+from idempotence import CONFLIT, EN_COURS, REJOUEE, CacheIdempotence, lire_cle
 
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///tchai4.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
+# Configuration par défaut, complétée par creer_app(config) puis par les variables
+# d'environnement FLASK_<CLE> (ex. FLASK_TCHAI_BLOC_DELAI=0, utilisées par bench.py)
+CONFIG_DEFAUT = {
+    'SQLALCHEMY_DATABASE_URI': 'sqlite:///tchai4.db',
+    'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    'TCHAI_CACHE_CLES_TAILLE': 1024,
+    'TCHAI_CACHE_CLIENTS_TTL': 30.0,
+    'TCHAI_CACHE_CLIENTS_TAILLE': 10000,
+    'TCHAI_BATCH_TAILLE_MAX': 50000,
+    'TCHAI_PAGE_TAILLE_DEFAUT': 100,
+    'TCHAI_PAGE_TAILLE_MAX': 1000,
+    # Réponses gardées pour l'en-tête Idempotency-Key de POST /api/transaction (durée en secondes, entrées en mémoire)
+    'TCHAI_IDEMPOTENCE_TTL': 86400,
+    'TCHAI_IDEMPOTENCE_TAILLE': 10000,
+    # Verrous des comptes pour le contrôle des soldes en parallèle (les noms sont hachés sur ce nombre de verrous)
+    'TCHAI_VERROUS_COMPTES': 1024,
+    # Vérification ECDSA dans un pool de TCHAI_VERIF_PROCESSUS processus (0 : dans le thread de la requête),
+    # par lots d'au plus TCHAI_VERIF_TAILLE_LOT signatures regroupées pendant TCHAI_VERIF_FENETRE secondes
+    'TCHAI_VERIF_PROCESSUS': 0,
+    'TCHAI_VERIF_FENETRE': 0.002,
+    'TCHAI_VERIF_TAILLE_LOT': 64,
+    # Processus du pool des vérifications d'intégrité parallel=1 (0 : un par cœur), créé à la première utilisation
+    'TCHAI_INTEGRITE_PROCESSUS': 0,
+    # Un bloc est scellé toutes les TCHAI_BLOC_TAILLE transactions, ou toutes les TCHAI_BLOC_DELAI secondes (0 : jamais)
+    'TCHAI_BLOC_TAILLE': 1000,
+    'TCHAI_BLOC_DELAI': 60,
+    # Instantané des soldes toutes les TCHAI_INSTANTANE_INTERVALLE transactions (0 : seulement à la demande)
+    'TCHAI_INSTANTANE_INTERVALLE': 10000,
+    'TCHAI_RECONSTRUIRE_AU_DEMARRAGE': False,
+    # Stockage du registre : 'sqlite' (table transaction) ou 'journal' (fichiers en ajout seul, voir journal.py)
+    'TCHAI_STOCKAGE': 'sqlite',
+    'TCHAI_JOURNAL_DOSSIER': None,  # défaut : instance/journal
+    'TCHAI_JOURNAL_FSYNC': True,
+    # Histogrammes par étape et compteurs de requêtes, exposés sur GET /metrics
+    'TCHAI_METRIQUES': False,
+    # Clés publiques des clients (<nom>_public.pem) : importées par `flask --app tchai4 importer-cles`
+    # (ou au lancement de `python tchai4.py`), puis relues
+    # toutes les TCHAI_CLES_SURVEILLANCE secondes (0 : seulement via /api/clients/cles/recharger)
+    'TCHAI_CLES_DOSSIER': '.',
+    'TCHAI_CLES_SURVEILLANCE': 0,
+    'TCHAI_SOLDE_INITIAL': 100,
+    # Jeton des routes d'administration (Authorization: Bearer <jeton>) ; sans jeton, elles sont désactivées
+    'TCHAI_ADMIN_TOKEN': None,
+}
+
+db = SQLAlchemy()
+# Routes de l'API et commandes `flask --app tchai4 ...`, enregistrées par creer_app()
+api = Blueprint('api', __name__, cli_group=None)
+
+@event.listens_for(Engine, "connect")
+def configurer_sqlite(dbapi_connection, connection_record):
+    """Mode WAL : les lectures ne sont pas bloquées par l'écrivain (et inversement)."""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        curseur = dbapi_connection.cursor()
+        curseur.execute("PRAGMA journal_mode=WAL")
+        curseur.execute("PRAGMA busy_timeout=5000")
+        curseur.close()
+
+# Services de l'application (caches, stockage, écrivain, métriques), créés par
+# initialiser_services() : un seul serveur Tchaî par processus.
+cache_cles = None
+executeur_signatures = None
+verificateur = None
+metriques = Metriques(actif=False)
+duree_etapes = requetes = duree_requetes = duree_integrite = transactions_verifiees = INERTE
+depot = None
+tete_chaine = None
+ecrivain = None
+cache_clients = None
+verrous_comptes = None
+idempotence = None
 
 # --- Modèles de Base de Données ---
 
 class Client(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     nom = db.Column(db.String(80), unique=True, nullable=False)
-    solde = db.Column(db.Float, default=0.0)
+    solde = db.Column(db.Float, default=0.0) # Copie en flottant de solde_unites (compatibilité)
+    solde_unites = db.Column(db.BigInteger, default=0) # Solde exact en unités mineures
+    solde_initial_unites = db.Column(db.BigInteger, default=0) # Dotation à la création (base de la reconstruction)
     cle_publique = db.Column(db.Text, nullable=False) # Ajout du stockage de la clé PEM
+    dernier_nonce = db.Column(db.BigInteger, nullable=False, default=0, server_default='0') # Anti-rejeu (voir chaine.py)
 
 class Transaction(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     p1_nom = db.Column(db.String(80), nullable=False)
     p2_nom = db.Column(db.String(80), nullable=False)
     montant = db.Column(db.Float, nullable=False)
+    montant_unites = db.Column(db.BigInteger) # Montant exact en unités mineures (haché en v5)
     timestamp = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     hash = db.Column(db.String(64), unique=True, nullable=False)
+    # 4 : hash JSON historique, 5 : hash binaire sur le montant entier (voir chaine.py)
+    format_hash = db.Column(db.Integer, nullable=False, default=FORMAT_BINAIRE, server_default=str(FORMAT_JSON))
+
+    __table_args__ = (
+        # Pagination chronologique et historique par client sans parcours complet de la table
+        db.Index('ix_transaction_timestamp_id', 'timestamp', 'id'),
+        db.Index('ix_transaction_p1_timestamp_id', 'p1_nom', 'timestamp', 'id'),
+        db.Index('ix_transaction_p2_timestamp_id', 'p2_nom', 'timestamp', 'id'),
+    )
+
+    def to_dict(self):
+        return transaction_en_dict(self)
+
+class NonceUtilise(db.Model):
+    """Index anti-rejeu : (émetteur, nonce) -> transaction créée, lu par clé primaire."""
+    client_nom = db.Column(db.String(80), primary_key=True)
+    nonce = db.Column(db.BigInteger, primary_key=True)
+    transaction_id = db.Column(db.Integer, nullable=False, index=True) # Nonce d'une transaction (export du registre)
+
+class TeteJournal(db.Model):
+    """Enregistrements du journal validés avec la base (une seule ligne, id=1 ; stockage journal, voir journal.py)."""
+    id = db.Column(db.Integer, primary_key=True)
+    nb = db.Column(db.Integer, nullable=False)
+
+class ReponseIdempotente(db.Model):
+    """Réponse envoyée pour une Idempotency-Key, rejouée aux nouveaux essais jusqu'à son expiration."""
+    cle = db.Column(db.String(255), primary_key=True)
+    empreinte = db.Column(db.String(64), nullable=False) # SHA-256 du corps de la requête
+    statut = db.Column(db.Integer, nullable=False)
+    corps = db.Column(db.Text, nullable=False)
+    expiration = db.Column(db.DateTime, nullable=False, index=True)
+
+class Instantane(db.Model):
+    """Soldes de tous les clients après la transaction `hauteur` de la chaîne."""
+    id = db.Column(db.Integer, primary_key=True)
+    hauteur = db.Column(db.Integer, nullable=False, index=True)
+    timestamp = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+class SoldeInstantane(db.Model):
+    instantane_id = db.Column(db.Integer, db.ForeignKey('instantane.id'), primary_key=True)
+    nom = db.Column(db.String(80), primary_key=True)
+    solde_unites = db.Column(db.BigInteger, nullable=False)
+
+class PointControle(db.Model):
+    """Dernière transaction dont l'intégrité a été vérifiée (une seule ligne, id=1)."""
+    id = db.Column(db.Integer, primary_key=True)
+    dernier_id = db.Column(db.Integer, nullable=False)
+    dernier_hash = db.Column(db.String(64), nullable=False)
+    date = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+class Bloc(db.Model):
+    """Paquet de transactions consécutives scellé par la racine de leur arbre de Merkle."""
+    id = db.Column(db.Integer, primary_key=True)  # hauteur du bloc, à partir de 1
+    premier_tx_id = db.Column(db.Integer, nullable=False)
+    dernier_tx_id = db.Column(db.Integer, nullable=False, index=True)
+    nb_transactions = db.Column(db.Integer, nullable=False)
+    racine_merkle = db.Column(db.String(64), nullable=False)
+    timestamp = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    hash_precedent = db.Column(db.String(64), nullable=False)
+    hash = db.Column(db.String(64), unique=True, nullable=False)
 
     def to_dict(self):
         return {
-            'id': self.id, 'P1': self.p1_nom, 'P2': self.p2_nom,
-            'a': self.montant, 't': self.timestamp.isoformat(), 'hash': self.hash
+            'hauteur': self.id, 'de': self.premier_tx_id, 'a': self.dernier_tx_id,
+            'nb_transactions': self.nb_transactions, 'merkle': self.racine_merkle,
+            't': self.timestamp.isoformat(), 'prev_h': self.hash_precedent, 'hash': self.hash
         }
 
+def transaction_en_dict(t):
+    """Représentation API d'une transaction, qu'elle vienne de la table ou du journal."""
+    return {
+        'id': t.id, 'P1': t.p1_nom, 'P2': t.p2_nom,
+        'a': t.montant_unites / UNITES_PAR_TCHAI, 't': t.timestamp.isoformat(), 'hash': t.hash
+    }
+
+# --- Stockage du registre ---
+
+class DepotSQLite:
+    """
+    Registre dans la table transaction (stockage par défaut). Expose les mêmes
+    opérations que journal.JournalTransactions : le reste de l'application ne
+    lit et n'ajoute des transactions que par `depot`.
+    """
+
+    def tete(self):
+        """(id, hash) de la dernière transaction en base, sans charger l'objet ORM."""
+        return db.session.execute(
+            db.select(Transaction.id, Transaction.hash).order_by(Transaction.id.desc()).limit(1)
+        ).first()
+
+    def ouvrir(self):
+        pass
+
+    def ajouter(self, transactions):
+        """Ajoute des transactions {p1_nom, p2_nom, montant_unites, timestamp, hash} ; renvoie leurs ids."""
+        lignes = [Transaction(montant=t['montant_unites'] / UNITES_PAR_TCHAI, format_hash=FORMAT_BINAIRE, **t)
+                  for t in transactions]
+        db.session.add_all(lignes)
+        db.session.flush()
+        return [t.id for t in lignes]
+
+    def importer(self, transactions):
+        """Ajoute des transactions importées {id, ..., format_hash} en un seul INSERT multi-lignes ; renvoie leurs ids."""
+        db.session.execute(db.insert(Transaction), transactions)
+        return [t['id'] for t in transactions]
+
+    # Les lignes ajoutées suivent la transaction de la session : rien à annuler, écrire ni valider en plus
+
+    def marque(self):
+        return None
+
+    def annuler(self, marque):
+        pass
+
+    def preparer(self):
+        pass
+
+    def valider(self):
+        pass
+
+    def lire(self, id_transaction):
+        return db.session.get(Transaction, id_transaction)
+
+    def parcourir(self, depuis_id=0, jusqu_id=None, taille_lot=1000):
+        """
+        Transactions d'id > depuis_id et <= jusqu_id, dans l'ordre des ids.
+
+        Les lignes sont lues par lots via un curseur (yield_per) et seules les colonnes
+        utiles sont sélectionnées : la mémoire reste constante quelle que soit la taille
+        de la chaîne.
+        """
+        requete = db.select(
+            Transaction.id, Transaction.p1_nom, Transaction.p2_nom, Transaction.montant,
+            Transaction.montant_unites, Transaction.timestamp, Transaction.hash, Transaction.format_hash
+        ).filter(Transaction.id > depuis_id)
+        if jusqu_id is not None:
+            requete = requete.filter(Transaction.id <= jusqu_id)
+
+        lignes = db.session.execute(requete.order_by(Transaction.id).execution_options(yield_per=taille_lot))
+        try:
+            yield from lignes
+        finally:
+            lignes.close()
+
+    def hash_avant(self, id_transaction):
+        """Hash stocké de la transaction qui précède `id_transaction` ("0" pour la genèse)."""
+        h = db.session.execute(
+            db.select(Transaction.hash).filter(Transaction.id < id_transaction).order_by(Transaction.id.desc()).limit(1)
+        ).scalar_one_or_none()
+        return h if h is not None else "0"
+
+    def mouvements(self, depuis_id, jusqu_id):
+        """Crédits et débits {nom: unités} des transactions de la plage, agrégés par SQLite (GROUP BY)."""
+        plage = (Transaction.id > depuis_id, Transaction.id <= jusqu_id)
+        credits = db.session.execute(
+            db.select(Transaction.p2_nom, db.func.sum(Transaction.montant_unites)).filter(*plage).group_by(Transaction.p2_nom))
+        debits = db.session.execute(
+            db.select(Transaction.p1_nom, db.func.sum(Transaction.montant_unites)).filter(*plage).group_by(Transaction.p1_nom))
+        return dict(credits.all()), dict(debits.all())
+
+def charger_clients(noms):
+    """Fiches {id, nom, solde_unites, dernier_nonce, cle_publique} des clients existants parmi `noms`."""
+    lignes = db.session.execute(
+        db.select(Client.id, Client.nom, Client.solde_unites, Client.dernier_nonce, Client.cle_publique)
+        .filter(Client.nom.in_(noms))
+    )
+    return {l.nom: dict(l._mapping) for l in lignes}
+
+def initialiser_services(app):
+    """Crée les services à partir de la configuration de `app` (sans accès à la base)."""
+    global cache_cles, executeur_signatures, verificateur, metriques, duree_etapes, requetes, duree_requetes
+    global duree_integrite, transactions_verifiees, depot, tete_chaine, ecrivain, cache_clients, verrous_comptes
+    global idempotence
+
+    # Clés publiques déjà désérialisées, pour ne pas re-parser le PEM à chaque requête
+    cache_cles = CacheClesPubliques(app.config['TCHAI_CACHE_CLES_TAILLE'])
+    # Vérification des signatures d'un lot en parallèle (OpenSSL relâche le GIL)
+    executeur_signatures = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+    # ... ou dans un pool de processus, par lots (voir verif_signatures.py)
+    verificateur = None
+    if app.config['TCHAI_VERIF_PROCESSUS']:
+        verificateur = VerificateurSignatures(app.config['TCHAI_VERIF_PROCESSUS'], app.config['TCHAI_VERIF_FENETRE'],
+                                              app.config['TCHAI_VERIF_TAILLE_LOT'])
+
+    # Métriques au format Prometheus ; désactivées, les instruments ne font rien (voir metriques.py)
+    metriques = Metriques(app.config['TCHAI_METRIQUES'])
+    duree_etapes = metriques.histogramme(
+        'tchai_transaction_etape_secondes', "Durée de chaque étape de l'enregistrement d'une transaction", ['etape'])
+    requetes = metriques.compteur('tchai_requetes_total', "Requêtes HTTP par route et code de statut", ['route', 'code'])
+    duree_requetes = metriques.histogramme('tchai_requete_secondes', "Durée des requêtes HTTP par route", ['route'])
+    duree_integrite = metriques.histogramme(
+        'tchai_integrite_secondes', "Durée des vérifications d'intégrité", ['mode'],
+        seuils=(0.001, 0.01, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0))
+    transactions_verifiees = metriques.compteur(
+        'tchai_integrite_transactions_total', "Transactions re-hachées par les vérifications d'intégrité", ['mode'])
+
+    if app.config['TCHAI_STOCKAGE'] == 'journal':
+        # Ouvert par preparer_base() : importer le module (processus de vérification) ne touche pas au journal
+        depot = JournalTransactions(app.config['TCHAI_JOURNAL_DOSSIER'] or os.path.join(app.instance_path, 'journal'),
+                                    fsync=app.config['TCHAI_JOURNAL_FSYNC'], charger_tete=charger_tete_journal,
+                                    enregistrer_tete=enregistrer_tete_journal)
+    else:
+        depot = DepotSQLite()
+
+    # Tête de la chaîne gardée en mémoire (chargée au premier usage, mise à jour à chaque commit)
+    tete_chaine = TeteChaine(depot.tete)
+    # Toutes les insertions dans la chaîne passent par ce thread écrivain unique
+    ecrivain = EcrivainChaine(app, db, tete_chaine, depot, etapes=duree_etapes)
+    # Fiches clients gardées en mémoire : la consultation des soldes ne touche plus SQLite
+    cache_clients = CacheClients(charger_clients, app.config['TCHAI_CACHE_CLIENTS_TTL'],
+                                 app.config['TCHAI_CACHE_CLIENTS_TAILLE'])
+    # Contrôle des soldes dans les threads des requêtes, sous les verrous des seuls comptes concernés
+    verrous_comptes = VerrousComptes(app.config['TCHAI_VERROUS_COMPTES'])
+    # Réponses déjà envoyées par Idempotency-Key : un nouvel essai ne revérifie rien et n'écrit rien
+    idempotence = CacheIdempotence(charger_reponse_idempotente, app.config['TCHAI_IDEMPOTENCE_TTL'],
+                                   app.config['TCHAI_IDEMPOTENCE_TAILLE'])
+
+def charger_tete_journal():
+    """Nombre d'enregistrements du journal validés avec la base, None avant le premier commit."""
+    tete = db.session.get(TeteJournal, 1)
+    return tete.nb if tete is not None else None
+
+def enregistrer_tete_journal(nb):
+    """Nouvelle tête du journal, validée par le commit en cours de l'écrivain (appelé par journal.preparer)."""
+    db.session.execute(insert_sqlite(TeteJournal).values(id=1, nb=nb).on_conflict_do_update(
+        index_elements=[TeteJournal.id], set_={"nb": nb}))
+
+def charger_reponse_idempotente(cle):
+    """(expiration, empreinte, statut, corps) de la réponse gardée pour `cle`, ou None."""
+    ligne = db.session.get(ReponseIdempotente, cle)
+    if ligne is None:
+        return None
+    expiration = ligne.expiration.replace(tzinfo=timezone.utc).timestamp()
+    return expiration, ligne.empreinte, ligne.statut, ligne.corps
+
+def enregistrer_reponse_idempotente(cle, empreinte, statut, corps, expiration):
+    """Écrit une réponse à rejouer et efface les réponses expirées (s'exécute sur le thread écrivain)."""
+    db.session.execute(db.delete(ReponseIdempotente).where(ReponseIdempotente.expiration <= datetime.now(timezone.utc)))
+    db.session.execute(insert_sqlite(ReponseIdempotente).values(
+        cle=cle, empreinte=empreinte, statut=statut, corps=corps,
+        expiration=datetime.fromtimestamp(expiration, timezone.utc),
+    ).on_conflict_do_nothing())
+
+def migrer_schema():
+    """
+    Met à niveau sur place une base existante : create_all() ne crée que les
+    tables manquantes, pas les colonnes ni les index ajoutés depuis sur des
+    tables existantes.
+    """
+    inspecteur = db.inspect(db.engine)
+    ajoutees = set()
+    with db.engine.begin() as connexion:
+        for table in db.metadata.sorted_tables:
+            existantes = {c['name'] for c in inspecteur.get_columns(table.name)}
+            for colonne in table.columns:
+                if colonne.name in existantes:
+                    continue
+                type_sql = colonne.type.compile(dialect=db.engine.dialect)
+                defaut = f" DEFAULT {colonne.server_default.arg}" if colonne.server_default is not None else ""
+                connexion.execute(db.text(f'ALTER TABLE "{table.name}" ADD COLUMN {colonne.name} {type_sql}{defaut}'))
+                ajoutees.add(f"{table.name}.{colonne.name}")
+
+        # Passage aux montants entiers : conversion des valeurs historiques en unités mineures
+        if "transaction.montant_unites" in ajoutees:
+            connexion.execute(db.text(
+                f'UPDATE "transaction" SET montant_unites = CAST(ROUND(montant * {UNITES_PAR_TCHAI}) AS INTEGER)'))
+        if "client.solde_unites" in ajoutees:
+            connexion.execute(db.text(
+                f'UPDATE client SET solde_unites = CAST(ROUND(solde * {UNITES_PAR_TCHAI}) AS INTEGER)'))
+        # Dotation initiale déduite des soldes actuels et de l'historique (supposés cohérents à la migration)
+        if "client.solde_initial_unites" in ajoutees:
+            connexion.execute(db.text(
+                'UPDATE client SET solde_initial_unites = solde_unites'
+                ' - COALESCE((SELECT SUM(montant_unites) FROM "transaction" WHERE p2_nom = client.nom), 0)'
+                ' + COALESCE((SELECT SUM(montant_unites) FROM "transaction" WHERE p1_nom = client.nom), 0)'))
+
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
 # --- Initialisation Automatique via PEM ---
 
-with app.app_context():
-    db.create_all()
-    
-    # On scanne le dossier pour trouver des clés publiques
-    for filename in os.listdir('.'):
-        if filename.endswith('_public.pem'):
-            nom_client = filename.replace('_public.pem', '')
-            
-            # Si le client n'existe pas encore en BDD
-            if not db.session.execute(db.select(Client).filter_by(nom=nom_client)).scalar_one_or_none():
-                with open(filename, 'r') as f:
-                    pem_data = f.read()
-                
-                # Création avec un solde par défaut (ex: 100.0 pour les tests)
-                nouveau_client = Client(nom=nom_client, solde=100.0, cle_publique=pem_data)
-                db.session.add(nouveau_client)
-                print(f"Client importé depuis PEM : {nom_client}")
-    
-    db.session.commit()
-
-TIMESTAMP_FORMAT_HASH = "%Y-%m-%dT%H:%M:%S.%f"
+def importer_cles(cles, taille_lot=500):
+    """
+    Crée les clients {nom: PEM} absents et remplace la clé des clients existants
+    dont le PEM a changé (rotation). L'existence est testée par lots de noms
+    (IN) et les écritures sont groupées : une seule transaction pour des
+    milliers de clés. S'exécute sur le thread écrivain.
+    """
+    resultat = {"crees": [], "rotations": [], "inchanges": 0, "erreurs": []}
+    valides = {}
+    for nom, pem in cles.items():
+        try:
+            valider_cle(nom, pem)
+            valides[nom] = pem
+        except ValueError as e:
+            resultat["erreurs"].append({"nom": nom, "erreur": str(e)})
+
+    noms = list(valides)
+    existants = {}
+    for i in range(0, len(noms), taille_lot):
+        existants.update((c.nom, c) for c in db.session.execute(
+            db.select(Client.id, Client.nom, Client.cle_publique).filter(Client.nom.in_(noms[i:i + taille_lot]))))
+
+    solde = current_app.config['TCHAI_SOLDE_INITIAL'] * UNITES_PAR_TCHAI
+    nouveaux, rotations = [], []
+    for nom, pem in valides.items():
+        client = existants.get(nom)
+        if client is None:
+            nouveaux.append({"nom": nom, "cle_publique": pem, "solde": solde / UNITES_PAR_TCHAI,
+                             "solde_unites": solde, "solde_initial_unites": solde})
+        elif client.cle_publique != pem:
+            rotations.append({"id": client.id, "cle_publique": pem})
+            resultat["rotations"].append(nom)
+        else:
+            resultat["inchanges"] += 1
+    if nouveaux:
+        db.session.execute(db.insert(Client), nouveaux)
+        resultat["crees"] = [c["nom"] for c in nouveaux]
+    if rotations:
+        db.session.execute(db.update(Client), rotations)
+
+    # Les fiches en cache portent l'ancienne clé : on les oublie une fois le commit fait
+    modifies = resultat["crees"] + resultat["rotations"]
+    if modifies:
+        def invalider():
+            for nom in modifies:
+                cache_clients.invalider(nom)
+                cache_cles.invalider(nom)
+        ecrivain.apres_commit(invalider)
+    return resultat
+
+def provisionner(dossier):
+    """Importe les clés publiques de `dossier` (commande explicite, jamais à l'import du module)."""
+    preparer_base()
+    resultat = ecrivain.soumettre(importer_cles, lire_cles_dossier(dossier))
+    for nom_client in resultat["crees"]:
+        print(f"Client importé depuis PEM : {nom_client}")
+    for nom_client in resultat["rotations"]:
+        print(f"Clé publique remplacée depuis PEM : {nom_client}")
+    for erreur in resultat["erreurs"]:
+        print(f"Clé ignorée ({erreur['nom']}) : {erreur['erreur']}")
+    return resultat
+
+@api.cli.command("importer-cles")
+@click.argument("dossier", required=False)
+def commande_importer_cles(dossier):
+    """Importe (ou met à jour) les clients depuis les fichiers *_public.pem de DOSSIER (défaut : TCHAI_CLES_DOSSIER)."""
+    resultat = provisionner(dossier or current_app.config['TCHAI_CLES_DOSSIER'])
+    click.echo(json.dumps(resultat, indent=2, ensure_ascii=False))
+
+# --- Export et import du registre ---
+
+def avec_nonces(transactions, taille_lot=1000):
+    """(transaction, nonce ou None) : les nonces sont lus dans nonce_utilise par plage d'ids, un lot à la fois."""
+    transactions = iter(transactions)
+    while True:
+        lot = list(islice(transactions, taille_lot))
+        if not lot:
+            return
+        nonces = dict(db.session.execute(
+            db.select(NonceUtilise.transaction_id, NonceUtilise.nonce)
+            .filter(NonceUtilise.transaction_id.between(lot[0].id, lot[-1].id))
+        ).all())
+        for t in lot:
+            yield t, nonces.get(t.id)
+
+def morceaux_registre(format_export, compresse=False, depuis_id=0, jusqu_id=None):
+    """Export du registre par morceaux (texte, ou octets gzip), lu par lots dans le dépôt (voir export_registre.py)."""
+    morceaux = encoder(avec_nonces(depot.parcourir(depuis_id, jusqu_id)), format_export)
+    return compresser(morceaux) if compresse else morceaux
+
+def ajouter_transactions_importees(transactions, tete_attendue):
+    """
+    Écrit un lot importé et déjà vérifié, s'il suit toujours la tête, avec les
+    nonces de ses virements : nonce_utilise et dernier_nonce des émetteurs sont
+    repris dans le même commit, un virement de l'export ne peut pas être
+    rejoué. S'exécute sur le thread écrivain.
+    """
+    if tete_chaine.lire() != tete_attendue:
+        raise ValueError("Le registre a été modifié pendant l'import.")
+    depot.importer([{k: v for k, v in t.items() if k != 'nonce'} for t in transactions])
+    nonces = [{"client_nom": t['p1_nom'], "nonce": t['nonce'], "transaction_id": t['id']}
+              for t in transactions if t['nonce'] is not None]
+    if nonces:
+        db.session.execute(db.insert(NonceUtilise), nonces)
+        derniers = {}
+        for n in nonces:
+            derniers[n["client_nom"]] = max(derniers.get(n["client_nom"], 0), n["nonce"])
+        table = Client.__table__
+        db.session.execute(
+            table.update().where(table.c.nom == db.bindparam('emetteur'), table.c.dernier_nonce < db.bindparam('nonce'))
+            .values(dernier_nonce=db.bindparam('nonce')),
+            [{"emetteur": nom, "nonce": nonce} for nom, nonce in derniers.items()])
+
+        def invalider():
+            for nom in derniers:
+                cache_clients.invalider(nom)
+        ecrivain.apres_commit(invalider)
+    derniere = transactions[-1]
+    tete_chaine.avancer(derniere['id'], derniere['hash'])
+    if derniere['id'] - dernier_id_scelle() >= current_app.config['TCHAI_BLOC_TAILLE']:
+        sceller_blocs()
+
+def charger_registre(transactions, taille_lot=10000):
+    """
+    Importe à la suite du registre des transactions exportées (export_registre.lire).
+
+    La chaîne est re-vérifiée au fil de la lecture ; chaque lot vérifié est écrit
+    par l'écrivain en un INSERT multi-lignes et un commit, pendant que le lot
+    suivant est vérifié. À la première erreur, l'import s'arrête : les lots déjà
+    écrits restent, et relancer l'import avec le même fichier reprend après eux.
+    Les soldes des clients sont ensuite reconstruits depuis le registre.
+    """
+    id_tete, hash_tete = tete_chaine.lire()
+    bilan = {"importees": 0, "deja_presentes": 0, "dernier_id": id_tete}
+    tete = (id_tete, hash_tete)
+    en_cours = None  # (Future, lot) en cours d'écriture
+
+    def attendre():
+        nonlocal en_cours
+        futur, lot = en_cours
+        en_cours = None
+        futur.result()
+        bilan["importees"] += len(lot)
+        bilan["dernier_id"] = lot[-1]['id']
+
+    def ecrire(lot):
+        nonlocal en_cours, tete
+        if en_cours is not None:
+            attendre()
+        en_cours = (ecrivain.deposer(ajouter_transactions_importees, lot, tete), lot)
+        tete = (lot[-1]['id'], lot[-1]['hash'])
+
+    lot = []
+    try:
+        try:
+            for t in verifier_suite(transactions, id_tete, hash_tete, bilan):
+                lot.append(t)
+                if len(lot) == taille_lot:
+                    ecrire(lot)
+                    lot = []
+        except ErreurImport as e:
+            # Les lignes vérifiées avant l'erreur sont quand même écrites
+            bilan["erreur"] = str(e)
+        if lot:
+            ecrire(lot)
+        if en_cours is not None:
+            attendre()
+    except Exception as e:
+        # Fichier illisible (gzip tronqué) ou écriture refusée : on attend le lot en cours d'écriture
+        bilan["erreur"] = str(e)
+        if en_cours is not None:
+            try:
+                attendre()
+            except Exception:
+                pass
+
+    if bilan["importees"]:
+        bilan["soldes_corriges"] = len(ecrivain.soumettre(appliquer_reconstruction)["ecarts"])
+    return bilan
+
+@api.cli.command("exporter-registre")
+@click.argument("fichier", default="-")
+@click.option("--format", "format_export", type=click.Choice(FORMATS), default=None,
+              help="Format (défaut : d'après l'extension, jsonl sinon)")
+@click.option("--gzip", "compresse", is_flag=True, help="Compresse en gzip (automatique pour un fichier en .gz)")
+@click.option("--depuis-id", type=int, default=0, help="N'exporte que les transactions d'id supérieur")
+def commande_exporter_registre(fichier, format_export, compresse, depuis_id):
+    """Exporte le registre dans FICHIER (.jsonl, .csv, .gz ; '-' pour la sortie standard)."""
+    preparer_base()
+    format_export, gz = format_fichier(fichier, format_export)
+    with click.open_file(fichier, "wb") as sortie:
+        for morceau in morceaux_registre(format_export, compresse or gz, depuis_id):
+            sortie.write(morceau if compresse or gz else morceau.encode('utf-8'))
+
+@api.cli.command("importer-registre")
+@click.argument("fichier", default="-")
+@click.option("--format", "format_import", type=click.Choice(FORMATS), default=None,
+              help="Format (défaut : d'après l'extension, jsonl sinon)")
+@click.option("--gzip", "compresse", is_flag=True, help="Fichier compressé en gzip (automatique pour un nom en .gz)")
+def commande_importer_registre(fichier, format_import, compresse):
+    """Importe à la suite du registre un export (re-vérifié pendant la lecture), puis reconstruit les soldes."""
+    preparer_base()
+    format_import, gz = format_fichier(fichier, format_import)
+    with click.open_file(fichier, "rb") as entree:
+        bilan = charger_registre(lire(ouvrir_texte(entree, compresse or gz), format_import))
+    click.echo(json.dumps(bilan, indent=2, ensure_ascii=False))
+    if "erreur" in bilan:
+        raise SystemExit(1)
+
+# --- Démarrage ---
+
+base_prete = False
+verrou_base = threading.Lock()
+
+@api.before_app_request
+def preparer_base():
+    """
+    Vérifie le schéma (création, migration) et lance les tâches de fond, une
+    seule fois par processus et au premier usage : importer le module ou créer
+    l'application ne touche pas la base.
+    """
+    global base_prete
+    if base_prete:
+        return
+    with verrou_base:
+        if base_prete:
+            return
+        config = current_app.config
+        db.create_all()
+        migrer_schema()
+        db.session.commit()
+        depot.ouvrir()
+        tete_chaine.recharger()
+
+        if config['TCHAI_RECONSTRUIRE_AU_DEMARRAGE']:
+            for ecart in ecrivain.soumettre(appliquer_reconstruction)["ecarts"]:
+                print(f"Solde corrigé depuis le registre : {ecart['nom']} {ecart['avant']} -> {ecart['apres']}")
+
+        if verificateur is not None:
+            verificateur.demarrer()
+
+        if config['TCHAI_BLOC_DELAI']:
+            ecrivain.programmer(lambda: sceller_blocs(tout=True), config['TCHAI_BLOC_DELAI'])
+
+        if config['TCHAI_CLES_SURVEILLANCE']:
+            surveillant_cles = SurveillantCles(config['TCHAI_CLES_DOSSIER'], lambda cles: ecrivain.soumettre(importer_cles, cles),
+                                               config['TCHAI_CLES_SURVEILLANCE'])
+            surveillant_cles.demarrer()
+        base_prete = True
 
 # --- Utilitaires ---
 
-def calculer_hash_transaction(p1, p2, montant, timestamp_str, hash_precedent):
-    data = {"P1": p1, "P2": p2, "t": timestamp_str, "a": montant, "prev_h": hash_precedent}
-    encoded = json.dumps(data, sort_keys=True).encode('utf-8')
-    return hashlib.sha256(encoded).hexdigest()
+def parcourir_chaine(depuis_id, hash_precedent, jusqu_id=None):
+    """
+    Parcourt la chaîne à partir de `depuis_id` (exclu) jusqu'à `jusqu_id` (inclus)
+    et produit (id, hash, integre) pour chaque transaction.
+    """
+    for t in depot.parcourir(depuis_id, jusqu_id):
+        hash_recalcule = hash_ligne(t.format_hash, t.p1_nom, t.p2_nom, t.montant, t.montant_unites,
+                                    t.timestamp, hash_precedent)
+        yield t.id, t.hash, hash_recalcule == t.hash
+        # Le hash de la transaction actuelle devient le 'hash_precedent' pour la suivante
+        hash_precedent = t.hash
+
+def lancer_verification(client, p1_name, p2_name, montant_unites, nonce, signature_hex):
+    """
+    Vérification d'une signature en arrière-plan : Future dont le résultat lève
+    SignatureInvalide si elle est fausse. Dans le pool de processus si
+    TCHAI_VERIF_PROCESSUS > 0, sinon dans le pool de threads.
+    """
+    if verificateur is None:
+        return executeur_signatures.submit(verifier_signature, client, p1_name, p2_name, montant_unites, nonce,
+                                           signature_hex)
+    return verificateur.soumettre(client['cle_publique'], message_virement(p1_name, p2_name, montant_unites, nonce),
+                                  signature_hex)
+
+def verifier_signature(client, p1_name, p2_name, montant_unites, nonce, signature_hex):
+    """Vérifie la signature ECDSA d'un virement ; lève SignatureInvalide si elle est fausse."""
+    if verificateur is not None:
+        # Le thread de la requête attend son lot, le calcul se fait dans un autre processus
+        with duree_etapes.mesurer("ecdsa"):
+            return lancer_verification(client, p1_name, p2_name, montant_unites, nonce, signature_hex).result()
+
+    # cryptography n'est chargé qu'à la première vérification (démarrage plus rapide)
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.exceptions import InvalidSignature
+
+    # Reconstitution du message signé (encodage canonique avec nonce, voir chaine.message_virement)
+    message = message_virement(p1_name, p2_name, montant_unites, nonce)
+
+    # Charger la clé publique PEM depuis la fiche du client (via le cache)
+    with duree_etapes.mesurer("cle_publique"):
+        public_key = cache_cles.obtenir(client['nom'], client['cle_publique'])
+
+    # Vérifier
+    with duree_etapes.mesurer("ecdsa"):
+        try:
+            public_key.verify(
+                bytes.fromhex(signature_hex),
+                message,
+                ec.ECDSA(hashes.SHA256())
+            )
+        except InvalidSignature:
+            raise SignatureInvalide() from None
+
+# Refus d'un virement authentifié : statut HTTP et message
+REFUS_SOLDE = (403, "Solde insuffisant.")
+REFUS_NONCE = (409, "Nonce déjà utilisé ou inférieur au dernier accepté (rejeu).")
+
+def executer_virements(virements):
+    """
+    Contrôle les soldes et les nonces puis enregistre des virements authentifiés
+    (p1, p2, montant en unités, nonce), dans l'ordre. Renvoie, pour chaque
+    virement, (201, transaction créée) ou (statut, {"erreur": ...}) ; un rejeu
+    (409) indique la transaction déjà créée avec ce nonce.
+
+    Le contrôle se fait dans le thread appelant, sous les verrous des seuls
+    comptes concernés (voir verrous_comptes.py) : des virements entre comptes
+    disjoints sont contrôlés en parallèle, et seul le chaînage
+    (ajouter_virements) passe par le thread écrivain.
+    """
+    noms = {v[0] for v in virements} | {v[1] for v in virements}
+    resultats = [None] * len(virements)
+    acceptes, debits = [], []
+    with duree_etapes.mesurer("soldes"), verrous_comptes.verrouiller(noms):
+        fiches = cache_clients.obtenir_plusieurs(noms)
+        disponibles = {nom: verrous_comptes.disponible(nom, f['solde_unites'], f['dernier_nonce'])
+                       for nom, f in fiches.items()}
+        derniers = {nom: verrous_comptes.dernier_nonce(nom, f['dernier_nonce']) for nom, f in fiches.items()}
+        for i, (p1_name, p2_name, montant_unites, nonce) in enumerate(virements):
+            if nonce <= derniers[p1_name]:
+                resultats[i] = REFUS_NONCE
+                continue
+            if disponibles[p1_name] < montant_unites:
+                resultats[i] = REFUS_SOLDE
+                continue
+            # Un crédit reçu plus tôt dans le même lot peut être dépensé : il est validé dans le même commit
+            disponibles[p1_name] -= montant_unites
+            disponibles[p2_name] += montant_unites
+            derniers[p1_name] = nonce
+            debits.append((p1_name, nonce, montant_unites))
+            acceptes.append(i)
+        verrous_comptes.reserver(debits)
+
+    if acceptes:
+        try:
+            txs = ecrivain.soumettre(ajouter_virements, [virements[i] for i in acceptes], debits)
+        except Exception:
+            # Tâche ou commit en échec : les rappels d'après commit ne libéreront pas les réserves
+            with verrous_comptes.verrouiller({nom for nom, _, _ in debits}):
+                verrous_comptes.liberer(debits)
+            raise
+        for i, tx in zip(acceptes, txs):
+            resultats[i] = tx
+
+    for i, resultat in enumerate(resultats):
+        if isinstance(resultat, dict):
+            resultats[i] = (201, resultat)
+            continue
+        statut, message = resultat
+        resultats[i] = (statut, {"erreur": message})
+        if resultat is REFUS_NONCE:
+            deja = db.session.get(NonceUtilise, (virements[i][0], virements[i][3]))
+            if deja is not None:
+                resultats[i][1]["transaction_id"] = deja.transaction_id
+    return resultats
+
+def ajouter_virements(virements, debits=()):
+    """
+    Chaîne une liste de virements (p1, p2, montant en unités, nonce) déjà
+    authentifiés et contrôlés à la suite de la tête. S'exécute sur le thread
+    écrivain. Renvoie, pour chaque virement, la transaction créée (dict) ou
+    REFUS_SOLDE / REFUS_NONCE.
+
+    Chaque débit est une mise à jour conditionnelle (solde_unites >= montant et
+    dernier_nonce < nonce) : un solde ou un nonce modifié ailleurs (autre
+    processus, base modifiée à la main) ne permet ni solde négatif ni rejeu.
+    `debits` sont les réserves d'executer_virements, libérées après le commit.
+    """
+    with duree_etapes.mesurer("tete"):
+        _, hash_precedent = tete_chaine.lire()
+
+    ajoutees = []
+    soldes, derniers_nonces, refuses = {}, {}, set()
+    duree_hachage = duree_soldes = 0.0
+    for p1_name, p2_name, montant_unites, nonce in virements:
+        debut = time.perf_counter()
+        solde_p1 = db.session.execute(
+            db.update(Client)
+            .where(Client.nom == p1_name, Client.solde_unites >= montant_unites, Client.dernier_nonce < nonce)
+            .values(solde_unites=Client.solde_unites - montant_unites,
+                    solde=(Client.solde_unites - montant_unites) / float(UNITES_PAR_TCHAI),
+                    dernier_nonce=nonce)
+            .returning(Client.solde_unites)
+            .execution_options(synchronize_session=False)
+        ).scalar()
+        if solde_p1 is None:
+            dernier = db.session.execute(db.select(Client.dernier_nonce).filter_by(nom=p1_name)).scalar()
+            duree_soldes += time.perf_counter() - debut
+            ajoutees.append(REFUS_NONCE if dernier >= nonce else REFUS_SOLDE)
+            refuses.add(p1_name)
+            continue
+        soldes[p1_name] = solde_p1
+        derniers_nonces[p1_name] = nonce
+        soldes[p2_name] = db.session.execute(
+            db.update(Client)
+            .where(Client.nom == p2_name)
+            .values(solde_unites=Client.solde_unites + montant_unites,
+                    solde=(Client.solde_unites + montant_unites) / float(UNITES_PAR_TCHAI))
+            .returning(Client.solde_unites)
+            .execution_options(synchronize_session=False)
+        ).scalar()
+        duree_soldes += time.perf_counter() - debut
+
+        # UTC naïf, comme relu depuis SQLite : la réponse du POST, la liste et l'export concordent
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        debut = time.perf_counter()
+        h = calculer_hash_transaction_v5(p1_name, p2_name, montant_unites, timestamp_en_us(now), hash_precedent)
+        duree_hachage += time.perf_counter() - debut
+        ajoutees.append({"p1_nom": p1_name, "p2_nom": p2_name, "montant_unites": montant_unites,
+                         "timestamp": now, "hash": h, "nonce": nonce})
+        hash_precedent = h
+
+    duree_etapes.observer(duree_soldes, "mise_a_jour_soldes")
+    duree_etapes.observer(duree_hachage, "hachage")
+
+    with duree_etapes.mesurer("insertion"):
+        nouvelles = [t for t in ajoutees if isinstance(t, dict)]
+        nonces_utilises = [{"client_nom": t["p1_nom"], "nonce": t.pop("nonce")} for t in nouvelles]
+        # L'index des nonces ne peut pas entrer en conflit : dernier_nonce a été vérifié ci-dessus
+        for t, n, id_t in zip(nouvelles, nonces_utilises, depot.ajouter(nouvelles)):
+            t["id"] = n["transaction_id"] = id_t
+        if nonces_utilises:
+            db.session.execute(db.insert(NonceUtilise), nonces_utilises)
+    if nouvelles:
+        derniere = nouvelles[-1]
+        tete_chaine.avancer(derniere["id"], derniere["hash"])
+        if derniere["id"] - dernier_id_scelle() >= current_app.config['TCHAI_BLOC_TAILLE']:
+            sceller_blocs()
+        intervalle = current_app.config['TCHAI_INSTANTANE_INTERVALLE']
+        if intervalle and derniere["id"] - derniere_hauteur_instantane() >= intervalle:
+            prendre_instantane()
+
+    def publier():
+        # Nouveaux soldes dans le cache et fin des réserves, ensemble sous les verrous des comptes
+        with verrous_comptes.verrouiller(soldes.keys() | refuses | {nom for nom, _, _ in debits}):
+            cache_clients.mettre_a_jour_soldes(soldes, derniers_nonces)
+            for nom in refuses:
+                cache_clients.invalider(nom)
+            verrous_comptes.liberer(debits)
+    ecrivain.apres_commit(publier)
+    return [transaction_en_dict(SimpleNamespace(**t)) if isinstance(t, dict) else t for t in ajoutees]
+
+def sceller_blocs(tout=False):
+    """
+    Range les transactions pas encore scellées dans des blocs de TCHAI_BLOC_TAILLE
+    transactions. Avec `tout`, le dernier paquet incomplet est scellé lui aussi.
+    S'exécute sur le thread écrivain.
+    """
+    taille = current_app.config['TCHAI_BLOC_TAILLE']
+    dernier_bloc = db.session.execute(db.select(Bloc).order_by(Bloc.id.desc()).limit(1)).scalar_one_or_none()
+    hauteur = dernier_bloc.id if dernier_bloc else 0
+    depuis_id = dernier_bloc.dernier_tx_id if dernier_bloc else 0
+    hash_precedent = dernier_bloc.hash if dernier_bloc else "0"
+
+    while True:
+        lignes = list(islice(depot.parcourir(depuis_id), taille))
+        if not lignes or (len(lignes) < taille and not tout):
+            break
+
+        hauteur += 1
+        racine = racine_merkle([l.hash for l in lignes])
+        now = datetime.now(timezone.utc)
+        h = calculer_hash_bloc(hauteur, lignes[0].id, lignes[-1].id, racine, now.strftime(TIMESTAMP_FORMAT_HASH), hash_precedent)
+        db.session.add(Bloc(id=hauteur, premier_tx_id=lignes[0].id, dernier_tx_id=lignes[-1].id,
+                            nb_transactions=len(lignes), racine_merkle=racine, timestamp=now,
+                            hash_precedent=hash_precedent, hash=h))
+        depuis_id, hash_precedent = lignes[-1].id, h
+    db.session.flush()
+
+def dernier_id_scelle():
+    return db.session.execute(db.select(db.func.max(Bloc.dernier_tx_id))).scalar() or 0
+
+def reconstruire_soldes(depuis_genese=False):
+    """
+    Recalcule les soldes de tous les clients à partir du registre : dernier
+    instantané (ou dotations initiales) + mouvements des transactions suivantes,
+    agrégés par SQLite (GROUP BY) plutôt que rejoués ligne à ligne en Python.
+    Renvoie (hauteur, {nom: solde_unites}).
+    """
+    hauteur = tete_chaine.lire()[0]
+    soldes = dict(db.session.execute(db.select(Client.nom, Client.solde_initial_unites)).all())
+    depuis_id = 0
+
+    instantane = None
+    if not depuis_genese:
+        instantane = db.session.execute(
+            db.select(Instantane).filter(Instantane.hauteur <= hauteur).order_by(Instantane.hauteur.desc()).limit(1)
+        ).scalar_one_or_none()
+    if instantane is not None:
+        depuis_id = instantane.hauteur
+        soldes.update(db.session.execute(
+            db.select(SoldeInstantane.nom, SoldeInstantane.solde_unites).filter_by(instantane_id=instantane.id)
+        ).all())
+
+    credits, debits = depot.mouvements(depuis_id, hauteur)
+    for nom, total in credits.items():
+        soldes[nom] = soldes.get(nom, 0) + total
+    for nom, total in debits.items():
+        soldes[nom] = soldes.get(nom, 0) - total
+    return hauteur, soldes
+
+def prendre_instantane():
+    """Enregistre les soldes reconstruits à la hauteur actuelle (s'exécute sur le thread écrivain)."""
+    hauteur, soldes = reconstruire_soldes()
+    instantane = Instantane(hauteur=hauteur)
+    db.session.add(instantane)
+    db.session.flush()
+    if soldes:
+        db.session.execute(db.insert(SoldeInstantane), [
+            {"instantane_id": instantane.id, "nom": nom, "solde_unites": solde} for nom, solde in soldes.items()
+        ])
+    return {"id": instantane.id, "hauteur": hauteur, "nb_clients": len(soldes)}
+
+def derniere_hauteur_instantane():
+    return db.session.execute(db.select(db.func.max(Instantane.hauteur))).scalar() or 0
+
+def appliquer_reconstruction(depuis_genese=False):
+    """
+    Remplace les soldes de la table client par les soldes reconstruits depuis le
+    registre (s'exécute sur le thread écrivain). Renvoie les écarts corrigés.
+    """
+    hauteur, soldes = reconstruire_soldes(depuis_genese)
+    actuels = db.session.execute(db.select(Client.id, Client.nom, Client.solde_unites)).all()
+    ecarts = [{"nom": c.nom, "avant": c.solde_unites / UNITES_PAR_TCHAI, "apres": soldes.get(c.nom, 0) / UNITES_PAR_TCHAI}
+              for c in actuels if c.solde_unites != soldes.get(c.nom, 0)]
+    corrections = [{"id": c.id, "solde_unites": soldes.get(c.nom, 0), "solde": soldes.get(c.nom, 0) / UNITES_PAR_TCHAI}
+                   for c in actuels if c.solde_unites != soldes.get(c.nom, 0)]
+    if corrections:
+        db.session.execute(db.update(Client), corrections)
+        ecrivain.apres_commit(cache_clients.invalider)
+    return {"hauteur": hauteur, "ecarts": ecarts}
 
 # --- Routes API ---
 
-@app.route('/api/transaction', methods=['POST'])
+def demarrer_chrono():
+    g.debut_requete = time.perf_counter()
+
+def compter_requete(reponse):
+    # Le modèle de route (/api/transactions/<int:id_transaction>/preuve) plutôt que l'URL
+    route = request.url_rule.rule if request.url_rule else "inconnue"
+    requetes.incrementer(route, str(reponse.status_code))
+    duree_requetes.observer(time.perf_counter() - g.debut_requete, route)
+    return reponse
+
+@api.route('/metrics', methods=['GET'])
+def exposer_metriques():
+    if not metriques.actif:
+        return jsonify({"erreur": "Métriques désactivées (TCHAI_METRIQUES)."}), 404
+    return Response(metriques.exposer(), mimetype=CONTENT_TYPE)
+
+# Clé d'idempotence indisponible : statut HTTP et message
+REFUS_IDEMPOTENCE = {
+    EN_COURS: (409, "Une requête avec cette Idempotency-Key est déjà en cours de traitement."),
+    CONFLIT: (422, "Idempotency-Key déjà utilisée pour une autre requête."),
+}
+
+def refus_idempotence(etat, reponse):
+    """Réponse à renvoyer sans traiter la requête (réponse rejouée ou clé indisponible), None sinon."""
+    if etat == REJOUEE:
+        statut, corps = reponse
+        return Response(corps, statut, mimetype='application/json', headers={'Idempotent-Replayed': 'true'})
+    if etat in REFUS_IDEMPOTENCE:
+        statut, message = REFUS_IDEMPOTENCE[etat]
+        return jsonify({"erreur": message}), statut
+    return None
+
+def garder_reponse(cle, empreinte, statut, corps):
+    """Garde la réponse envoyée pour `cle` (en mémoire, puis en base avec le prochain commit de l'écrivain)."""
+    if statut >= 500:
+        # Erreur passagère : un nouvel essai avec la même clé sera traité
+        idempotence.abandonner(cle)
+        return
+    expiration = idempotence.terminer(cle, empreinte, statut, corps)
+    ecrivain.deposer(enregistrer_reponse_idempotente, cle, empreinte, statut, corps, expiration)
+
+def idempotente(vue):
+    """
+    Route rejouable avec l'en-tête Idempotency-Key : la première réponse (hors
+    erreur 5xx) est gardée TCHAI_IDEMPOTENCE_TTL secondes et renvoyée telle
+    quelle aux requêtes suivantes de même clé et de même corps, sans rappeler
+    la vue (ni vérification de signature, ni écriture dans le registre).
+    """
+    @functools.wraps(vue)
+    def envelopper(*args, **kwargs):
+        try:
+            cle = lire_cle(request.headers.get('Idempotency-Key'))
+        except ValueError as e:
+            return jsonify({"erreur": str(e)}), 400
+        if cle is None:
+            return vue(*args, **kwargs)
+
+        empreinte = hashlib.sha256(request.get_data()).hexdigest()
+        with duree_etapes.mesurer("idempotence"):
+            refus = refus_idempotence(*idempotence.commencer(cle, empreinte))
+        if refus is not None:
+            return refus
+        try:
+            reponse = current_app.make_response(vue(*args, **kwargs))
+        except BaseException:
+            idempotence.abandonner(cle)
+            raise
+        garder_reponse(cle, empreinte, reponse.status_code, reponse.get_data(as_text=True))
+        return reponse
+    return envelopper
+
+@api.route('/api/transaction', methods=['POST'])
+@idempotente
 def enregistrer_transaction():
-    data = request.get_json()
-    try:
-        p1_name = data['P1']
-        p2_name = data['P2']
-        amount = float(data['a'])
-        signature_hex = data['signature'] 
-    except KeyError:
-        return jsonify({"erreur": "Champs manquants (P1, P2, a, signature)."}), 400
+    with duree_etapes.mesurer("analyse"):
+        data = request.get_json()
+        try:
+            # Les montants sont manipulés en entiers d'unités mineures (2 décimales au plus)
+            p1_name, p2_name, montant_unites, nonce, signature_hex = lire_virement(data)
+        except KeyError:
+            return jsonify({"erreur": "Champs manquants (P1, P2, a, nonce, signature)."}), 400
+        except ValueError as e:
+            return jsonify({"erreur": str(e)}), 400
 
-    # 1. Récupérer l'émetteur et sa clé publique
-    p1 = db.session.execute(db.select(Client).filter_by(nom=p1_name)).scalar_one_or_none()
-    p2 = db.session.execute(db.select(Client).filter_by(nom=p2_name)).scalar_one_or_none()
+    # 1. Récupérer l'émetteur et sa clé publique (via le cache des clients)
+    with duree_etapes.mesurer("clients"):
+        clients = cache_clients.obtenir_plusieurs([p1_name, p2_name])
+    p1 = clients.get(p1_name)
+    p2 = clients.get(p2_name)
 
     if not p1 or not p2:
         return jsonify({"erreur": "Utilisateur inconnu."}), 404
 
     # 2. VERIFICATION DE LA SIGNATURE (Authenticité)
     try:
-        # Reconstitution du message signé 
-        message = f"{p1_name}{p2_name}{amount}".encode('utf-8')
-        
-        # Charger la clé publique PEM depuis la base de données
-        public_key = serialization.load_pem_public_key(p1.cle_publique.encode('utf-8'))
-        
-        # Vérifier
-        public_key.verify(
-            bytes.fromhex(signature_hex),
-            message,
-            ec.ECDSA(hashes.SHA256())
-        )
-    except InvalidSignature:
+        verifier_signature(p1, p1_name, p2_name, montant_unites, nonce, signature_hex)
+    except SignatureInvalide:
         return jsonify({"erreur": "Signature invalide. Accès refusé."}), 401
     except Exception as e:
         return jsonify({"erreur": f"Erreur de vérification: {str(e)}"}), 500
 
-    # 3. VERIFICATION DU SOLDE
-    if p1.solde < amount:
-        return jsonify({"erreur": "Solde insuffisant."}), 403
+    # 3. SOLDE ET NONCE (sous les verrous des deux comptes), PUIS ENREGISTREMENT DANS LA BLOCKCHAIN
+    # (seul le chaînage est sérialisé par le thread écrivain)
+    try:
+        statut, resultat = executer_virements([(p1_name, p2_name, montant_unites, nonce)])[0]
+    except Exception:
+        return jsonify({"erreur": "Erreur lors de l'écriture en base."}), 500
 
-    # 4. ENREGISTREMENT DANS LA BLOCKCHAIN
+    if statut != 201:
+        return jsonify(resultat), statut
+    return jsonify({"message": "Transaction authentifiée et enregistrée", "tx": resultat}), 201
+
+
+@api.route('/api/transactions/batch', methods=['POST'])
+def enregistrer_lot_transactions():
+    """
+    Enregistre un lot de virements signés en une seule transaction SQLite.
+
+    Le corps est une liste de {P1, P2, a, nonce, signature} (ou {"transactions": [...]}).
+    Les signatures sont vérifiées en parallèle, puis les soldes et les nonces sont
+    contrôlés et les hashs chaînés en mémoire dans l'ordre du lot. Chaque élément reçoit
+    son propre statut ; un élément refusé n'empêche pas les suivants.
+    """
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('transactions')
+    if not isinstance(data, list):
+        return jsonify({"erreur": "Le corps doit être une liste de transactions."}), 400
+    if len(data) > current_app.config['TCHAI_BATCH_TAILLE_MAX']:
+        return jsonify({"erreur": f"Lot trop grand (maximum {current_app.config['TCHAI_BATCH_TAILLE_MAX']})."}), 413
+
+    resultats = [None] * len(data)
+
+    # 1. Validation des champs
+    virements = []
+    for i, item in enumerate(data):
+        try:
+            virements.append((i, *lire_virement(item)))
+        except KeyError:
+            resultats[i] = {"index": i, "statut": 400, "erreur": "Champs manquants (P1, P2, a, nonce, signature)."}
+        except ValueError as e:
+            resultats[i] = {"index": i, "statut": 400, "erreur": str(e)}
+
+    # 2. Tous les clients concernés en une seule requête
+    noms = {v[1] for v in virements} | {v[2] for v in virements}
+    clients = cache_clients.obtenir_plusieurs(noms)
+
+    a_verifier = []
+    for v in virements:
+        if v[1] not in clients or v[2] not in clients:
+            resultats[v[0]] = {"index": v[0], "statut": 404, "erreur": "Utilisateur inconnu."}
+        else:
+            a_verifier.append(v)
+
+    # 3. Vérification des signatures en parallèle (toutes lancées avant d'attendre la première)
+    verifications = [lancer_verification(clients[v[1]], *v[1:]) for v in a_verifier]
+    valides = []
+    for v, verification in zip(a_verifier, verifications):
+        try:
+            verification.result()
+            valides.append(v)
+        except SignatureInvalide:
+            resultats[v[0]] = {"index": v[0], "statut": 401, "erreur": "Signature invalide. Accès refusé."}
+        except Exception as e:
+            resultats[v[0]] = {"index": v[0], "statut": 400, "erreur": f"Erreur de vérification: {str(e)}"}
+
+    # 4. Soldes et nonces dans l'ordre du lot (sous les verrous des comptes), puis chaînage et un seul commit
     try:
-        p1.solde -= amount
-        p2.solde += amount
+        txs = executer_virements([v[1:5] for v in valides])
+    except Exception:
+        return jsonify({"erreur": "Erreur lors de l'écriture en base."}), 500
 
-        derniere_t = db.session.execute(db.select(Transaction).order_by(Transaction.id.desc())).scalars().first()
-        hash_precedent = derniere_t.hash if derniere_t else "0"
+    nb_enregistrees = 0
+    for v, (statut, resultat) in zip(valides, txs):
+        if statut != 201:
+            resultats[v[0]] = {"index": v[0], "statut": statut, **resultat}
+        else:
+            resultats[v[0]] = {"index": v[0], "statut": 201, "tx": resultat}
+            nb_enregistrees += 1
 
-        now = datetime.now(timezone.utc)
-        ts_str = now.strftime(TIMESTAMP_FORMAT_HASH)
-        h = calculer_hash_transaction(p1_name, p2_name, amount, ts_str, hash_precedent)
+    return jsonify({"enregistrees": nb_enregistrees, "resultats": resultats}), 200
 
-        nouvelle_t = Transaction(p1_nom=p1_name, p2_nom=p2_name, montant=amount, timestamp=now, hash=h)
-        db.session.add(nouvelle_t)
-        db.session.commit()
 
-        return jsonify({"message": "Transaction authentifiée et enregistrée", "tx": nouvelle_t.to_dict()}), 201
-    except Exception as e:
-        db.session.rollback()
+def refus_admin():
+    """Réponse d'erreur si la requête ne porte pas le jeton d'administration, None sinon."""
+    jeton = current_app.config['TCHAI_ADMIN_TOKEN']
+    if not jeton:
+        return jsonify({"erreur": "Route d'administration désactivée (TCHAI_ADMIN_TOKEN non défini)."}), 404
+    fourni = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(fourni.encode('utf-8'), f"Bearer {jeton}".encode('utf-8')):
+        return jsonify({"erreur": "Jeton d'administration invalide."}), 401
+    return None
+
+@api.route('/api/soldes/instantane', methods=['POST'])
+def creer_instantane():
+    """Route d'administration : chaque instantané ajoute une ligne par client dans solde_instantane."""
+    refus = refus_admin()
+    if refus:
+        return refus
+    try:
+        instantane = ecrivain.soumettre(prendre_instantane)
+    except Exception:
         return jsonify({"erreur": "Erreur lors de l'écriture en base."}), 500
+    return jsonify(instantane), 201
 
+@api.route('/api/soldes/reconstruction', methods=['GET', 'POST'])
+def reconstruction_soldes():
+    """
+    Route d'administration. GET : compare les soldes de la table client aux
+    soldes reconstruits depuis le registre. POST : corrige la table client.
+    `?genese=1` ignore les instantanés.
+    """
+    refus = refus_admin()
+    if refus:
+        return refus
+    depuis_genese = request.args.get('genese', '0') in ('1', 'true', 'oui')
+    if request.method == 'POST':
+        try:
+            resultat = ecrivain.soumettre(appliquer_reconstruction, depuis_genese)
+        except Exception:
+            return jsonify({"erreur": "Erreur lors de l'écriture en base."}), 500
+        return jsonify({"hauteur": resultat["hauteur"], "corriges": resultat["ecarts"]}), 200
 
-@app.route('/api/clients/wallet/<string:nom>', methods=['GET'])
+    hauteur, soldes = reconstruire_soldes(depuis_genese)
+    actuels = db.session.execute(db.select(Client.nom, Client.solde_unites)).all()
+    ecarts = [{"nom": c.nom, "table": c.solde_unites / UNITES_PAR_TCHAI, "registre": soldes.get(c.nom, 0) / UNITES_PAR_TCHAI}
+              for c in actuels if c.solde_unites != soldes.get(c.nom, 0)]
+    return jsonify({"hauteur": hauteur, "coherent": not ecarts, "ecarts": ecarts}), 200 if not ecarts else 409
+
+@api.route('/api/clients/wallet/<string:nom>', methods=['GET'])
 def afficher_solde(nom):
-    c = db.session.execute(db.select(Client).filter_by(nom=nom)).scalar_one_or_none()
+    c = cache_clients.obtenir(nom)
     if not c: return jsonify({"erreur": "Inexistant"}), 404
-    return jsonify({"Nom": c.nom, "Solde": c.solde}), 200
+    return jsonify({"Nom": c['nom'], "Solde": c['solde_unites'] / UNITES_PAR_TCHAI}), 200
+
+@api.route('/api/cache/cles', methods=['GET'])
+def stats_cache_cles():
+    return jsonify(cache_cles.stats()), 200
+
+@api.route('/api/cache/idempotence', methods=['GET'])
+def stats_cache_idempotence():
+    return jsonify(idempotence.stats()), 200
+
+@api.route('/api/cache/clients', methods=['GET'])
+def stats_cache_clients():
+    return jsonify(cache_clients.stats()), 200
 
-@app.route('/api/transactions', methods=['GET'])
+@api.route('/api/cache/clients/invalider', methods=['POST'])
+def invalider_cache_clients():
+    """Route d'administration, à appeler après une modification de la table client faite hors de l'API."""
+    refus = refus_admin()
+    if refus:
+        return refus
+    nom = (request.get_json(silent=True) or {}).get('nom')
+    cache_clients.invalider(nom)
+    cache_cles.invalider(nom)
+    return jsonify({"message": f"Cache invalidé ({nom or 'tous les clients'})."}), 200
+
+@api.route('/api/clients/bulk', methods=['POST'])
+def importer_clients():
+    """
+    Import en masse de clients (administration). Le corps est une liste de
+    {nom, cle_publique} (ou {"clients": [...]}). Les clients existants dont la
+    clé diffère reçoivent la nouvelle clé ; tout est écrit en un seul commit.
+    """
+    refus = refus_admin()
+    if refus:
+        return refus
+
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('clients')
+    if not isinstance(data, list):
+        return jsonify({"erreur": "Le corps doit être une liste de clients {nom, cle_publique}."}), 400
+    if len(data) > current_app.config['TCHAI_BATCH_TAILLE_MAX']:
+        return jsonify({"erreur": f"Lot trop grand (maximum {current_app.config['TCHAI_BATCH_TAILLE_MAX']})."}), 413
+    try:
+        cles = {item['nom']: item['cle_publique'] for item in data}
+    except (KeyError, TypeError):
+        return jsonify({"erreur": "Champs manquants (nom, cle_publique)."}), 400
+
+    try:
+        resultat = ecrivain.soumettre(importer_cles, cles)
+    except Exception:
+        return jsonify({"erreur": "Erreur lors de l'écriture en base."}), 500
+    return jsonify(resultat), 200
+
+@api.route('/api/clients/cles/recharger', methods=['POST'])
+def recharger_cles():
+    """Relit le dossier TCHAI_CLES_DOSSIER : nouveaux clients et clés remplacées, sans redémarrage (administration)."""
+    refus = refus_admin()
+    if refus:
+        return refus
+    try:
+        resultat = ecrivain.soumettre(importer_cles, lire_cles_dossier(current_app.config['TCHAI_CLES_DOSSIER']))
+    except Exception:
+        return jsonify({"erreur": "Erreur lors de l'écriture en base."}), 500
+    return jsonify(resultat), 200
+
+# Champs exposés par l'API -> colonnes de la table transaction (projection avec ?fields=)
+CHAMPS_TRANSACTION = {
+    'id': Transaction.id, 'P1': Transaction.p1_nom, 'P2': Transaction.p2_nom,
+    'a': Transaction.montant_unites, 't': Transaction.timestamp, 'hash': Transaction.hash
+}
+
+def encoder_curseur(timestamp, id_transaction):
+    brut = json.dumps([timestamp.isoformat(), id_transaction]).encode('utf-8')
+    return base64.urlsafe_b64encode(brut).decode('ascii')
+
+def decoder_curseur(curseur):
+    ts_iso, id_transaction = json.loads(base64.urlsafe_b64decode(curseur.encode('ascii')))
+    return datetime.fromisoformat(ts_iso), int(id_transaction)
+
+@api.route('/api/transactions', methods=['GET'])
 def lister_toutes_transactions():
-    transactions = db.session.execute(db.select(Transaction).order_by(Transaction.timestamp)).scalars().all()
-    return jsonify([t.to_dict() for t in transactions]), 200
+    """
+    Liste les transactions par ordre chronologique.
+
+    Sans paramètre, renvoie toute la table (comportement historique). Avec
+    `limit`, `after`, `order` ou `fields`, la réponse est paginée par clé
+    (timestamp, id) : {"transactions": [...], "next": <curseur ou null>}.
+      - limit : taille de la page (TCHAI_PAGE_TAILLE_DEFAUT / TCHAI_PAGE_TAILLE_MAX)
+      - after : curseur `next` renvoyé par la page précédente
+      - order=desc : du plus récent au plus ancien (la première page est la dernière de la chaîne)
+      - fields=P1,a,t : ne sélectionne que ces colonnes
+    """
+    pagination = any(p in request.args for p in ('limit', 'after', 'order', 'fields'))
+    if isinstance(depot, JournalTransactions):
+        # Le journal n'a pas d'index sur (timestamp, id) : seule la liste complète est disponible
+        if pagination:
+            return jsonify({"erreur": "Pagination indisponible avec le stockage journal."}), 501
+        return jsonify([transaction_en_dict(t) for t in depot.parcourir()]), 200
+    if not pagination:
+        transactions = db.session.execute(db.select(Transaction).order_by(Transaction.timestamp)).scalars().all()
+        return jsonify([t.to_dict() for t in transactions]), 200
+
+    try:
+        requete, champs, limite = requete_page(request.args, current_app.config)
+    except ValueError as e:
+        return jsonify({"erreur": str(e)}), 400
+    return jsonify(page_en_json(db.session.execute(requete).all(), champs, limite)), 200
 
+def requete_page(args, config):
+    """
+    Requête d'une page de transactions d'après les paramètres limit, after, order
+    et fields. Renvoie (requete, champs, limite) ; lève ValueError si un
+    paramètre est invalide. Partagée avec le serveur asynchrone (tchai4_asgi.py).
+    """
+    try:
+        # int() dans le try : get(type=int) renverrait la valeur par défaut pour ?limit=abc
+        limite = int(args.get('limit', config['TCHAI_PAGE_TAILLE_DEFAUT']))
+        limite = max(1, min(limite, config['TCHAI_PAGE_TAILLE_MAX']))
+        apres = decoder_curseur(args['after']) if args.get('after') else None
+    except (ValueError, TypeError):
+        raise ValueError("Paramètre limit ou after invalide.") from None
 
-@app.route('/api/transactions/<string:nom_personne>', methods=['GET'])
+    champs = args.get('fields')
+    champs = [c.strip() for c in champs.split(',') if c.strip()] if champs else list(CHAMPS_TRANSACTION)
+    inconnus = [c for c in champs if c not in CHAMPS_TRANSACTION]
+    if inconnus:
+        raise ValueError(f"Champs inconnus : {', '.join(inconnus)}.")
+
+    decroissant = args.get('order', 'asc') == 'desc'
+    cle = db.tuple_(Transaction.timestamp, Transaction.id)
+
+    # (timestamp, id) sont toujours sélectionnés pour construire le curseur suivant
+    colonnes = [Transaction.timestamp, Transaction.id] + [CHAMPS_TRANSACTION[c] for c in champs]
+    requete = db.select(*colonnes)
+    if apres is not None:
+        requete = requete.filter(cle < apres if decroissant else cle > apres)
+    if decroissant:
+        requete = requete.order_by(Transaction.timestamp.desc(), Transaction.id.desc())
+    else:
+        requete = requete.order_by(Transaction.timestamp, Transaction.id)
+    return requete.limit(limite + 1), champs, limite
+
+def page_en_json(lignes, champs, limite):
+    """Corps {"transactions", "next"} à partir des lignes lues avec requete_page."""
+    suivant = None
+    if len(lignes) > limite:
+        lignes = lignes[:limite]
+        suivant = encoder_curseur(lignes[-1][0], lignes[-1][1])
+
+    transactions = []
+    for ligne in lignes:
+        valeurs = dict(zip(champs, ligne[2:]))
+        if 't' in valeurs:
+            valeurs['t'] = valeurs['t'].isoformat()
+        if 'a' in valeurs:
+            valeurs['a'] = valeurs['a'] / UNITES_PAR_TCHAI
+        transactions.append(valeurs)
+    return {"transactions": transactions, "next": suivant}
+
+
+@api.route('/api/transactions/<string:nom_personne>', methods=['GET'])
 def lister_transactions_personne(nom_personne):
-    client = db.session.execute(db.select(Client).filter_by(nom=nom_personne)).scalar_one_or_none()
-    if not client:
+    if not cache_clients.obtenir(nom_personne):
         return jsonify({"erreur": f"La personne '{nom_personne}' n'existe pas."}), 404
 
-    transactions = db.session.execute(
-        db.select(Transaction)
-        .filter( (Transaction.p1_nom == nom_personne) | (Transaction.p2_nom == nom_personne) )
-        .order_by(Transaction.timestamp)
-    ).scalars().all()
+    if isinstance(depot, JournalTransactions):
+        # Pas d'index par client dans le journal : parcours séquentiel
+        return jsonify([transaction_en_dict(t) for t in depot.parcourir()
+                        if nom_personne in (t.p1_nom, t.p2_nom)]), 200
+
+    # Union de deux recherches indexées (émetteur, destinataire) plutôt qu'un OR
+    # qui force SQLite à parcourir toute la table
+    historique = db.union(
+        db.select(Transaction).filter(Transaction.p1_nom == nom_personne),
+        db.select(Transaction).filter(Transaction.p2_nom == nom_personne),
+    ).order_by('timestamp', 'id')
+    transactions = db.session.execute(db.select(Transaction).from_statement(historique)).scalars().all()
 
     return jsonify([t.to_dict() for t in transactions]), 200
 
 
-@app.route('/api/transactions/integrity', methods=['GET'])
-def verifier_integrite():
+@api.route('/api/transactions/<int:id_transaction>/preuve', methods=['GET'])
+def preuve_inclusion(id_transaction):
     """
-    Vérifie l'intégrité globale de la chaîne (EXERCICE 6 amélioré).
+    Preuve d'inclusion de Merkle d'une transaction dans son bloc : un auditeur
+    peut vérifier la transaction avec O(log n) hashs, sans télécharger la chaîne
+    (voir merkle.verifier_preuve).
     """
-    transactions = db.session.execute(db.select(Transaction).order_by(Transaction.id)).scalars().all()
-    
-    toutes_integres = True
-    resultats = []
+    t = depot.lire(id_transaction)
+    if t is None:
+        return jsonify({"erreur": "Transaction inexistante."}), 404
+    bloc = db.session.execute(
+        db.select(Bloc).filter(Bloc.premier_tx_id <= id_transaction, Bloc.dernier_tx_id >= id_transaction)
+    ).scalar_one_or_none()
+    if bloc is None:
+        return jsonify({"erreur": "Transaction pas encore scellée dans un bloc."}), 404
+
+    hashs = list(depot.parcourir(bloc.premier_tx_id - 1, bloc.dernier_tx_id))
+    # Si le contenu du bloc ne correspond plus à la racine scellée, la preuve n'a pas de sens
+    if racine_merkle([l.hash for l in hashs]) != bloc.racine_merkle:
+        return jsonify({"erreur": "Bloc altéré : la racine de Merkle ne correspond plus.", "bloc": bloc.to_dict()}), 409
+
+    index = next(i for i, l in enumerate(hashs) if l.id == id_transaction)
+    return jsonify({
+        "tx": transaction_en_dict(t), "bloc": bloc.to_dict(),
+        "preuve": preuve_merkle([l.hash for l in hashs], index)
+    }), 200
+
+@api.route('/api/blocs/<int:hauteur>', methods=['GET'])
+def afficher_bloc(hauteur):
+    bloc = db.session.get(Bloc, hauteur)
+    if bloc is None:
+        return jsonify({"erreur": "Bloc inexistant."}), 404
+    return jsonify(bloc.to_dict()), 200
+
+executeur_integrite = None
+verrou_integrite = threading.Lock()
+
+def pool_integrite(casse=None):
+    """
+    Pool de processus des vérifications parallel=1, partagé par toutes les
+    requêtes et créé à la première ; `casse` est remplacé par un nouveau pool.
+    """
+    global executeur_integrite
+    with verrou_integrite:
+        if executeur_integrite is None or executeur_integrite is casse:
+            if casse is not None:
+                casse.shutdown(wait=False)
+            executeur_integrite = creer_pool(current_app.config['TCHAI_INTEGRITE_PROCESSUS'] or os.cpu_count() or 1)
+        return executeur_integrite
+
+def option_active(args, nom):
+    """Paramètre booléen d'une requête (1, true ou oui)."""
+    return args.get(nom, '0') in ('1', 'true', 'oui')
+
+def options_integrite(args):
+    """
+    Arguments de verifier_chaine() lus dans les paramètres de GET
+    /api/transactions/integrity ; lève ValueError si une borne n'est pas un entier.
+    """
+    def entier(nom):
+        return int(args[nom]) if args.get(nom) not in (None, '') else None
+    return {
+        "complet": option_active(args, 'full'), "from_id": entier('from_id'), "to_id": entier('to_id'),
+        "arret_premier_echec": option_active(args, 'stop'), "echecs_seulement": option_active(args, 'failures_only'),
+        "parallele": option_active(args, 'parallel'), "nb_processus": entier('workers'),
+    }
+
+def verifier_chaine(complet=False, from_id=None, to_id=None, arret_premier_echec=False, echecs_seulement=False,
+                    parallele=False, nb_processus=None):
+    """
+    Vérification d'intégrité, indépendante de la requête HTTP (routes Flask et
+    ASGI). Produit le résultat de chaque transaction vérifiée, puis le bilan
+    {integrite, mode, depuis_id, verifiees}. Voir verifier_integrite() pour les
+    options ; le point de contrôle est déplacé par l'écrivain.
+    """
+    point = db.session.get(PointControle, 1)
+
     # Le hash attendu pour la première transaction est "0"
+    depuis_id = 0
     attente_hash_precedent = "0"
+    if from_id is not None:
+        # Vérification d'une plage : on s'appuie sur le hash stocké du maillon précédent
+        depuis_id = from_id - 1
+        attente_hash_precedent = depot.hash_avant(from_id)
+    elif point and not complet:
+        # Le point de contrôle n'est utilisable que si la transaction qu'il désigne
+        # est toujours en base avec le même hash, sinon on repart de la genèse.
+        ancre = depot.lire(point.dernier_id)
+        if ancre is not None and ancre.hash == point.dernier_hash:
+            depuis_id = point.dernier_id
+            attente_hash_precedent = point.dernier_hash
+        else:
+            complet = True
+
+    if from_id is not None:
+        mode = "plage"
+    else:
+        mode = "complet" if complet or depuis_id == 0 else "incremental"
+
+    if parallele and isinstance(depot, DepotSQLite) and db.engine.url.get_backend_name() == 'sqlite':
+        with duree_integrite.mesurer(mode):
+            parametres = (db.engine.url.database, depuis_id + 1, to_id, nb_processus)
+            executeur = pool_integrite()
+            try:
+                resultat = verifier_chaine_parallele(*parametres, executeur=executeur)
+            except BrokenProcessPool:
+                # Un processus du pool a disparu (tué, mémoire) : la vérification repart dans un nouveau pool
+                resultat = verifier_chaine_parallele(*parametres, executeur=pool_integrite(casse=executeur))
+        transactions_verifiees.incrementer(mode, n=resultat["verifiees"])
+        if from_id is None:
+            integre = resultat["integrite"]
+            ecrivain.soumettre(enregistrer_point_controle, resultat["dernier"] if integre else None,
+                               depuis_id == 0 and not integre)
+        for id_t in resultat["echecs"]:
+            yield {"id": id_t, "statut": "FAIL", "raison": "Chain broken or data altered"}
+        yield {"integrite": resultat["integrite"], "mode": mode, "depuis_id": depuis_id, "verifiees": resultat["verifiees"]}
+        return
 
-    for t in transactions:
-        ts_str = t.timestamp.strftime(TIMESTAMP_FORMAT_HASH)
-        hash_recalcule = calculer_hash_transaction(t.p1_nom, t.p2_nom, t.montant, ts_str, attente_hash_precedent)
-        
-        if hash_recalcule != t.hash:
+    debut = time.perf_counter()
+    toutes_integres = True
+    nb_verifiees = 0
+    # Dernière transaction d'un préfixe entièrement intègre : c'est le nouveau point de contrôle
+    dernier_ok = None
+
+    for id_t, hash_t, integre in parcourir_chaine(depuis_id, attente_hash_precedent, to_id):
+        nb_verifiees += 1
+        if not integre:
             toutes_integres = False
-            resultats.append({"id": t.id, "statut": "FAIL", "raison": "Chain broken or data altered"})
-            # Si la chaîne est brisée, on s'arrête ou on continue pour voir l'étendue des dégâts
+            yield {"id": id_t, "statut": "FAIL", "raison": "Chain broken or data altered"}
+            if arret_premier_echec:
+                break
         else:
-            resultats.append({"id": t.id, "statut": "OK"})
-        
-        # Le hash de la transaction actuelle devient le 'hash_precedent' pour la suivante
-        attente_hash_precedent = t.hash
+            if not echecs_seulement:
+                yield {"id": id_t, "statut": "OK"}
+            if toutes_integres:
+                dernier_ok = (id_t, hash_t)
 
-    return jsonify({
-        "integrite": toutes_integres,
-        "details": resultats
-    }), 200 if toutes_integres else 409
+    # Le point de contrôle n'est déplacé que si la vérification part de la genèse ou de lui.
+    # Un échec lors d'un parcours depuis la genèse le fait reculer avant le maillon cassé.
+    if from_id is None:
+        ecrivain.soumettre(enregistrer_point_controle, dernier_ok, depuis_id == 0 and not toutes_integres)
+
+    duree_integrite.observer(time.perf_counter() - debut, mode)
+    transactions_verifiees.incrementer(mode, n=nb_verifiees)
+    yield {"integrite": toutes_integres, "mode": mode, "depuis_id": depuis_id, "verifiees": nb_verifiees}
+
+def bilan_integrite(resultats):
+    """(bilan avec ses "details", statut HTTP) à partir des éléments produits par verifier_chaine()."""
+    details = list(resultats)
+    bilan = details.pop()
+    bilan["details"] = details
+    return bilan, 200 if bilan["integrite"] else 409
+
+def en_ndjson(resultats):
+    """Éléments produits par verifier_chaine(), une ligne JSON chacun."""
+    for element in resultats:
+        yield json.dumps(element) + "\n"
+
+@api.route('/api/transactions/integrity', methods=['GET'])
+def verifier_integrite():
+    """
+    Vérifie l'intégrité globale de la chaîne (EXERCICE 6 amélioré).
+
+    Par défaut, la vérification est incrémentale : seules les transactions
+    ajoutées après le dernier point de contrôle sont re-hachées.
+
+    Paramètres :
+      - full=1 : re-calcul complet depuis la genèse
+      - from_id / to_id : bornes (incluses) de la vérification
+      - stop=1 : arrêt au premier maillon cassé
+      - failures_only=1 : ne renvoie que les transactions en échec
+      - stream=1 : réponse en JSON délimité par des lignes (NDJSON)
+      - parallel=1 : re-calcul réparti sur le pool de processus du serveur (workers=1 : dans la requête),
+        seuls les échecs sont alors renvoyés
+    """
+    try:
+        options = options_integrite(request.args)
+    except ValueError:
+        return jsonify({"erreur": "from_id, to_id et workers doivent être des entiers."}), 400
+
+    if option_active(request.args, 'stream'):
+        return Response(stream_with_context(en_ndjson(verifier_chaine(**options))), mimetype='application/x-ndjson')
+    bilan, statut = bilan_integrite(verifier_chaine(**options))
+    return jsonify(bilan), statut
+
+
+def enregistrer_point_controle(dernier_ok, reculer=False):
+    """
+    Avance (ou fait reculer si `reculer`) le point de contrôle jusqu'à
+    `dernier_ok` = (id, hash). S'exécute sur le thread écrivain, qui valide.
+    """
+    point = db.session.get(PointControle, 1)
+    if dernier_ok is None:
+        if not (reculer and point):
+            return
+        db.session.delete(point)
+    elif point is None:
+        db.session.add(PointControle(id=1, dernier_id=dernier_ok[0], dernier_hash=dernier_ok[1]))
+    elif reculer or dernier_ok[0] > point.dernier_id:
+        point.dernier_id, point.dernier_hash = dernier_ok
+        point.date = datetime.now(timezone.utc)
+
+@api.route('/api/registre/export', methods=['GET'])
+def exporter_registre():
+    """
+    Export du registre complet en flux, lu par lots : la réponse n'est jamais
+    construite en mémoire.
+
+    Paramètres :
+      - format=jsonl (défaut) ou csv
+      - gzip=1 : réponse compressée
+      - from_id / to_id : bornes (incluses) des ids exportés
+    """
+    format_export = request.args.get('format', 'jsonl')
+    if format_export not in FORMATS:
+        return jsonify({"erreur": f"Format inconnu (formats : {', '.join(FORMATS)})."}), 400
+    compresse = request.args.get('gzip', '0') in ('1', 'true', 'oui')
+    try:
+        from_id = int(request.args.get('from_id') or 1)
+        to_id = int(request.args['to_id']) if request.args.get('to_id') else None
+    except ValueError:
+        return jsonify({"erreur": "from_id et to_id doivent être des entiers."}), 400
+
+    nom = f"registre.{format_export}" + (".gz" if compresse else "")
+    if compresse:
+        mimetype = 'application/gzip'
+    else:
+        mimetype = 'text/csv' if format_export == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(morceaux_registre(format_export, compresse, from_id - 1, to_id)),
+                    mimetype=mimetype, headers={'Content-Disposition': f'attachment; filename="{nom}"'})
+
+@api.route('/api/registre/import', methods=['POST'])
+def importer_registre():
+    """
+    Import d'un export à la suite du registre (administration). Le corps est lu
+    en flux et la chaîne re-vérifiée au fil de la lecture (voir charger_registre).
+
+    Paramètres : format=jsonl (défaut) ou csv ; corps gzip avec gzip=1 ou
+    l'en-tête Content-Encoding: gzip.
+    """
+    refus = refus_admin()
+    if refus:
+        return refus
+    format_import = request.args.get('format', 'jsonl')
+    if format_import not in FORMATS:
+        return jsonify({"erreur": f"Format inconnu (formats : {', '.join(FORMATS)})."}), 400
+    compresse = (request.args.get('gzip', '0') in ('1', 'true', 'oui')
+                 or request.headers.get('Content-Encoding', '').lower() == 'gzip')
+
+    bilan = charger_registre(lire(ouvrir_texte(io.BufferedReader(request.stream), compresse), format_import))
+    return jsonify(bilan), 422 if "erreur" in bilan else 200
+
+# --- Application ---
+
+def creer_app(config=None):
+    """
+    Fabrique de l'application. Rapide : ni accès à la base ni chargement de
+    cryptography ; le schéma est vérifié à la première requête (preparer_base)
+    et les clients sont importés par la commande `flask --app tchai4 importer-cles`.
+    """
+    app = Flask(__name__)
+    app.config.update(CONFIG_DEFAUT)
+    app.config.update(config or {})
+    app.config.from_prefixed_env()
+    db.init_app(app)
+    initialiser_services(app)
+    if metriques.actif:
+        app.before_request(demarrer_chrono)
+        app.after_request(compter_requete)
+    app.register_blueprint(api)
+    return app
+
+app = creer_app()
 
 if __name__ == '__main__':
+    # Serveur de développement : les clés du dossier sont importées avant de servir
+    with app.app_context():
+        provisionner(app.config['TCHAI_CLES_DOSSIER'])
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
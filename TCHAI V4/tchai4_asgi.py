@@ -0,0 +1,266 @@
+import time
+import asyncio
+import hashlib
+import functools
+import threading
+from datetime import timezone
+from concurrent.futures import ThreadPoolExecutor
+from quart import Quart, Response, g, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+import tchai4
+from tchai4 import (Client, Transaction, DepotSQLite, ReponseIdempotente, SignatureInvalide, REFUS_IDEMPOTENCE,
+                    UNITES_PAR_TCHAI, executer_virements, cache_clients, depot, duree_etapes, duree_requetes, ecrivain,
+                    bilan_integrite, en_ndjson, garder_reponse, idempotence, lancer_verification, lire_virement, metriques,
+                    option_active, options_integrite, page_en_json, requete_page, requetes, transaction_en_dict,
+                    verifier_chaine)
+from idempotence import REJOUEE, lire_cle
+from metriques import CONTENT_TYPE
+
+# Mode de service asynchrone (ASGI) de l'API Tchaî.
+#
+# Mêmes routes et mêmes réponses que tchai4.py pour l'enregistrement, la liste
+# des transactions, les soldes et l'intégrité, mais les requêtes sont servies
+# par une boucle asyncio : des milliers de consultations de solde simultanées
+# n'occupent pas un thread chacune.
+#   - lectures : SQLAlchemy asynchrone (aiosqlite) sur la même base ;
+#   - signatures ECDSA : vérifiées dans le pool de threads (ou de processus) de tchai4 ;
+#   - écritures : soldes contrôlés par tchai4.executer_virements (verrous par compte),
+#     chaînage confié à l'écrivain unique (group commit inchangé) ;
+#   - intégrité : calcul intensif exécuté dans un thread, hors de la boucle, et
+#     envoyé en flux avec stream=1.
+#
+# Lancement : hypercorn tchai4_asgi:app --bind 0.0.0.0:5000
+
+app = Quart(__name__)
+
+with tchai4.app.app_context():
+    chemin_db = tchai4.db.engine.url.database
+moteur = create_async_engine(f"sqlite+aiosqlite:///{chemin_db}")
+
+@event.listens_for(moteur.sync_engine, "connect")
+def configurer_sqlite_async(dbapi_connection, connection_record):
+    """La base est déjà en WAL (tchai4) : on attend simplement le verrou de l'écrivain."""
+    curseur = dbapi_connection.cursor()
+    curseur.execute("PRAGMA busy_timeout=5000")
+    curseur.close()
+
+# Threads qui attendent l'écrivain : assez pour remplir un groupe de commit
+executeur_ecritures = ThreadPoolExecutor(max_workers=ecrivain.taille_groupe_max)
+
+async def charger_clients_async(noms):
+    """Équivalent asynchrone de tchai4.charger_clients (chargement des absents du cache)."""
+    async with moteur.connect() as connexion:
+        lignes = await connexion.execute(
+            tchai4.db.select(Client.id, Client.nom, Client.solde_unites, Client.dernier_nonce, Client.cle_publique)
+            .filter(Client.nom.in_(noms))
+        )
+        return {l.nom: dict(l._mapping) for l in lignes}
+
+async def charger_reponse_idempotente_async(cle):
+    """Équivalent asynchrone de tchai4.charger_reponse_idempotente."""
+    async with moteur.connect() as connexion:
+        ligne = (await connexion.execute(
+            tchai4.db.select(ReponseIdempotente).filter_by(cle=cle)
+        )).first()
+    if ligne is None:
+        return None
+    return ligne.expiration.replace(tzinfo=timezone.utc).timestamp(), ligne.empreinte, ligne.statut, ligne.corps
+
+async def dans_thread(fonction, *args, executeur=None):
+    """Exécute une fonction bloquante de tchai4 (avec son contexte d'application) hors de la boucle."""
+    def executer():
+        with tchai4.app.app_context():
+            return fonction(*args)
+    return await asyncio.get_running_loop().run_in_executor(executeur, executer)
+
+async def en_flux(fabrique, taille_file=1000):
+    """
+    Éléments d'un générateur bloquant de tchai4 (`fabrique()`), produits dans
+    un thread avec son contexte d'application et transmis à la boucle par une
+    file bornée : la mémoire reste constante, et le thread s'arrête si le
+    client se déconnecte.
+    """
+    boucle = asyncio.get_running_loop()
+    file = asyncio.Queue(maxsize=taille_file)
+    arret = threading.Event()
+    fin = object()
+
+    def deposer(element):
+        if not arret.is_set():
+            asyncio.run_coroutine_threadsafe(file.put(element), boucle).result()
+
+    def produire():
+        try:
+            with tchai4.app.app_context():
+                for element in fabrique():
+                    if arret.is_set():
+                        return
+                    deposer(element)
+        except Exception as e:
+            deposer(e)
+        finally:
+            deposer(fin)
+
+    producteur = boucle.run_in_executor(None, produire)
+    try:
+        while (element := await file.get()) is not fin:
+            if isinstance(element, Exception):
+                raise element
+            yield element
+    finally:
+        # Client parti : on libère une place pour le dépôt en cours, le thread voit l'arrêt et ferme le générateur
+        arret.set()
+        while not file.empty():
+            file.get_nowait()
+        await producteur
+
+@app.before_serving
+async def preparer_base():
+    """Schéma et tâches de fond de tchai4 ; les clés s'importent avec `flask --app tchai4 importer-cles`."""
+    await dans_thread(tchai4.preparer_base)
+
+# --- Routes API ---
+
+def idempotente(vue):
+    """Équivalent asynchrone de tchai4.idempotente (en-tête Idempotency-Key)."""
+    @functools.wraps(vue)
+    async def envelopper(*args, **kwargs):
+        try:
+            cle = lire_cle(request.headers.get('Idempotency-Key'))
+        except ValueError as e:
+            return jsonify({"erreur": str(e)}), 400
+        if cle is None:
+            return await vue(*args, **kwargs)
+
+        empreinte = hashlib.sha256(await request.get_data()).hexdigest()
+        with duree_etapes.mesurer("idempotence"):
+            etat, deja = await idempotence.commencer_async(cle, empreinte, charger_reponse_idempotente_async)
+        if etat == REJOUEE:
+            statut, corps = deja
+            return Response(corps, statut, mimetype='application/json', headers={'Idempotent-Replayed': 'true'})
+        if etat in REFUS_IDEMPOTENCE:
+            statut, message = REFUS_IDEMPOTENCE[etat]
+            return jsonify({"erreur": message}), statut
+        try:
+            reponse = await app.make_response(await vue(*args, **kwargs))
+        except BaseException:
+            idempotence.abandonner(cle)
+            raise
+        garder_reponse(cle, empreinte, reponse.status_code, await reponse.get_data(as_text=True))
+        return reponse
+    return envelopper
+
+@app.route('/api/transaction', methods=['POST'])
+@idempotente
+async def enregistrer_transaction():
+    with duree_etapes.mesurer("analyse"):
+        data = await request.get_json()
+        try:
+            p1_name, p2_name, montant_unites, nonce, signature_hex = lire_virement(data)
+        except KeyError:
+            return jsonify({"erreur": "Champs manquants (P1, P2, a, nonce, signature)."}), 400
+        except ValueError as e:
+            return jsonify({"erreur": str(e)}), 400
+
+    with duree_etapes.mesurer("clients"):
+        clients = await cache_clients.obtenir_plusieurs_async([p1_name, p2_name], charger_clients_async)
+    p1 = clients.get(p1_name)
+    p2 = clients.get(p2_name)
+    if not p1 or not p2:
+        return jsonify({"erreur": "Utilisateur inconnu."}), 404
+
+    # La vérification ECDSA ne bloque pas la boucle (pool de threads ou de processus de tchai4)
+    try:
+        await asyncio.wrap_future(lancer_verification(p1, p1_name, p2_name, montant_unites, nonce, signature_hex))
+    except SignatureInvalide:
+        return jsonify({"erreur": "Signature invalide. Accès refusé."}), 401
+    except Exception as e:
+        return jsonify({"erreur": f"Erreur de vérification: {str(e)}"}), 500
+
+    try:
+        statut, resultat = (await dans_thread(executer_virements, [(p1_name, p2_name, montant_unites, nonce)],
+                                              executeur=executeur_ecritures))[0]
+    except Exception:
+        return jsonify({"erreur": "Erreur lors de l'écriture en base."}), 500
+
+    if statut != 201:
+        return jsonify(resultat), statut
+    return jsonify({"message": "Transaction authentifiée et enregistrée", "tx": resultat}), 201
+
+
+@app.route('/api/clients/wallet/<string:nom>', methods=['GET'])
+async def afficher_solde(nom):
+    c = (await cache_clients.obtenir_plusieurs_async([nom], charger_clients_async)).get(nom)
+    if not c: return jsonify({"erreur": "Inexistant"}), 404
+    return jsonify({"Nom": c['nom'], "Solde": c['solde_unites'] / UNITES_PAR_TCHAI}), 200
+
+
+@app.route('/api/transactions', methods=['GET'])
+async def lister_toutes_transactions():
+    """Voir tchai4.lister_toutes_transactions (mêmes paramètres et mêmes réponses)."""
+    pagination = any(p in request.args for p in ('limit', 'after', 'order', 'fields'))
+    if not isinstance(depot, DepotSQLite):
+        if pagination:
+            return jsonify({"erreur": "Pagination indisponible avec le stockage journal."}), 501
+        return jsonify(await dans_thread(lambda: [transaction_en_dict(t) for t in depot.parcourir()])), 200
+
+    if not pagination:
+        async with moteur.connect() as connexion:
+            lignes = await connexion.execute(tchai4.db.select(Transaction.__table__).order_by(Transaction.timestamp))
+            return jsonify([transaction_en_dict(l) for l in lignes]), 200
+
+    try:
+        requete, champs, limite = requete_page(request.args, tchai4.app.config)
+    except ValueError as e:
+        return jsonify({"erreur": str(e)}), 400
+    async with moteur.connect() as connexion:
+        lignes = (await connexion.execute(requete)).all()
+    return jsonify(page_en_json(lignes, champs, limite)), 200
+
+
+@app.route('/api/transactions/integrity', methods=['GET'])
+async def verifier_integrite():
+    """
+    Voir tchai4.verifier_integrite. Le re-hachage occupe le processeur : il est
+    fait dans un thread pour que la boucle continue de servir les autres requêtes.
+    Avec stream=1, la réponse NDJSON est envoyée au fil de la vérification.
+    """
+    try:
+        options = options_integrite(request.args)
+    except ValueError:
+        return jsonify({"erreur": "from_id, to_id et workers doivent être des entiers."}), 400
+
+    if option_active(request.args, 'stream'):
+        reponse = Response(en_flux(lambda: en_ndjson(verifier_chaine(**options))), mimetype='application/x-ndjson')
+        # Une vérification complète peut durer plus que RESPONSE_TIMEOUT
+        reponse.timeout = None
+        return reponse
+    bilan, statut = await dans_thread(lambda: bilan_integrite(verifier_chaine(**options)))
+    return jsonify(bilan), statut
+
+
+async def demarrer_chrono():
+    g.debut_requete = time.perf_counter()
+
+async def compter_requete(reponse):
+    """Voir tchai4.compter_requete : compteurs par route et code de statut, durée des requêtes."""
+    route = request.url_rule.rule if request.url_rule else "inconnue"
+    requetes.incrementer(route, str(reponse.status_code))
+    duree_requetes.observer(time.perf_counter() - g.debut_requete, route)
+    return reponse
+
+if metriques.actif:
+    app.before_request(demarrer_chrono)
+    app.after_request(compter_requete)
+
+@app.route('/metrics', methods=['GET'])
+async def exposer_metriques():
+    """Mêmes instruments que le serveur Flask (étapes d'écriture, intégrité)."""
+    if not metriques.actif:
+        return jsonify({"erreur": "Métriques désactivées (TCHAI_METRIQUES)."}), 404
+    return Response(metriques.exposer(), mimetype=CONTENT_TYPE)
+
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=5000)
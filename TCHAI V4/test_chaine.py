@@ -0,0 +1,32 @@
+import os
+
+import pytest
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from chaine import lire_virement, message_virement, montant_en_unites
+from conftest import DOSSIER
+from sign_tx import charger_cle_privee
+
+# Validation des virements reçus (chaine.py) : python -m pytest (depuis TCHAI V4)
+
+
+def test_montants_acceptes():
+    assert [montant_en_unites(a) for a in (2.5, "2.50", 3, 0.01)] == [250, 250, 300, 1]
+
+
+@pytest.mark.parametrize("montant", [0, 0.0, "-0", -50, "-0.01", 0.001, "abc", float("inf")])
+def test_montants_refuses(montant):
+    with pytest.raises(ValueError):
+        lire_virement({"P1": "Yoyo", "P2": "Wiwi", "a": montant, "nonce": 1, "signature": "00"})
+
+
+def test_virement_negatif_signe_refuse(client):
+    # Signé par P1 pour -50 : accepté, il prendrait 50 à P2
+    signature = charger_cle_privee(os.path.join(DOSSIER, "Yoyo_private.pem")).sign(
+        message_virement("Yoyo", "Wiwi", -5000, 1), ec.ECDSA(hashes.SHA256())).hex()
+    corps = {"P1": "Yoyo", "P2": "Wiwi", "a": -50, "nonce": 1, "signature": signature}
+    assert client.post('/api/transaction', json=corps).status_code == 400
+    lot = client.post('/api/transactions/batch', json=[corps]).get_json()
+    assert (lot["enregistrees"], lot["resultats"][0]["statut"]) == (0, 400)
+    assert [client.get(f'/api/clients/wallet/{nom}').get_json()["Solde"] for nom in ("Yoyo", "Wiwi")] == [100, 100]
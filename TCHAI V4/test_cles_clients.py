@@ -0,0 +1,23 @@
+import os
+import shutil
+import threading
+
+from cles_clients import SurveillantCles
+
+# python -m pytest (depuis TCHAI V4)
+
+DOSSIER = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_cles_presentes_au_demarrage_transmises(tmp_path):
+    shutil.copy(os.path.join(DOSSIER, "Yoyo_public.pem"), tmp_path)
+    recues = []
+    transmis = threading.Event()
+    surveillant = SurveillantCles(str(tmp_path), lambda cles: (recues.append(cles), transmis.set()), periode=60)
+    surveillant.demarrer()
+    try:
+        # Le premier passage n'attend pas la période : la base décide de ce qui est à importer
+        assert transmis.wait(5)
+    finally:
+        surveillant.arreter()
+    assert list(recues[0]) == ["Yoyo"]
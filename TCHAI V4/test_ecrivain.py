@@ -0,0 +1,53 @@
+import os
+import sqlite3
+from datetime import datetime
+
+import tchai4
+from chaine import calculer_hash_transaction_v5, timestamp_en_us
+from conftest import DOSSIER
+from sign_tx import virement_signe
+
+# Tests de régression de l'écrivain unique : python -m pytest (depuis TCHAI V4)
+
+
+def test_rappel_en_echec_sans_bloquer_l_ecrivain(client):
+    appels = []
+
+    def tache():
+        tchai4.ecrivain.apres_commit(lambda: 1 / 0)
+        tchai4.ecrivain.apres_commit(lambda: appels.append("suivant"))
+        return "fait"
+
+    with client.application.app_context():
+        futur = tchai4.ecrivain.deposer(tache)
+        assert futur.result(timeout=5) == "fait"
+        assert appels == ["suivant"]
+        assert tchai4.ecrivain.thread.is_alive()
+        assert tchai4.ecrivain.deposer(lambda: 42).result(timeout=5) == 42
+
+
+def test_tete_relue_seulement_apres_une_ecriture_exterieure(client, tmp_path):
+    chargements = []
+    charger = tchai4.tete_chaine.charger
+    tchai4.tete_chaine.charger = lambda: chargements.append(1) or charger()
+
+    def virement(nonce):
+        corps = virement_signe(os.path.join(DOSSIER, "Yoyo_private.pem"), "Yoyo", "Wiwi", 1, nonce)
+        return client.post('/api/transaction', json=corps).status_code
+
+    assert [virement(n) for n in (1, 2, 3)] == [201] * 3
+    assert chargements == []
+
+    # Un autre processus ajoute une transaction : le groupe suivant relit la tête et chaîne à sa suite
+    con = sqlite3.connect(tmp_path / "tchai4.db")
+    id_tete, hash_tete = con.execute('SELECT id, hash FROM "transaction" ORDER BY id DESC LIMIT 1').fetchone()
+    t = datetime(2026, 1, 1, 12, 0, 0)
+    h = calculer_hash_transaction_v5("Elsa", "Wiwi", 100, timestamp_en_us(t), hash_tete)
+    con.execute('INSERT INTO "transaction" (id, p1_nom, p2_nom, montant, montant_unites, timestamp, hash, format_hash)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?, ?)', (id_tete + 1, "Elsa", "Wiwi", 1.0, 100, t.isoformat(sep=" "), h, 5))
+    con.commit()
+    con.close()
+    assert virement(4) == 201
+    assert chargements == [1]
+    integrite = client.get('/api/transactions/integrity?full=1').get_json()
+    assert (integrite["integrite"], integrite["verifiees"]) == (True, 5)
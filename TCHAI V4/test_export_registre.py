@@ -0,0 +1,53 @@
+import os
+import json
+
+import tchai4
+from conftest import DOSSIER
+from sign_tx import virement_signe
+
+# Tests de régression de l'export et de l'import du registre : python -m pytest (depuis TCHAI V4)
+
+
+def test_nonces_repris_par_l_import(client, nouvelle_app, tmp_path, monkeypatch):
+    corps = [virement_signe(os.path.join(DOSSIER, "Yoyo_private.pem"), "Yoyo", "Wiwi", 1, nonce) for nonce in (1, 2, 3)]
+    corps.append(virement_signe(os.path.join(DOSSIER, "Wiwi_private.pem"), "Wiwi", "Elsa", 4, 7))
+    for c in corps:
+        assert client.post('/api/transaction', json=c).status_code == 201
+    export = client.get('/api/registre/export').get_data()
+    assert [l["nonce"] for l in map(json.loads, export.splitlines())] == [1, 2, 3, 7]
+
+    # Nouvel environnement : mêmes clients, registre importé
+    monkeypatch.setattr(tchai4, "base_prete", False)
+    app = nouvelle_app(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'autre.db'}", TCHAI_ADMIN_TOKEN="t")
+    with app.app_context():
+        tchai4.provisionner(DOSSIER)
+    autre = app.test_client()
+    bilan = autre.post('/api/registre/import', data=export, headers={"Authorization": "Bearer t"}).get_json()
+    assert bilan["importees"] == 4
+
+    # Les virements signés pour l'ancien environnement ne peuvent pas y être rejoués
+    rejeu = autre.post('/api/transaction', json=corps[2])
+    assert (rejeu.status_code, rejeu.get_json()["transaction_id"]) == (409, 3)
+    assert autre.post('/api/transaction', json=corps[3]).status_code == 409
+    assert autre.get('/api/clients/wallet/Yoyo').get_json()["Solde"] == 97
+    suivant = virement_signe(os.path.join(DOSSIER, "Yoyo_private.pem"), "Yoyo", "Wiwi", 1, 4)
+    assert autre.post('/api/transaction', json=suivant).status_code == 201
+    assert autre.get('/api/registre/export').get_data().startswith(export)
+
+
+def test_bornes_de_l_export(client):
+    for nonce in (1, 2, 3):
+        corps = virement_signe(os.path.join(DOSSIER, "Yoyo_private.pem"), "Yoyo", "Wiwi", 1, nonce)
+        assert client.post('/api/transaction', json=corps).status_code == 201
+    lignes = client.get('/api/registre/export?from_id=2&to_id=2').get_data().splitlines()
+    assert [json.loads(l)["id"] for l in lignes] == [2]
+    for parametres in ("from_id=x", "to_id=2.5"):
+        assert client.get(f'/api/registre/export?{parametres}').status_code == 400
+
+
+def test_horodatage_identique_partout(client):
+    corps = virement_signe(os.path.join(DOSSIER, "Yoyo_private.pem"), "Yoyo", "Wiwi", 1, 1)
+    t = client.post('/api/transaction', json=corps).get_json()["tx"]["t"]
+    assert "+00:00" not in t
+    assert client.get('/api/transactions').get_json()[0]["t"] == t
+    assert json.loads(client.get('/api/registre/export').get_data().splitlines()[0])["t"] == t
@@ -0,0 +1,59 @@
+import os
+import time
+
+import tchai4
+from conftest import DOSSIER
+from idempotence import CONFLIT, EN_COURS, NOUVELLE, REJOUEE, CacheIdempotence
+from sign_tx import virement_signe
+
+# Tests de régression de l'en-tête Idempotency-Key : python -m pytest (depuis TCHAI V4)
+
+
+# --- Cache seul ---
+
+def test_cle_en_cours_puis_rejouee():
+    cache = CacheIdempotence(lambda cle: None)
+    assert cache.commencer("k", "e1") == (NOUVELLE, None)
+    assert cache.commencer("k", "e1") == (EN_COURS, None)
+    cache.terminer("k", "e1", 201, "{}")
+    assert cache.commencer("k", "e1") == (REJOUEE, (201, "{}"))
+    assert cache.commencer("k", "e2") == (CONFLIT, None)
+
+
+def test_reponse_expiree_oubliee():
+    cache = CacheIdempotence(lambda cle: (time.time() - 1, "e1", 201, "{}"), ttl=0)
+    assert cache.commencer("k", "e1") == (NOUVELLE, None)
+    cache.terminer("k", "e1", 201, "{}")
+    # Ni rejouée ni en conflit : la clé est de nouveau libre
+    assert cache.commencer("k", "e2") == (NOUVELLE, None)
+
+
+# --- Route POST /api/transaction ---
+
+def test_virement_rejoue(client):
+    corps = virement_signe(os.path.join(DOSSIER, "Yoyo_private.pem"), "Yoyo", "Wiwi", 2)
+    entetes = {"Idempotency-Key": "virement-1"}
+    premiere = client.post('/api/transaction', json=corps, headers=entetes)
+    assert premiere.status_code == 201
+    assert "Idempotent-Replayed" not in premiere.headers
+
+    rejeu = client.post('/api/transaction', json=corps, headers=entetes)
+    assert rejeu.status_code == 201
+    assert rejeu.headers["Idempotent-Replayed"] == "true"
+    assert rejeu.get_data() == premiere.get_data()
+
+    # Même clé, autre virement : refusé sans être exécuté
+    autre = virement_signe(os.path.join(DOSSIER, "Yoyo_private.pem"), "Yoyo", "Elsa", 3)
+    assert client.post('/api/transaction', json=autre, headers=entetes).status_code == 422
+    assert client.post('/api/transaction', json=corps, headers={"Idempotency-Key": ""}).status_code == 400
+
+    # La réponse est relue en base une fois sortie du cache mémoire
+    with client.application.app_context():
+        tchai4.ecrivain.soumettre(lambda: None)
+    tchai4.idempotence.entrees.clear()
+    rejeu = client.post('/api/transaction', json=corps, headers=entetes)
+    assert (rejeu.status_code, rejeu.headers.get("Idempotent-Replayed")) == (201, "true")
+    assert rejeu.get_data() == premiere.get_data()
+
+    assert len(client.get('/api/transactions').get_json()) == 1
+    assert client.get('/api/clients/wallet/Yoyo').get_json()["Solde"] == 98
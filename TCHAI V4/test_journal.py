@@ -0,0 +1,200 @@
+import os
+import hashlib
+import threading
+from datetime import datetime
+
+import pytest
+
+import tchai4
+from journal import TAILLE_ENREGISTREMENT, JournalTransactions
+from conftest import DOSSIER
+from sign_tx import virement_signe
+
+# Tests de régression du stockage en journal : python -m pytest (depuis TCHAI V4)
+
+
+def transactions(debut, nb):
+    return [{"p1_nom": "Yoyo", "p2_nom": "Wiwi", "montant_unites": 100 + i, "timestamp": datetime(2026, 1, 1, 12, 0, i % 60),
+             "hash": hashlib.sha256(str(i).encode()).hexdigest()} for i in range(debut, debut + nb)]
+
+
+@pytest.fixture
+def journal(tmp_path):
+    j = JournalTransactions(str(tmp_path / "journal"), enregistrements_par_segment=8, fsync=False)
+    j.ouvrir()
+    yield j
+    j.fermer()
+
+
+def valider(j):
+    """Écriture avant le commit SQLite, puis publication après : ce que fait l'écrivain pour un groupe."""
+    j.preparer()
+    j.valider()
+
+
+def rouvrir(j, valides=None):
+    j.fermer()
+    autre = JournalTransactions(j.dossier, enregistrements_par_segment=j.par_segment, fsync=False,
+                                charger_tete=lambda: valides)
+    autre.ouvrir()
+    return autre
+
+
+# --- Journal seul ---
+
+def test_creer_le_journal_ne_touche_pas_au_disque(tmp_path):
+    JournalTransactions(str(tmp_path / "journal"))
+    assert not (tmp_path / "journal").exists()
+
+
+def test_ajout_annule_jamais_ecrit(journal):
+    assert journal.ajouter(transactions(0, 3)) == [1, 2, 3]
+    assert journal.tete()[0] == 3
+    journal.annuler(0)
+    valider(journal)
+    assert journal.tete() is None
+    assert rouvrir(journal).tete() is None
+
+
+def test_annulation_jusqu_a_la_marque(journal):
+    premieres = transactions(0, 5)
+    journal.ajouter(premieres)
+    marque = journal.marque()
+    journal.ajouter(transactions(5, 5))
+    journal.annuler(marque)
+    valider(journal)
+    relu = rouvrir(journal)
+    assert relu.tete() == (5, premieres[-1]["hash"])
+    assert [t.hash for t in relu.parcourir()] == [t["hash"] for t in premieres]
+    relu.fermer()
+
+
+def test_ajouts_en_attente_visibles_du_seul_ecrivain(journal):
+    journal.ajouter(transactions(0, 2))
+    vus = {}
+    lecteur = threading.Thread(target=lambda: vus.update(lire=journal.lire(1), tete=journal.tete(),
+                                                          parcours=list(journal.parcourir())))
+    lecteur.start()
+    lecteur.join()
+    assert vus == {"lire": None, "tete": None, "parcours": []}
+    assert [t.id for t in journal.parcourir()] == [1, 2]
+
+    journal.preparer()
+    lecteur = threading.Thread(target=lambda: vus.update(tete=journal.tete()))
+    lecteur.start()
+    lecteur.join()
+    assert vus["tete"] is None
+    journal.valider()
+    lecteur = threading.Thread(target=lambda: vus.update(parcours=list(journal.parcourir())))
+    lecteur.start()
+    lecteur.join()
+    assert [t.id for t in vus["parcours"]] == [1, 2]
+
+
+def test_reprojection_pendant_un_parcours(journal):
+    journal.ajouter(transactions(0, 4))
+    valider(journal)
+    parcours = journal.parcourir()
+    assert next(parcours).id == 1
+    # Le segment grossit : la lecture suivante re-projette le fichier pendant que le parcours lit l'ancienne projection
+    journal.ajouter(transactions(4, 3))
+    valider(journal)
+    assert journal.lire(7).id == 7
+    assert [t.id for t in parcours] == [2, 3, 4]
+
+
+def test_commit_en_echec_retire_les_enregistrements_ecrits(journal):
+    journal.ajouter(transactions(0, 2))
+    valider(journal)
+    journal.ajouter(transactions(2, 9))
+    journal.preparer()
+    # Le commit SQLite échoue : l'écrivain annule le groupe
+    journal.annuler(0)
+    assert journal.tete()[0] == 2
+    assert (os.path.getsize(journal._chemin_segment(0)), os.path.exists(journal._chemin_segment(1))) == (2 * TAILLE_ENREGISTREMENT, False)
+    journal.ajouter(transactions(2, 1))
+    valider(journal)
+    assert [t.id for t in rouvrir(journal, valides=3).parcourir()] == [1, 2, 3]
+
+
+def test_tete_enregistree_avant_le_commit(tmp_path):
+    tetes = []
+    j = JournalTransactions(str(tmp_path / "journal"), fsync=False, enregistrer_tete=tetes.append)
+    j.ouvrir()
+    j.ajouter(transactions(0, 3))
+    j.preparer()
+    assert (tetes, j.tete(), j.nb) == ([3], (3, transactions(2, 1)[0]["hash"]), 0)
+    j.valider()
+    assert j.nb == 3
+    j.fermer()
+
+
+def test_arret_avant_le_commit_tronque_a_la_tete_validee(journal):
+    premieres = transactions(0, 5)
+    journal.ajouter(premieres)
+    valider(journal)
+    journal.ajouter(transactions(5, 6))
+    journal.preparer()
+    # Arrêt brutal avant le commit : la base n'a validé que 5 enregistrements
+    relu = rouvrir(journal, valides=5)
+    assert relu.tete() == (5, premieres[-1]["hash"])
+    relu.ajouter(transactions(20, 1))
+    valider(relu)
+    assert [t.hash for t in relu.parcourir()] == [t["hash"] for t in premieres + transactions(20, 1)]
+    with pytest.raises(ValueError):
+        rouvrir(relu, valides=9)
+
+
+# --- Virement dont le groupe échoue après l'ajout au journal ---
+
+@pytest.fixture
+def client_journal(nouvelle_app):
+    app = nouvelle_app(TCHAI_STOCKAGE="journal", TCHAI_INSTANTANE_INTERVALLE=1)
+    with app.app_context():
+        tchai4.provisionner(DOSSIER)
+    return app.test_client()
+
+
+def test_virement_en_echec_absent_du_journal(client_journal, monkeypatch):
+    pannes = [RuntimeError("panne après l'ajout au journal")]
+    prendre_instantane = tchai4.prendre_instantane
+
+    def instantane_en_panne():
+        if pannes:
+            raise pannes.pop()
+        return prendre_instantane()
+    monkeypatch.setattr(tchai4, "prendre_instantane", instantane_en_panne)
+
+    corps = virement_signe(os.path.join(DOSSIER, "Yoyo_private.pem"), "Yoyo", "Wiwi", 2)
+    assert client_journal.post('/api/transaction', json=corps).status_code == 500
+    assert tchai4.depot.tete() is None
+    assert client_journal.get('/api/clients/wallet/Yoyo').get_json()["Solde"] == 100
+
+    # Le nouvel essai du même virement est enregistré une seule fois
+    reponse = client_journal.post('/api/transaction', json=corps)
+    assert reponse.status_code == 201
+    assert reponse.get_json()["tx"]["id"] == 1
+    assert [t["id"] for t in client_journal.get('/api/transactions').get_json()] == [1]
+    assert client_journal.get('/api/clients/wallet/Yoyo').get_json()["Solde"] == 98
+    with client_journal.application.app_context():
+        assert tchai4.reconstruire_soldes()[1]["Yoyo"] == 98 * tchai4.UNITES_PAR_TCHAI
+
+
+def test_ecriture_du_journal_en_echec_avant_le_commit(client_journal, monkeypatch):
+    fd_segment = tchai4.depot._fd_segment
+    pannes = [OSError(28, "No space left on device")]
+
+    def disque_plein(numero):
+        if pannes:
+            raise pannes.pop()
+        return fd_segment(numero)
+    monkeypatch.setattr(tchai4.depot, "_fd_segment", disque_plein)
+
+    corps = virement_signe(os.path.join(DOSSIER, "Yoyo_private.pem"), "Yoyo", "Wiwi", 2)
+    assert client_journal.post('/api/transaction', json=corps).status_code == 500
+    # Rien n'est validé en base : ni débit, ni nonce consommé
+    assert client_journal.get('/api/clients/wallet/Yoyo').get_json()["Solde"] == 100
+    reponse = client_journal.post('/api/transaction', json=corps)
+    assert (reponse.status_code, reponse.get_json()["tx"]["id"]) == (201, 1)
+    with client_journal.application.app_context():
+        assert tchai4.charger_tete_journal() == tchai4.depot.nb == 1
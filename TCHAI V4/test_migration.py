@@ -0,0 +1,36 @@
+import os
+import sqlite3
+
+from conftest import DOSSIER, creer_base_v4
+from sign_tx import virement_signe
+
+# Migration d'une base TCHAI V4 d'origine (montants flottants, sans nonce) : python -m pytest
+
+
+def test_migration_base_v4(nouvelle_app, tmp_path):
+    creer_base_v4(tmp_path / "tchai4.db")
+    client = nouvelle_app().test_client()
+
+    assert client.get('/api/clients/wallet/Yoyo').get_json()["Solde"] == 95
+    con = sqlite3.connect(tmp_path / "tchai4.db")
+    assert con.execute("SELECT nom, dernier_nonce FROM client ORDER BY nom").fetchall() == [
+        ("Elsa", 0), ("Wiwi", 0), ("Yoyo", 0)]
+    assert con.execute("SELECT COUNT(*) FROM nonce_utilise").fetchone() == (0,)
+
+    # La transaction historique reste vérifiée avec le hash v4
+    integrite = client.get('/api/transactions/integrity?full=1').get_json()
+    assert (integrite["integrite"], integrite["verifiees"]) == (True, 1)
+
+    # Premier virement signé avec nonce après la migration, puis son rejeu
+    corps = virement_signe(os.path.join(DOSSIER, "Yoyo_private.pem"), "Yoyo", "Wiwi", 2)
+    reponse = client.post('/api/transaction', json=corps)
+    assert reponse.status_code == 201
+    rejeu = client.post('/api/transaction', json=corps)
+    assert rejeu.status_code == 409
+    assert rejeu.get_json()["transaction_id"] == reponse.get_json()["tx"]["id"] == 2
+    assert client.get('/api/clients/wallet/Yoyo').get_json()["Solde"] == 93
+    assert con.execute("SELECT dernier_nonce FROM client WHERE nom = 'Yoyo'").fetchone() == (corps["nonce"],)
+    con.close()
+
+    integrite = client.get('/api/transactions/integrity?full=1').get_json()
+    assert (integrite["integrite"], integrite["verifiees"]) == (True, 2)
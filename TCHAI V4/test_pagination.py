@@ -0,0 +1,19 @@
+import os
+
+from conftest import DOSSIER
+from sign_tx import virement_signe
+
+# Pagination de GET /api/transactions : python -m pytest (depuis TCHAI V4)
+
+
+def test_pages_et_parametres_invalides(client):
+    for nonce in (1, 2, 3):
+        corps = virement_signe(os.path.join(DOSSIER, "Yoyo_private.pem"), "Yoyo", "Wiwi", nonce, nonce)
+        assert client.post('/api/transaction', json=corps).status_code == 201
+    page = client.get('/api/transactions?limit=2&fields=a').get_json()
+    assert page["transactions"] == [{"a": 1.0}, {"a": 2.0}]
+    suite = client.get(f'/api/transactions?limit=2&fields=a&after={page["next"]}').get_json()
+    assert (suite["transactions"], suite["next"]) == ([{"a": 3.0}], None)
+
+    for parametres in ("limit=abc", "limit=", "after=xyz", "fields=montant"):
+        assert client.get(f'/api/transactions?{parametres}').status_code == 400
@@ -0,0 +1,19 @@
+import sqlite3
+
+from conftest import creer_base_v4
+from verif_parallele import verifier_chaine_parallele
+
+# Audit hors-ligne (verif_parallele.py) : python -m pytest (depuis TCHAI V4)
+
+
+def test_audit_base_v4_non_migree(tmp_path):
+    chemin = str(tmp_path / "tchai4.db")
+    creer_base_v4(chemin)
+    resultat = verifier_chaine_parallele(chemin, nb_processus=1)
+    assert (resultat["integrite"], resultat["verifiees"], resultat["echecs"]) == (True, 1, [])
+
+    con = sqlite3.connect(chemin)
+    con.execute('UPDATE "transaction" SET montant = 50.0 WHERE id = 1')
+    con.commit()
+    con.close()
+    assert verifier_chaine_parallele(chemin, nb_processus=1)["echecs"] == [1]
@@ -0,0 +1,25 @@
+from verrous_comptes import VerrousComptes
+
+# python -m pytest (depuis TCHAI V4)
+
+
+def test_reserve_deduite_une_seule_fois():
+    verrous = VerrousComptes()
+    verrous.reserver([("Yoyo", 5, 60)])
+    # Fiche d'avant le commit (cache) : le débit réservé est retranché
+    assert verrous.disponible("Yoyo", 100, 4) == 40
+    # Fiche relue en base après le commit, avant la libération : le débit y est déjà
+    assert verrous.disponible("Yoyo", 40, 5) == 40
+    verrous.liberer([("Yoyo", 5, 60)])
+    assert verrous.disponible("Yoyo", 40, 5) == 40
+    assert verrous.reserves == {}
+
+
+def test_nonces_reserves():
+    verrous = VerrousComptes()
+    verrous.reserver([("Yoyo", 5, 10), ("Yoyo", 7, 10)])
+    assert verrous.dernier_nonce("Yoyo", 4) == 7
+    assert verrous.disponible("Yoyo", 90, 5) == 80
+    verrous.liberer([("Yoyo", 7, 10)])
+    assert verrous.dernier_nonce("Yoyo", 4) == 5
+    assert verrous.dernier_nonce("Wiwi", 3) == 3
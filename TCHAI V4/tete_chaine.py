@@ -0,0 +1,42 @@
+import threading
+
+class TeteChaine:
+    """
+    Dernier maillon (id, hash) de la chaîne, gardé en mémoire.
+
+    Évite de relire la dernière transaction en base à chaque insertion. Les
+    écrivains prennent `verrou` pendant toute la séquence lecture de la tête ->
+    commit -> `avancer()`, ce qui empêche deux threads de chaîner sur le même
+    hash précédent. Après un rollback, `invalider()` force un rechargement.
+    """
+
+    def __init__(self, charger):
+        # charger() renvoie (id, hash) de la dernière transaction en base, ou None
+        self.charger = charger
+        self.verrou = threading.RLock()
+        self.id = None
+        self.hash = None
+        self.chargee = False
+
+    def recharger(self):
+        with self.verrou:
+            derniere = self.charger()
+            self.id, self.hash = derniere if derniere else (0, "0")
+            self.chargee = True
+
+    def lire(self):
+        """Renvoie (id, hash) de la tête ("0" comme hash de genèse si la chaîne est vide)."""
+        with self.verrou:
+            if not self.chargee:
+                self.recharger()
+            return self.id, self.hash
+
+    def avancer(self, id_transaction, hash_transaction):
+        """À appeler après le commit d'une nouvelle transaction."""
+        with self.verrou:
+            self.id, self.hash = id_transaction, hash_transaction
+            self.chargee = True
+
+    def invalider(self):
+        with self.verrou:
+            self.chargee = False
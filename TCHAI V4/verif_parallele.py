@@ -0,0 +1,154 @@
+import os
+import sys
+import json
+import sqlite3
+import argparse
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from chaine import FORMAT_JSON, UNITES_PAR_TCHAI, hash_ligne
+
+# Vérification de la chaîne répartie sur plusieurs processus.
+#
+# Chaque maillon ne dépend que des champs de sa ligne et du hash *stocké* de la
+# ligne précédente : on découpe donc la plage d'ids en segments vérifiés
+# indépendamment, puis on fusionne les résultats dans l'ordre des ids.
+
+TAILLE_SEGMENT_DEFAUT = 50_000
+
+
+def ouvrir_lecture(chemin_db):
+    """Connexion SQLite en lecture seule (la base d'un serveur en marche n'est pas modifiée)."""
+    return sqlite3.connect(f"file:{chemin_db}?mode=ro", uri=True)
+
+
+def colonnes_montant(con):
+    """
+    Expressions SQL de montant_unites et format_hash. Une base TCHAI V4 pas
+    encore migrée (ouverte en lecture seule, elle ne peut pas l'être ici) n'a
+    que le montant flottant : ses transactions sont toutes au format 4.
+    """
+    colonnes = {ligne[1] for ligne in con.execute('PRAGMA table_info("transaction")')}
+    if "montant_unites" in colonnes:
+        return "montant_unites, format_hash"
+    return f"CAST(ROUND(montant * {UNITES_PAR_TCHAI}) AS INTEGER), {FORMAT_JSON}"
+
+
+def bornes_ids(chemin_db, debut=None, fin=None):
+    """Renvoie (premier_id, dernier_id) de la chaîne, restreints à [debut, fin] si fournis."""
+    con = ouvrir_lecture(chemin_db)
+    try:
+        mini, maxi = con.execute('SELECT MIN(id), MAX(id) FROM "transaction"').fetchone()
+    finally:
+        con.close()
+    if mini is None:
+        return None, None
+    if debut is not None:
+        mini = max(mini, debut)
+    if fin is not None:
+        maxi = min(maxi, fin)
+    return mini, maxi
+
+
+def verifier_segment(chemin_db, debut, fin):
+    """
+    Vérifie les transactions d'ids compris dans [debut, fin].
+
+    Renvoie un dict avec le nombre de transactions vérifiées, les ids en échec,
+    et (id, hash) de la dernière transaction du segment.
+    """
+    con = ouvrir_lecture(chemin_db)
+    try:
+        ligne = con.execute(
+            'SELECT hash FROM "transaction" WHERE id < ? ORDER BY id DESC LIMIT 1', (debut,)
+        ).fetchone()
+        hash_precedent = ligne[0] if ligne else "0"
+
+        nb_verifiees = 0
+        echecs = []
+        dernier = None
+        curseur = con.execute(
+            f'SELECT id, p1_nom, p2_nom, montant, {colonnes_montant(con)}, timestamp, hash FROM "transaction" '
+            'WHERE id BETWEEN ? AND ? ORDER BY id', (debut, fin)
+        )
+        for id_t, p1, p2, montant, montant_unites, format_hash, timestamp, hash_t in curseur:
+            # SQLAlchemy stocke les dates sous la forme "AAAA-MM-JJ HH:MM:SS.ffffff"
+            ts = datetime.fromisoformat(timestamp)
+            if hash_ligne(format_hash, p1, p2, montant, montant_unites, ts, hash_precedent) != hash_t:
+                echecs.append(id_t)
+            nb_verifiees += 1
+            dernier = (id_t, hash_t)
+            hash_precedent = hash_t
+    finally:
+        con.close()
+
+    return {"debut": debut, "fin": fin, "verifiees": nb_verifiees, "echecs": echecs, "dernier": dernier}
+
+
+def verifier_segments(executeur, chemin_db, segments):
+    # map() conserve l'ordre des segments, donc l'ordre des ids
+    return list(executeur.map(verifier_segment, [chemin_db] * len(segments),
+                              [d for d, _ in segments], [f for _, f in segments]))
+
+
+def creer_pool(nb_processus):
+    """
+    Pool de processus lancés avec 'spawn' : le serveur a déjà des threads
+    (écrivain, requêtes), qu'un fork copierait au milieu d'un verrou.
+    """
+    return ProcessPoolExecutor(max_workers=nb_processus, mp_context=multiprocessing.get_context("spawn"))
+
+
+def verifier_chaine_parallele(chemin_db, debut=None, fin=None, nb_processus=None, taille_segment=TAILLE_SEGMENT_DEFAUT,
+                              executeur=None):
+    """
+    Vérifie la chaîne entre `debut` et `fin` (ids inclus, toute la chaîne par défaut)
+    en répartissant les segments sur `nb_processus` processus (un par cœur par défaut).
+    Avec `executeur` (pool gardé par le serveur), les segments partent dans ce
+    pool au lieu d'un pool créé pour l'appel ; nb_processus=1 vérifie toujours
+    dans le processus appelant.
+    """
+    mini, maxi = bornes_ids(chemin_db, debut, fin)
+    if mini is None or mini > maxi:
+        return {"integrite": True, "verifiees": 0, "echecs": [], "dernier": None}
+
+    segments = [(d, min(d + taille_segment - 1, maxi)) for d in range(mini, maxi + 1, taille_segment)]
+    nb_processus = nb_processus or os.cpu_count() or 1
+
+    if nb_processus == 1 or len(segments) == 1:
+        resultats = [verifier_segment(chemin_db, d, f) for d, f in segments]
+    elif executeur is not None:
+        resultats = verifier_segments(executeur, chemin_db, segments)
+    else:
+        with creer_pool(min(nb_processus, len(segments))) as executeur:
+            resultats = verifier_segments(executeur, chemin_db, segments)
+
+    echecs = [id_t for r in resultats for id_t in r["echecs"]]
+    derniers = [r["dernier"] for r in resultats if r["dernier"] is not None]
+    return {
+        "integrite": not echecs,
+        "verifiees": sum(r["verifiees"] for r in resultats),
+        "echecs": echecs,
+        "dernier": derniers[-1] if derniers else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Audit hors-ligne de la chaîne Tchaî sur plusieurs cœurs.")
+    parser.add_argument("db", nargs="?", default=os.path.join("instance", "tchai4.db"),
+                        help="Fichier SQLite à auditer (défaut : instance/tchai4.db)")
+    parser.add_argument("-j", "--processus", type=int, default=None, help="Nombre de processus (défaut : nombre de cœurs)")
+    parser.add_argument("--taille-segment", type=int, default=TAILLE_SEGMENT_DEFAUT, help="Nombre d'ids par segment")
+    parser.add_argument("--from-id", type=int, default=None)
+    parser.add_argument("--to-id", type=int, default=None)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"Erreur : base introuvable ({args.db})", file=sys.stderr)
+        sys.exit(2)
+
+    debut_audit = datetime.now()
+    resultat = verifier_chaine_parallele(args.db, args.from_id, args.to_id, args.processus, args.taille_segment)
+    resultat["duree_s"] = round((datetime.now() - debut_audit).total_seconds(), 3)
+    print(json.dumps(resultat, indent=2))
+    sys.exit(0 if resultat["integrite"] else 1)
@@ -0,0 +1,131 @@
+import time
+import queue
+import threading
+import multiprocessing
+from functools import lru_cache
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Vérification des signatures ECDSA dans un pool de processus, par petits lots.
+#
+# Les threads des requêtes déposent leurs vérifications dans une file ; un
+# thread collecteur les regroupe (jusqu'à `taille_lot` vérifications, ou ce qui
+# est arrivé pendant `fenetre` secondes) et envoie chaque lot à un processus.
+# Une requête n'attend que le Future de sa propre vérification : le calcul
+# SECP256K1 occupe tous les cœurs sans retenir de thread serveur.
+
+
+class SignatureInvalide(Exception):
+    pass
+
+
+@lru_cache(maxsize=4096)
+def _cle_publique(pem):
+    """Clé publique désérialisée, gardée en cache dans chaque processus du pool."""
+    from cryptography.hazmat.primitives import serialization
+    return serialization.load_pem_public_key(pem.encode('utf-8'))
+
+
+def verifier_lot(lot):
+    """
+    Vérifie un lot de (pem, message, signature_hex) dans un processus du pool.
+    Renvoie, pour chacun, True (valide), False (signature fausse) ou le message
+    d'erreur (clé ou signature illisible).
+    """
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.exceptions import InvalidSignature
+
+    resultats = []
+    for pem, message, signature_hex in lot:
+        try:
+            _cle_publique(pem).verify(bytes.fromhex(signature_hex), message, ec.ECDSA(hashes.SHA256()))
+            resultats.append(True)
+        except InvalidSignature:
+            resultats.append(False)
+        except Exception as e:
+            resultats.append(str(e))
+    return resultats
+
+
+class VerificateurSignatures:
+    """
+    Service de vérification par lots. `soumettre()` renvoie un Future dont le
+    résultat est None si la signature est valide ; il lève SignatureInvalide si
+    elle est fausse, ValueError si la clé ou la signature est illisible.
+
+    Le pool et le collecteur ne démarrent qu'au premier usage (ou à
+    `demarrer()`). Les processus sont lancés avec 'spawn' : le serveur a déjà
+    des threads (écrivain, requêtes), qu'un fork copierait au milieu d'un verrou.
+    """
+
+    def __init__(self, nb_processus, fenetre=0.002, taille_lot=64):
+        self.nb_processus = nb_processus
+        self.fenetre = fenetre
+        self.taille_lot = taille_lot
+        self.file = queue.Queue()
+        self.executeur = None
+        self.thread = None
+        self.verrou = threading.Lock()
+
+    def demarrer(self):
+        with self.verrou:
+            if self.executeur is None:
+                self.executeur = self._creer_pool()
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._boucle, name="verif-signatures", daemon=True)
+                self.thread.start()
+
+    def _creer_pool(self):
+        executeur = ProcessPoolExecutor(max_workers=self.nb_processus, mp_context=multiprocessing.get_context("spawn"))
+        # Lance les processus (et leur import de cryptography) avant la première requête
+        for _ in range(self.nb_processus):
+            executeur.submit(verifier_lot, [])
+        return executeur
+
+    def soumettre(self, pem, message, signature_hex):
+        """Dépose une vérification ; renvoie son Future (voir la docstring de la classe)."""
+        self.demarrer()
+        futur = Future()
+        self.file.put((pem, message, signature_hex, futur))
+        return futur
+
+    def _boucle(self):
+        while True:
+            lot = [self.file.get()]
+            # Fenêtre de regroupement : on attend un peu les vérifications qui suivent
+            limite = time.monotonic() + self.fenetre
+            try:
+                while len(lot) < self.taille_lot:
+                    lot.append(self.file.get(timeout=max(0.0, limite - time.monotonic())))
+            except queue.Empty:
+                pass
+            try:
+                try:
+                    futur_lot = self.executeur.submit(verifier_lot, [v[:3] for v in lot])
+                except BrokenProcessPool:
+                    # Un processus a disparu (tué, mémoire) : les lots en cours échouent, les suivants
+                    # partent dans un nouveau pool
+                    self.executeur = self._creer_pool()
+                    futur_lot = self.executeur.submit(verifier_lot, [v[:3] for v in lot])
+            except Exception as e:
+                self._distribuer(lot, None, e)
+                continue
+            futur_lot.add_done_callback(lambda f, lot=lot: self._distribuer(lot, f, None))
+
+    @staticmethod
+    def _distribuer(lot, futur_lot, erreur):
+        if erreur is None:
+            try:
+                resultats = futur_lot.result()
+            except Exception as e:
+                erreur = e
+        for i, (_, _, _, futur) in enumerate(lot):
+            if erreur is not None:
+                futur.set_exception(erreur)
+            elif resultats[i] is True:
+                futur.set_result(None)
+            elif resultats[i] is False:
+                futur.set_exception(SignatureInvalide())
+            else:
+                futur.set_exception(ValueError(resultats[i]))
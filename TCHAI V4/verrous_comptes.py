@@ -0,0 +1,61 @@
+import threading
+from contextlib import contextmanager
+
+class VerrousComptes:
+    """
+    Verrous par compte et débits réservés, pour contrôler les soldes en parallèle.
+
+    Les noms de comptes sont répartis sur `nb_verrous` verrous (hachage du nom) :
+    la mémoire reste bornée quel que soit le nombre de clients. Un virement prend
+    les verrous de ses comptes par indice croissant ; cet ordre fixe exclut
+    l'interblocage, et deux virements entre comptes disjoints ne s'attendent pas
+    (sauf collision de hachage).
+
+    Sous verrou, un débit accepté est réservé jusqu'au commit de l'écrivain : le
+    solde disponible d'un compte est son dernier solde validé moins ses débits
+    réservés, le même argent ne peut donc pas être engagé deux fois. Chaque
+    réserve porte le nonce de son virement, ce qui refuse aussi un rejeu
+    simultané. Le nonce sert encore à une chose. Entre le commit et la
+    libération des réserves, un solde relu en base contient déjà le débit.
+    Son dernier nonce validé, lu avec lui, désigne les réserves à ne plus
+    retrancher.
+    """
+
+    def __init__(self, nb_verrous=1024):
+        self.verrous = [threading.Lock() for _ in range(nb_verrous)]
+        self.reserves = {}  # nom -> {nonce: unités débitées, pas encore libérées}
+
+    @contextmanager
+    def verrouiller(self, noms):
+        indices = sorted({hash(nom) % len(self.verrous) for nom in noms})
+        for i in indices:
+            self.verrous[i].acquire()
+        try:
+            yield
+        finally:
+            for i in reversed(indices):
+                self.verrous[i].release()
+
+    # Les méthodes suivantes s'appellent sous les verrous des comptes concernés
+
+    def disponible(self, nom, solde_unites, dernier_nonce):
+        """Solde moins les débits réservés pas encore compris dans ce solde (nonce > dernier_nonce lu avec lui)."""
+        return solde_unites - sum(montant for nonce, montant in self.reserves.get(nom, {}).items()
+                                  if nonce > dernier_nonce)
+
+    def dernier_nonce(self, nom, dernier_valide):
+        return max(dernier_valide, max(self.reserves.get(nom, ()), default=0))
+
+    def reserver(self, debits):
+        """Réserve les débits acceptés [(nom, nonce, unités)]."""
+        for nom, nonce, montant in debits:
+            self.reserves.setdefault(nom, {})[nonce] = montant
+
+    def liberer(self, debits):
+        """Libère des réserves, une fois validées (ou abandonnées)."""
+        for nom, nonce, _ in debits:
+            reserves = self.reserves.get(nom)
+            if reserves is not None:
+                reserves.pop(nonce, None)
+                if not reserves:
+                    del self.reserves[nom]